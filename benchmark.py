@@ -0,0 +1,1367 @@
+# benchmark.py
+"""
+Đo hiệu năng các phần chính của PCB Design Studio.
+
+Chạy tất cả:      python benchmark.py
+Chạy một bài đo:  python benchmark.py pad_paint
+"""
+
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from PyQt5.QtWidgets import (
+    QApplication, QGraphicsScene, QGraphicsItem, QGraphicsView, QGraphicsRectItem, QGraphicsLineItem,
+    QGraphicsEllipseItem, QGraphicsPathItem
+)
+from PyQt5.QtGui import QImage, QPainter, QPen, QBrush, QColor, QWheelEvent, QMouseEvent, QRegion
+from PyQt5.QtGui import QPainterPath
+from PyQt5.QtCore import QLineF, QPoint, QRectF, QPointF, QSize, Qt
+
+from pad import Pad
+from pad_spec import PadSpec
+from pad_field import PadField
+from scene_batch import bulk_update
+from layer_manager import LayerManager, LayerLineItem
+from create_layer import PCBLayerManager
+from zoomable_graphics_view import ZoomableGraphicsView
+from drawing import DrawingApp
+from trace_item import StrokeSimplifier, TraceItem
+from snapping import SnapEngine, set_snap_engine
+from setting_manager import SettingsManager
+from pad_editor import PadEditor
+from pad_bulk_edit import edit_pads, selected_pad_items
+from project_file import collect_project, save_project, load_project, apply_project
+from undo_stack import UndoStack, set_undo_stack, AddItemsCommand, MoveItemsCommand, item_positions
+from journal import ProjectJournal, recover_journal
+from progressive_load import ProgressiveLoader
+from gerber_import import GerberParser, GerberImporter
+
+
+THT_PAD = {
+    'type': "THT (Through Hole)", 'shape': "Rectangle",
+    'width': 1.5, 'height': 1.5, 'hole_diameter': 0.8, 'corner_radius': 0.2,
+    'thermal': {'enabled': True, 'spoke_width': 0.3, 'gap_width': 0.2}
+}
+
+
+def timed(func, repeat=1):
+    """
+    Chạy hàm `repeat` lần, trả về thời gian trung bình (ms) và kết quả cuối cùng.
+    """
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def report(name, value, unit="ms"):
+    print(f"  {name:<40} {value:10.2f} {unit}")
+
+
+def bga_positions(count, pitch=20):
+    """
+    Vị trí các pad trong một lưới BGA vuông có khoảng `count` pad.
+    """
+    side = int(count ** 0.5) or 1
+    return [((i % side) * pitch, (i // side) * pitch) for i in range(count)]
+
+
+def render_frames(scene, frames, size=1000, zoom=None):
+    """
+    Vẽ toàn bộ scene vào QImage `frames` lần, trả về thời gian trung bình mỗi khung hình (ms).
+    Nếu có `zoom`, kích thước ảnh bằng kích thước scene nhân với zoom.
+    """
+    source = scene.itemsBoundingRect()
+    if zoom is None:
+        image = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+    else:
+        image = QImage(max(1, int(source.width() * zoom)), max(1, int(source.height() * zoom)),
+                       QImage.Format_ARGB32_Premultiplied)
+
+    def frame():
+        image.fill(Qt.white)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        scene.render(painter, QRectF(image.rect()), source)
+        painter.end()
+
+    return timed(frame, frames)[0]
+
+
+def legacy_pad_data(pad_data):
+    """
+    Sao chép dữ liệu pad như Pad.__init__ trước khi có PadSpec (deep copy JSON cho từng pad).
+    """
+    pad_data = json.loads(json.dumps(pad_data))
+    for key, default in (('width', 1.5), ('height', 1.5), ('hole_diameter', 0.8), ('corner_radius', 0)):
+        if key not in pad_data or not isinstance(pad_data[key], (int, float)):
+            pad_data[key] = default
+    if 'layers' not in pad_data:
+        pad_data['layers'] = {
+            'top_copper': True, 'bottom_copper': False,
+            'top_mask': True, 'bottom_mask': False,
+            'top_paste': True, 'bottom_paste': False
+        }
+    if 'thermal' not in pad_data:
+        pad_data['thermal'] = {'enabled': True, 'spoke_width': 0.3, 'gap_width': 0.2}
+    return pad_data
+
+
+class LegacyPad(Pad):
+    """Pad.paint trước khi có cache hình học, dùng làm mốc so sánh"""
+
+    def boundingRect(self):
+        width = self.spec.width * 10
+        height = self.spec.height * 10
+        return QRectF(-width / 2, -height / 2, width, height)
+
+    def shape(self):
+        return QGraphicsItem.shape(self)
+
+    def paint(self, painter, option, widget):
+        width = self.spec.width * 10
+        height = self.spec.height * 10
+        hole_diameter = self.spec.hole_diameter * 10
+        corner_radius = self.spec.corner_radius * 10
+
+        painter.setPen(QPen(QColor(0, 128, 0), 1))
+        painter.setBrush(QBrush(QColor(0, 200, 0, 128) if "top_copper" in self.spec.layers
+                                else QColor(0, 100, 0, 64)))
+        if corner_radius > 0:
+            painter.drawRoundedRect(QRectF(-width / 2, -height / 2, width, height), corner_radius, corner_radius)
+        else:
+            painter.drawRect(QRectF(-width / 2, -height / 2, width, height))
+
+        if hole_diameter > 0:
+            painter.setPen(QPen(QColor(0, 0, 0), 1))
+            painter.setBrush(QBrush(QColor(255, 255, 255)))
+            painter.drawEllipse(QRectF(-hole_diameter / 2, -hole_diameter / 2, hole_diameter, hole_diameter))
+
+            spoke_width = self.spec.spoke_width * 10
+            painter.save()
+            for angle in [0, 90, 180, 270]:
+                painter.rotate(angle)
+                painter.setPen(QPen(QColor(0, 128, 0), 1))
+                painter.setBrush(QBrush(QColor(0, 200, 0, 128)))
+                painter.drawRect(QRectF(-width / 2, -spoke_width / 2, width / 2 - hole_diameter / 2, spoke_width))
+                painter.restore()
+                painter.save()
+            painter.restore()
+
+
+def bench_pad_paint(count=5000, frames=10):
+    """
+    So sánh thời gian mỗi khung hình của BGA 5.000 pad: Pad.paint cũ và Pad dùng cache hình học.
+    """
+    print(f"pad_paint: {count} THT pads, {frames} frames")
+    for name, pad_class in (("legacy paint", LegacyPad), ("cached geometry", Pad)):
+        scene = QGraphicsScene()
+        for x, y in bga_positions(count):
+            pad = pad_class(THT_PAD)
+            pad.setPos(x, y)
+            scene.addItem(pad)
+        report(f"{name} frame time", render_frames(scene, frames))
+
+
+def bench_pad_lod(count=5000, frames=10):
+    """
+    So sánh thời gian mỗi khung hình khi bật và tắt level-of-detail ở các mức zoom.
+    """
+    print(f"pad_lod: {count} THT pads, {frames} frames")
+    scene = QGraphicsScene()
+    for x, y in bga_positions(count):
+        pad = Pad(THT_PAD)
+        pad.setPos(x, y)
+        scene.addItem(pad)
+
+    thresholds = (Pad.lod_full_detail, Pad.lod_outline)
+    for zoom in (1.0, 0.3, 0.1):
+        Pad.set_lod_thresholds(0, 0)
+        report(f"zoom {zoom} full detail", render_frames(scene, frames, zoom=zoom))
+        Pad.set_lod_thresholds(*thresholds)
+        report(f"zoom {zoom} level of detail", render_frames(scene, frames, zoom=zoom))
+
+
+def bench_pad_create(count=100000):
+    """
+    So sánh thời gian và bộ nhớ Python khi tạo pad: deep copy JSON cho từng pad và PadSpec dùng chung.
+    """
+    print(f"pad_create: {count} pads")
+    spec = PadSpec.from_data(THT_PAD)
+
+    def legacy():
+        pad = Pad(spec)
+        pad.legacy_data = legacy_pad_data(THT_PAD)
+        return pad
+
+    for name, create in (("json copy per pad", legacy), ("shared PadSpec", lambda: Pad(spec))):
+        report(f"{name} create time", timed(lambda: [create() for _ in range(count)])[0])
+        tracemalloc.start()
+        pads = [create() for _ in range(count)]
+        report(f"{name} python memory", tracemalloc.get_traced_memory()[0] / (1024 * 1024), "MB")
+        tracemalloc.stop()
+        del pads
+
+
+def load_pad_items(scene, spec, positions):
+    for x, y in positions:
+        pad = Pad(spec)
+        pad.setPos(x, y)
+        scene.addItem(pad)
+
+
+def load_pad_field(scene, spec, positions):
+    field = PadField()
+    field.add_pads(spec, positions)
+    scene.addItem(field)
+
+
+def rubber_band_select(scene, rect):
+    """
+    Chọn như rubber band của ZoomableGraphicsView: vùng chọn của scene rồi chọn từng pad trong PadField.
+    """
+    path = QPainterPath()
+    path.addRect(rect)
+    scene.setSelectionArea(path)
+    for item in scene.items(rect):
+        if isinstance(item, PadField):
+            item.select_in_rect(item.mapRectFromScene(rect))
+
+
+def bench_pad_field(counts=(10000, 50000, 200000), frames=3):
+    """
+    So sánh Pad (mỗi pad một item) và PadField: nạp scene, vẽ lại toàn bộ và chọn bằng rubber band.
+    """
+    spec = PadSpec.from_data(THT_PAD)
+    for count in counts:
+        print(f"pad_field: {count} pads")
+        positions = bga_positions(count)
+        side = int(count ** 0.5) * 20
+        band = QRectF(side * 0.25, side * 0.25, side * 0.5, side * 0.5)
+        for name, load in (("Pad items", load_pad_items), ("PadField", load_pad_field)):
+            scene = QGraphicsScene()
+            report(f"{name} scene load", timed(lambda: load(scene, spec, positions))[0])
+            report(f"{name} repaint", render_frames(scene, frames))
+            report(f"{name} rubber band select", timed(lambda: rubber_band_select(scene, band))[0])
+
+
+def bench_scene_batch(existing=100000, count=10000):
+    """
+    So sánh thêm/xóa từng item và bulk_update trên scene đã có sẵn nhiều item, có view đang hiển thị.
+    """
+    print(f"scene_batch: paste/remove {count} items into a {existing}-item scene")
+    app = QApplication.instance()
+    for name in ("one by one", "bulk_update"):
+        scene = QGraphicsScene(0, 0, 10000, 10000)
+        view = QGraphicsView(scene)
+        view.show()
+        for x, y in bga_positions(existing, 15):
+            scene.addItem(QGraphicsRectItem(x, y, 10, 10))
+        scene.itemAt(0, 0, view.transform())
+        app.processEvents()
+        items = [QGraphicsRectItem(x, y, 5, 5) for x, y in bga_positions(count, 12)]
+
+        def paste():
+            if name == "bulk_update":
+                with bulk_update(scene) as batch:
+                    batch.add_items(items)
+            else:
+                for item in items:
+                    scene.addItem(item)
+            scene.itemAt(0, 0, view.transform())
+            app.processEvents()
+
+        def remove():
+            if name == "bulk_update":
+                with bulk_update(scene) as batch:
+                    batch.remove_items(items)
+            else:
+                for item in items:
+                    scene.removeItem(item)
+            scene.itemAt(0, 0, view.transform())
+            app.processEvents()
+
+        report(f"{name} paste", timed(paste)[0])
+        report(f"{name} remove", timed(remove)[0])
+        view.close()
+
+
+def bench_layers(count=100000):
+    """
+    So sánh ẩn, đổi màu và đổi thứ tự một layer: duyệt từng item và LayerItem cha.
+    """
+    print(f"layers: {count} items on one layer")
+    scene = QGraphicsScene()
+    manager = LayerManager(scene)
+    with bulk_update(scene):
+        for x, y in bga_positions(count, 15):
+            manager.add_item_to_layer("top_copper", LayerLineItem(x, y, x + 10, y))
+    items = manager.layers["top_copper"].items
+
+    def per_item():
+        color = QColor(255, 0, 0)
+        for item in items:
+            item.setVisible(False)
+            item.setPen(QPen(color))
+            item.setZValue(5)
+        for item in items:
+            item.setVisible(True)
+
+    def per_layer():
+        manager.set_layer_visible("top_copper", False)
+        manager.set_layer_color("top_copper", QColor(255, 0, 0))
+        manager.set_layer_z_index("top_copper", 5)
+        manager.set_layer_visible("top_copper", True)
+
+    report("per item hide/recolor/reorder", timed(per_item)[0])
+    report("per layer hide/recolor/reorder", timed(per_layer)[0])
+
+
+def bench_spatial_index(count=100000, queries=200):
+    """
+    So sánh truy vấn hình chữ nhật, bán kính và k gần nhất: SpatialIndex của layer và duyệt scene.items().
+    """
+    print(f"spatial_index: {count} pads on one layer, {queries} queries each")
+    scene = QGraphicsScene()
+    manager = LayerManager(scene)
+    spec = PadSpec.from_data(THT_PAD)
+    with bulk_update(scene):
+        for x, y in bga_positions(count, 20):
+            pad = Pad(spec)
+            pad.setPos(x, y)
+            manager.add_item_to_layer("top_copper", pad)
+    layer = manager.layers["top_copper"]
+    side = int(count ** 0.5) * 20
+    rng = random.Random(1)
+    points = [QPointF(rng.uniform(0, side), rng.uniform(0, side)) for _ in range(queries)]
+
+    def scan():
+        return [item for item in scene.items() if item.parentItem() is layer]
+
+    def brute_rect(point):
+        rect = QRectF(point.x(), point.y(), 100, 100)
+        return [item for item in scan() if item.sceneBoundingRect().intersects(rect)]
+
+    def brute_radius(point, radius=30):
+        result = []
+        for item in scan():
+            rect = item.sceneBoundingRect()
+            dx = max(rect.left() - point.x(), 0, point.x() - rect.right())
+            dy = max(rect.top() - point.y(), 0, point.y() - rect.bottom())
+            if math.hypot(dx, dy) <= radius:
+                result.append(item)
+        return result
+
+    def brute_nearest(point, k=5):
+        def distance(item):
+            rect = item.sceneBoundingRect()
+            dx = max(rect.left() - point.x(), 0, point.x() - rect.right())
+            dy = max(rect.top() - point.y(), 0, point.y() - rect.bottom())
+            return math.hypot(dx, dy)
+        return sorted(scan(), key=distance)[:k]
+
+    brute_points = points[:5]  # Duyệt toàn bộ scene rất chậm, chỉ đo vài truy vấn
+    cases = (
+        ("rect 100x100", brute_rect, lambda p: manager.items_in_rect("top_copper", QRectF(p.x(), p.y(), 100, 100))),
+        ("radius 30", brute_radius, lambda p: manager.items_in_radius("top_copper", p, 30)),
+        ("5 nearest", brute_nearest, lambda p: manager.nearest_items("top_copper", p, 5)),
+    )
+    for name, brute, indexed in cases:
+        report(f"{name} scene.items() scan", timed(lambda: [brute(p) for p in brute_points])[0] / len(brute_points))
+        report(f"{name} spatial index", timed(lambda: [indexed(p) for p in points])[0] / len(points))
+
+
+def bench_layer_rasters():
+    """
+    Bộ nhớ raster của PCBLayerManager: pixmap đầy đủ cho mỗi layer và tile cấp phát khi cần.
+    """
+    print("layer_rasters: PCBLayerManager memory")
+    mb = 1024 * 1024
+    for size, budget in ((QSize(800, 600), 64 * mb), (QSize(8000, 6000), 32 * mb)):
+        manager = PCBLayerManager(pcb_size=size, tile_budget=budget)
+        layer_count = len(manager.layers)
+        full = layer_count * size.width() * size.height() * 4 / mb
+        if size.width() > 800:
+            # Đường mạch phủ toàn bộ board lớn trên một layer
+            def traces(painter, width=size.width(), height=size.height()):
+                painter.setPen(QPen(QColor(0, 100, 255), 2))
+                for y in range(0, height, 40):
+                    painter.drawLine(0, y, width, y)
+            manager.layers["top.electric"].add_content(traces)
+        report(f"{size.width()}x{size.height()} full pixmaps ({layer_count} layers)", full, "MB")
+        report(f"{size.width()}x{size.height()} tiles after load", manager.tile_cache.used_bytes / mb, "MB")
+        image = QImage(size, QImage.Format_ARGB32_Premultiplied)
+        painter = QPainter(image)
+        elapsed = timed(lambda: [layer.render(painter) for layer in manager.layers.values()])[0]
+        painter.end()
+        report(f"{size.width()}x{size.height()} tiles after full paint", manager.tile_cache.used_bytes / mb, "MB")
+        report(f"{size.width()}x{size.height()} full paint time", elapsed)
+
+
+def paint_widget(widget, frames):
+    """
+    Vẽ lại widget `frames` lần vào một QImage, trả về thời gian trung bình (ms).
+    """
+    image = QImage(widget.size(), QImage.Format_ARGB32_Premultiplied)
+
+    def frame():
+        widget.render(image)
+    return timed(frame, frames)[0]
+
+
+def bench_layer_composite(frames=20):
+    """
+    Vẽ lại PCBLayerManager: vẽ từng layer mỗi lần và dùng ảnh ghép đã cache.
+    """
+    print(f"layer_composite: PCBLayerManager repaint, {frames} frames")
+    manager = PCBLayerManager()
+    manager.resize(manager.pcb_size)
+    image = QImage(manager.size(), QImage.Format_ARGB32_Premultiplied)
+
+    def paint_all_layers():
+        # Cách cũ: mỗi lần vẽ lại duyệt toàn bộ các layer
+        painter = QPainter(image)
+        painter.fillRect(image.rect(), Qt.black)
+        for layer in manager.stack:
+            layer.render(painter)
+        painter.end()
+    paint_widget(manager, 1)  # Tạo sẵn tile và ảnh ghép
+    report(f"paint every layer ({len(manager.stack)} layers)", timed(paint_all_layers, frames)[0])
+    report("cached composite", paint_widget(manager, frames))
+
+    manager.set_current_layer("top.electric")
+    paint_widget(manager, 1)
+    names = [name for name in manager.layers if name != "top.electric"]
+
+    def toggle():
+        name = names[toggle.count % len(names)]
+        toggle.count += 1
+        side, layer_type = name.split(".", 1)
+        manager.set_layer_visibility(side, layer_type, not manager.layers[name].visible)
+        manager.set_layer_visibility(side, layer_type, not manager.layers[name].visible)
+        return paint_widget(manager, 1)
+    toggle.count = 0
+    report("toggle visibility + repaint", timed(toggle, frames)[0])
+
+    def switch_current():
+        manager.set_current_layer(names[switch_current.count % len(names)])
+        switch_current.count += 1
+        return paint_widget(manager, 1)
+    switch_current.count = 0
+    report("change current layer + repaint", timed(switch_current, frames)[0])
+
+    manager.set_current_layer_only(True)
+    report("current layer only (dimmed)", paint_widget(manager, frames))
+
+
+def wheel(view, steps):
+    """
+    Gửi một sự kiện cuộn chuột (steps > 0 để phóng to) vào giữa view.
+    """
+    center = QPointF(view.viewport().rect().center())
+    view.wheelEvent(QWheelEvent(center, center, QPoint(0, 0), QPoint(0, 120 * steps),
+                                Qt.NoButton, Qt.NoModifier, Qt.NoScrollPhase, False))
+
+
+def wait_for_tiles(view):
+    """
+    Xử lý sự kiện cho tới khi mọi tile đang thấy đều mới; trả về thời gian chờ (ms).
+    """
+    app = QApplication.instance()
+    cache = view.tile_cache
+    start = time.perf_counter()
+    while True:
+        paint_widget(view.viewport(), 1)
+        cache.resume()
+        cache.wait()
+        app.processEvents()
+        if not cache._queue and not cache._in_flight and not cache._stale.intersection(cache.tiles.keys()):
+            paint_widget(view.viewport(), 1)
+            if not cache._queue:
+                break
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_tile_cache(count=40000, steps=8):
+    """
+    Zoom và pan trên board dày đặc: vẽ lại trực tiếp và dán tile từ cache tile.
+    """
+    print(f"tile_cache: {count} Pad items, {steps} wheel steps, 1000x800 view")
+    spec = PadSpec.from_data(THT_PAD)
+    scene = QGraphicsScene(0, 0, 4000, 4000)
+    load_pad_items(scene, spec, bga_positions(count))
+    view = ZoomableGraphicsView(scene)
+    view.resize(1000, 800)
+    view.show()
+
+    def zoom_frames():
+        # Mỗi bước cuộn là một khung hình vẽ lại đồng bộ
+        def frame():
+            wheel(view, frame.direction)
+            paint_widget(view.viewport(), 1)
+            frame.count += 1
+            if frame.count % steps == 0:
+                frame.direction = -frame.direction
+        frame.count, frame.direction = 0, 1
+        return timed(frame, steps * 2)[0]
+
+    def pan_frames():
+        def frame():
+            view.horizontalScrollBar().setValue(view.horizontalScrollBar().value() + 40)
+            paint_widget(view.viewport(), 1)
+        return timed(frame, steps)[0]
+
+    view.set_tile_cache_enabled(False)
+    report("direct: zoom step frame", zoom_frames())
+    report("direct: pan frame", pan_frames())
+
+    view.set_tile_cache_enabled(True)
+    view.resetTransform()
+    view.zoom_factor = 1.0
+    report("tiles: first fill (background)", wait_for_tiles(view))
+    report("tiles: zoom step frame (stale tiles)", zoom_frames())
+    report("tiles: catch-up after zoom", wait_for_tiles(view))
+    report("tiles: pan frame", pan_frames())
+    report("tiles: catch-up after pan", wait_for_tiles(view))
+    report("tiles: fresh frame", paint_widget(view.viewport(), steps))
+    view.tile_cache.wait()
+
+
+def bench_pan(count=40000, frames=20, step=30):
+    """
+    Pan bằng chuột giữa trên board dày đặc: vẽ lại toàn bộ viewport mỗi khung hình
+    và chỉ vẽ dải mới lộ ra (phần còn lại được cuộn bằng blit).
+    """
+    print(f"pan: {count} Pad items, {frames} frames of {step} px, 1000x800 view")
+    spec = PadSpec.from_data(THT_PAD)
+    scene = QGraphicsScene(0, 0, 4000, 4000)
+    load_pad_items(scene, spec, bga_positions(count))
+    view = ZoomableGraphicsView(scene)
+    view.resize(1000, 800)
+    view.show()
+    viewport = view.viewport()
+    image = QImage(viewport.size(), QImage.Format_ARGB32_Premultiplied)
+
+    def pan_frames(strips_only):
+        start = QPointF(viewport.rect().center())
+        view.mousePressEvent(QMouseEvent(QMouseEvent.MouseButtonPress, start, Qt.MiddleButton,
+                                         Qt.MiddleButton, Qt.NoModifier))
+
+        def frame():
+            frame.x -= step
+            view.mouseMoveEvent(QMouseEvent(QMouseEvent.MouseMove, QPointF(frame.x, start.y()), Qt.NoButton,
+                                            Qt.MiddleButton, Qt.NoModifier))
+            if strips_only:
+                # Phần đã có được blit bởi viewport().scroll(); chỉ dải bên phải cần vẽ
+                strip = QRegion(viewport.width() - step, 0, step, viewport.height())
+                viewport.render(image, strip.boundingRect().topLeft(), strip)
+            else:
+                viewport.render(image)
+        frame.x = start.x()
+        elapsed = timed(frame, frames)[0]
+        view.mouseReleaseEvent(QMouseEvent(QMouseEvent.MouseButtonRelease, QPointF(frame.x, start.y()),
+                                           Qt.MiddleButton, Qt.NoButton, Qt.NoModifier))
+        view.horizontalScrollBar().setValue(0)
+        return elapsed
+
+    for name, enabled in (("direct", False), ("tiles", True)):
+        view.set_tile_cache_enabled(enabled)
+        if enabled:
+            # Tile ở mức zoom này đã có sẵn (đã từng xem vùng này)
+            for x in range(0, 4000, 1000):
+                view.horizontalScrollBar().setValue(x)
+                wait_for_tiles(view)
+            view.horizontalScrollBar().setValue(0)
+        report(f"{name}: full viewport redraw per frame", pan_frames(False))
+        report(f"{name}: scroll + exposed strip per frame", pan_frames(True))
+    view.tile_cache.wait()
+
+
+def bench_adaptive_quality(count=40000, frames=10):
+    """
+    Khung hình đầy đủ và khung hình nháp (khi đang tương tác và vượt ngân sách) khi vẽ trực tiếp.
+    """
+    print(f"adaptive_quality: {count} Pad items, 1000x800 view, direct painting")
+    spec = PadSpec.from_data(THT_PAD)
+    scene = QGraphicsScene(0, 0, 4000, 4000)
+    load_pad_items(scene, spec, bga_positions(count))
+    view = ZoomableGraphicsView(scene)
+    view.set_tile_cache_enabled(False)
+    view.resize(1000, 800)
+    view.show()
+    frames_seen = []
+    view.frame_rendered.connect(lambda ms, draft: frames_seen.append((ms, draft)))
+
+    paint_widget(view.viewport(), frames)
+    report("full quality frame", sum(ms for ms, _ in frames_seen) / len(frames_seen))
+    report("frame budget", view.frame_budget_ms)
+
+    frames_seen.clear()
+    view.mark_interaction()  # Khung hình trước vượt ngân sách -> vẽ nháp
+    paint_widget(view.viewport(), frames)
+    draft = [ms for ms, is_draft in frames_seen if is_draft]
+    report(f"draft frame ({len(draft)}/{len(frames_seen)} frames draft)", sum(draft) / max(1, len(draft)))
+
+    frames_seen.clear()
+    view.end_interaction()  # Hết thời gian rảnh -> một khung hình đầy đủ
+    paint_widget(view.viewport(), 1)
+    report("settle frame (full quality)", frames_seen[-1][0])
+
+
+def bench_draw_preview(existing=100000, moves=120, interval_ms=4):
+    """
+    Kéo chuột vẽ một đường trên scene đã có nhiều item: setLine trên item thật cho mỗi sự kiện
+    và lớp phủ xem trước gom sự kiện theo khung hình. Chuột gửi một sự kiện mỗi `interval_ms`.
+    """
+    print(f"draw_preview: drag a line over {existing} items, {moves} mouse moves every {interval_ms} ms")
+    app = QApplication.instance()
+    for name in ("setLine per move", "preview overlay"):
+        drawing = DrawingApp()
+        drawing.resize(1000, 800)
+        scene = drawing.scene
+        scene.setSceneRect(0, 0, 5000, 5000)
+        with bulk_update(scene) as batch:
+            batch.add_items(QGraphicsRectItem(x, y, 10, 10) for x, y in bga_positions(existing, 15))
+        drawing.show()
+        view = drawing.drawing_window
+        view.set_tile_cache_enabled(True)
+        viewport = view.viewport()
+        image = QImage(viewport.size(), QImage.Format_ARGB32_Premultiplied)
+        wait_for_tiles(view)
+        drawing.drawing_mode = "line"
+        start = QPointF(100, 100)
+        start_scene = view.mapToScene(start.toPoint())
+        line_item = None
+        if name == "preview overlay":
+            app.sendEvent(viewport, QMouseEvent(QMouseEvent.MouseButtonPress, start, Qt.LeftButton,
+                                                Qt.LeftButton, Qt.NoModifier))
+        else:
+            # Cách cũ: item thật được thêm ngay khi nhấn chuột
+            line_item = QGraphicsLineItem(QLineF(start_scene, start_scene))
+            scene.addItem(line_item)
+
+        elapsed = 0.0
+        for index in range(moves):
+            pos = QPointF(100 + index * 6, 100 + index * 4)
+            tick = time.perf_counter()
+            if line_item is not None:
+                line_item.setLine(QLineF(start_scene, view.mapToScene(pos.toPoint())))
+            else:
+                app.sendEvent(viewport, QMouseEvent(QMouseEvent.MouseMove, pos, Qt.NoButton,
+                                                    Qt.LeftButton, Qt.NoModifier))
+            app.processEvents()
+            dirty = view.mapFromScene(QRectF(start_scene, view.mapToScene(pos.toPoint())).normalized())
+            region = QRegion(dirty.boundingRect().adjusted(-3, -3, 3, 3))
+            viewport.render(image, region.boundingRect().topLeft(), region)
+            elapsed += time.perf_counter() - tick
+            time.sleep(interval_ms / 1000)
+        if line_item is None:
+            app.sendEvent(viewport, QMouseEvent(QMouseEvent.MouseButtonRelease, pos, Qt.LeftButton,
+                                                Qt.NoButton, Qt.NoModifier))
+        report(f"{name}: per mouse move", elapsed * 1000 / moves)
+        view.tile_cache.wait()
+        drawing.close()
+
+
+def freehand_stroke(count):
+    """
+    Một nét vẽ tự do dài: các điểm nguyên (như sự kiện chuột) trên một đường cong Lissajous.
+    """
+    return [QPointF(round(2000 + 1500 * math.cos(i * 0.002) * math.cos(i * 0.0005)),
+                    round(2000 + 1500 * math.sin(i * 0.003)))
+            for i in range(count)]
+
+
+def bench_trace(count=50000, tolerance=0.75):
+    """
+    Đường mạch vẽ tự do: mỗi đoạn một QGraphicsLineItem và một TraceItem đã đơn giản hóa.
+    """
+    print(f"trace: freehand stroke of {count} mouse points, tolerance {tolerance}")
+    points = freehand_stroke(count)
+
+    def line_items():
+        scene = QGraphicsScene()
+        for start, end in zip(points, points[1:]):
+            scene.addItem(QGraphicsLineItem(QLineF(start, end)))
+        return scene
+
+    def trace_item():
+        stroke = StrokeSimplifier(points[0], tolerance)
+        block = len(points) // 10
+        costs = []
+        for index in range(1, len(points), block):
+            costs.append(timed(lambda: [stroke.add_point(point) for point in points[index:index + block]])[0] / block)
+        scene = QGraphicsScene()
+        item = TraceItem(stroke.finish(), QPen(Qt.black, 2))
+        scene.addItem(item)
+        return scene, item, costs
+
+    elapsed, scene = timed(line_items)
+    report("line items: build", elapsed)
+    report("line items: items", len(scene.items()), "")
+    report("line items: repaint", render_frames(scene, 3))
+
+    elapsed, (scene, item, costs) = timed(trace_item)
+    report("TraceItem: build", elapsed)
+    report("TraceItem: vertices", len(item), "")
+    report("TraceItem: array bytes", item.points.nbytes, "B")
+    report("TraceItem: repaint", render_frames(scene, 3))
+    report("add_point cost, first 10% of stroke", costs[0] * 1000, "us")
+    report("add_point cost, last 10% of stroke", costs[-1] * 1000, "us")
+
+
+def mouse_event(viewport, kind, pos, button, buttons):
+    """
+    Sự kiện chuột có đủ vị trí màn hình (scene tìm item dưới chuột theo screenPos).
+    """
+    pos = QPointF(pos)
+    return QMouseEvent(kind, pos, pos, QPointF(viewport.mapToGlobal(pos.toPoint())), button, buttons, Qt.NoModifier)
+
+
+def bench_snap(count=2000, moves=60, queries=2000):
+    """
+    Kéo một vùng chọn `count` pad bằng chuột: di chuyển mặc định của Qt (không bắt lưới),
+    bắt lưới từng pad bằng vòng lặp Python và SnapEngine (một bước NumPy mỗi khung hình).
+    Sau đó đo truy vấn bắt đối tượng (tâm pad gần con trỏ nhất) trên scene lớn.
+    """
+    print(f"snap: drag {count} selected pads, {moves} mouse moves; {queries} object-snap queries")
+    app = QApplication.instance()
+    spec = PadSpec.from_data(THT_PAD)
+    for name in ("Qt default move", "per-pad snap loop", "SnapEngine"):
+        scene = QGraphicsScene(0, 0, 5000, 5000)
+        view = ZoomableGraphicsView(scene)
+        view.set_tile_cache_enabled(False)
+        view.resize(1000, 800)
+        pads = []
+        with bulk_update(scene) as batch:
+            for index, (x, y) in enumerate(bga_positions(count, 20)):
+                pad = Pad(spec)
+                pad.setPos(x + 3 + index % 2 * 4, y + 3)  # Lệch lưới, bước 4 không phải bội của lưới
+                pads.append(pad)
+            batch.add_items(pads)
+        for pad in pads:
+            pad.setSelected(True)
+        engine = SnapEngine(10)
+        if name == "SnapEngine":
+            set_snap_engine(scene, engine)
+        view.show()
+        view.centerOn(pads[0])
+        viewport = view.viewport()
+        start = view.mapFromScene(pads[0].scenePos())
+        app.sendEvent(viewport, mouse_event(viewport, QMouseEvent.MouseButtonPress, start, Qt.LeftButton, Qt.LeftButton))
+        origin = [(pad.scenePos().x(), pad.scenePos().y()) for pad in pads]
+
+        elapsed = 0.0
+        for index in range(1, moves + 1):
+            pos = QPointF(start.x() + index * 3, start.y() + index * 2)
+            tick = time.perf_counter()
+            app.sendEvent(viewport, mouse_event(viewport, QMouseEvent.MouseMove, pos, Qt.NoButton, Qt.LeftButton))
+            if name == "per-pad snap loop":
+                # Cách cũ: bắt lưới từng pad sau khi Qt đã di chuyển
+                delta = view.mapToScene(pos.toPoint()) - view.mapToScene(start)
+                for pad, (x, y) in zip(pads, origin):
+                    pad.setPos(engine.snap_to_grid_point(QPointF(x + delta.x(), y + delta.y())))
+            elapsed += time.perf_counter() - tick
+        app.sendEvent(viewport, mouse_event(viewport, QMouseEvent.MouseButtonRelease, pos, Qt.LeftButton, Qt.NoButton))
+        moved = sum(pad.scenePos() != QPointF(x, y) for pad, (x, y) in zip(pads, origin))
+        # Pad nằm lệch lưới: chỉ pad bị kéo được bắt lưới, các pad khác phải dời cùng một đoạn
+        shifts = {(round(pad.x() - x, 6), round(pad.y() - y, 6)) for pad, (x, y) in zip(pads, origin)}
+        report(f"{name}: per mouse move", elapsed * 1000 / moves)
+        report(f"{name}: pads moved", moved, "")
+        report(f"{name}: distinct shifts (1 = spacing kept)", len(shifts), "")
+        report(f"{name}: dragged pad on grid", int(pads[0].x() % 10 == 0 and pads[0].y() % 10 == 0), "")
+        view.close()
+
+    scene = QGraphicsScene(0, 0, 5000, 5000)
+    with bulk_update(scene) as batch:
+        batch.add_items(Pad(spec) for _ in range(count * 10))
+    for pad, (x, y) in zip(scene.items(), bga_positions(count * 10, 15)):
+        pad.setPos(x, y)
+    engine = SnapEngine(10)
+    rng = random.Random(1)
+    points = [QPointF(rng.uniform(0, 1500), rng.uniform(0, 1500)) for _ in range(queries)]
+    scene.items(QRectF(0, 0, 1, 1))  # Dựng chỉ mục BSP trước khi đo
+    elapsed, hits = timed(lambda: [engine.snap_point(scene, point, 1.0) for point in points])
+    report(f"object snap ({count * 10} pads): per query", elapsed * 1000 / queries, "us")
+    report("object snap: hits", sum(kind == "object" for _, kind in hits), "")
+
+    # Cùng các pad trong một layer: engine tìm qua chỉ mục không gian của LayerManager
+    scene = QGraphicsScene(0, 0, 5000, 5000)
+    manager = LayerManager(scene)
+    pads = [Pad(spec) for _ in range(count * 10)]
+    for pad, (x, y) in zip(pads, bga_positions(count * 10, 15)):
+        pad.setPos(x, y)
+    manager.add_items_to_layer("top_copper", pads)
+    scene.items(QRectF(0, 0, 1, 1))
+    engine = SnapEngine(10)
+    elapsed = timed(lambda: [engine.snap_point(scene, point, 1.0) for point in points[:100]])[0]
+    report(f"object snap, scene.items in layers ({count * 10} pads): per query", elapsed * 1000 / 100, "us")
+    engine = SnapEngine(10, layer_manager=manager)
+    elapsed, layered = timed(lambda: [engine.snap_point(scene, point, 1.0) for point in points])
+    report(f"object snap, layer index ({count * 10} pads): per query", elapsed * 1000 / queries, "us")
+    report("object snap, layer index: hits", sum(kind == "object" for _, kind in layered), "")
+
+
+def bench_settings(toggles=30):
+    """
+    Bật/tắt `toggles` ô chọn layer: ghi settings.json đồng bộ sau mỗi thay đổi (cách cũ)
+    và ghi nền có gom thay đổi. Đo thời gian trên luồng gọi (luồng GUI) và số lần ghi file.
+    """
+    print(f"settings: {toggles} layer checkbox toggles")
+    names = [f"Layer{index}" for index in range(toggles)]
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ("synchronous save", "write-behind"):
+            manager = SettingsManager(os.path.join(directory, f"{name}.json"))
+            writes = manager.write_count
+
+            def toggle_all():
+                for layer in names:
+                    manager.set_setting("layers", layer, False)
+                    if name == "synchronous save":
+                        manager.save_settings()
+
+            elapsed, _ = timed(toggle_all)
+            report(f"{name}: GUI thread time", elapsed)
+            manager.close()
+            report(f"{name}: file writes", manager.write_count - writes, "")
+
+
+def rebuild_preview(scene, view, width, height, hole, spoke, gap):
+    """
+    Hình xem trước kiểu cũ: xóa scene, dựng lại pad, lỗ và 8 hình nan nhiệt, rồi fitInView.
+    """
+    scene.clear()
+    path = QPainterPath()
+    path.addRect(-width / 2, -height / 2, width, height)
+    scene.addItem(QGraphicsPathItem(path))
+    scene.addItem(QGraphicsEllipseItem(-hole / 2, -hole / 2, hole, hole))
+    for angle in (0, 90, 180, 270):
+        spoke_item = QGraphicsRectItem(-width / 2, -spoke / 2, width, spoke)
+        spoke_item.setRotation(angle)
+        scene.addItem(spoke_item)
+        gap_item = QGraphicsRectItem(-hole / 2 - gap, -spoke / 2 - gap / 2, gap, spoke + gap)
+        gap_item.setRotation(angle)
+        scene.addItem(gap_item)
+    view.fitInView(scene.itemsBoundingRect(), Qt.KeepAspectRatio)
+
+
+def bench_pad_preview(values=("2.54", "1.27", "3.175", "0.635")):
+    """
+    Gõ từng ký tự của vài giá trị vào ô Width của PadEditor: dựng lại hình xem trước mỗi phím (cách cũ)
+    và cập nhật pad xem trước tại chỗ một lần sau khi ngừng gõ. Cả hai đều vẽ lại khung xem trước.
+    """
+    keystrokes = [value[:length] for value in values for length in range(1, len(value) + 1)]
+    print(f"pad_preview: {len(keystrokes)} keystrokes in the Width field")
+    app = QApplication.instance()
+    editor = PadEditor()
+    editor.show()
+    app.processEvents()
+    viewport = editor.pad_preview_view.viewport()
+    image = QImage(viewport.size(), QImage.Format_ARGB32_Premultiplied)
+
+    scene = QGraphicsScene()
+    view = QGraphicsView(scene)
+    view.setRenderHint(QPainter.Antialiasing)
+    view.resize(editor.pad_preview_view.size())
+    view.show()
+    app.processEvents()
+
+    def rebuild_all():
+        for text in keystrokes:
+            try:
+                width = float(text) * 20
+            except ValueError:
+                width = 30
+            rebuild_preview(scene, view, width, 30, 16, 6, 4)
+            view.viewport().render(image)
+
+    elapsed, _ = timed(rebuild_all)
+    report("rebuild per keystroke: total", elapsed)
+    report("rebuild per keystroke: updates", len(keystrokes), "")
+
+    updates = 0
+    elapsed = 0.0
+    for value in values:
+        for length in range(1, len(value) + 1):
+            tick = time.perf_counter()
+            editor.width_edit.setText(value[:length])  # Chỉ khởi động lại bộ hẹn giờ
+            elapsed += time.perf_counter() - tick
+        # Người dùng ngừng gõ: bộ hẹn giờ hết hạn một lần (gọi trực tiếp phần việc của nó)
+        updates += editor._preview_timer.isActive()
+        tick = time.perf_counter()
+        editor.update_pad_preview()
+        viewport.render(image)
+        elapsed += time.perf_counter() - tick
+    report("in-place preview: total", elapsed * 1000)
+    report("in-place preview: updates", updates, "")
+    report("in-place preview: scene items", len(editor.pad_preview_scene.items()), "")
+    view.close()
+    editor.close()
+
+def bench_bulk_edit(count=3000, repeat=5):
+    """
+    Đổi đường kính lỗ khoan của `count` via đang được chọn (trên layer top_copper):
+    sửa từng pad (with_changes + set_spec cho mỗi pad) và edit_pads (mỗi spec dùng chung sửa một lần).
+    """
+    print(f"bulk_edit: change hole_diameter on {count} selected vias")
+    scene = QGraphicsScene(0, 0, 5000, 5000)
+    layers = LayerManager(scene)
+    via = PadSpec.from_data(THT_PAD)
+    pads = []
+    with bulk_update(scene):
+        for x, y in bga_positions(count, 20):
+            pad = Pad(via)
+            pad.setPos(x, y)
+            layers.add_item_to_layer("top_copper", pad)
+            pads.append(pad)
+    for pad in pads:
+        pad.setSelected(True)
+    sizes = [0.3 + index * 0.05 for index in range(repeat)]
+
+    def per_pad():
+        for size in sizes:
+            for pad in scene.selectedItems():
+                pad.set_spec(pad.spec.with_changes(hole_diameter=size))
+
+    def bulk():
+        for size in sizes:
+            edits.append(edit_pads(scene, selected_pad_items(scene), {"hole_diameter": size}))
+
+    edits = []
+    report("per-pad set_spec: per edit", timed(per_pad)[0] / repeat)
+    report("edit_pads: per edit", timed(bulk)[0] / repeat)
+    report("edit_pads: distinct specs rewritten", len(edits[-1].pad_groups), "")
+    report("undo (one step)", timed(edits[-1].undo)[0])
+
+
+def bench_pad_editor_open(opens=20):
+    """
+    Độ trễ mở Pad Editor (tới khi hộp thoại đã vẽ xong): tạo hộp thoại mới mỗi lần (cách cũ),
+    lần mở đầu tiên khi chưa dựng sẵn, và dùng lại một hộp thoại đã dựng sẵn lúc rảnh.
+    """
+    print(f"pad_editor_open: open and close the pad editor {opens} times")
+    app = QApplication.instance()
+
+    def open_editor(editor):
+        editor.show()
+        app.processEvents()  # Bố cục, polish và lần vẽ đầu tiên
+        editor.hide()
+
+    def new_each_time():
+        editor = PadEditor()
+        open_editor(editor)
+        editor.deleteLater()
+
+    new_each_time()  # Làm nóng style và font cho công bằng giữa các cách
+    report("new dialog per open: per open", timed(new_each_time, opens)[0])
+
+    def first_open(prewarm):
+        # Trung bình lần mở đầu tiên của nhiều hộp thoại: tạo khi bấm (không dựng sẵn),
+        # hoặc đã tạo và dựng sẵn lúc rảnh (không tính vào độ trễ)
+        opens_ms, prewarm_ms = [], []
+        for _ in range(5):
+            if prewarm:
+                editor = PadEditor()
+                prewarm_ms.append(timed(editor.prewarm)[0])
+                opens_ms.append(timed(lambda: (editor.reset(), open_editor(editor)))[0])
+            else:
+                elapsed, editor = timed(PadEditor)
+                opens_ms.append(elapsed + timed(lambda: (editor.reset(), open_editor(editor)))[0])
+            editor.deleteLater()
+        return sum(opens_ms) / len(opens_ms), sum(prewarm_ms) / 5
+
+    report("lazy dialog, first open (no prewarm)", first_open(False)[0])
+    first, prewarm = first_open(True)
+    report("prewarm on idle (off the click path)", prewarm)
+    report("lazy dialog, first open (prewarmed)", first)
+    editor = PadEditor()
+    editor.prewarm()
+    report("reused dialog: per open", timed(lambda: (editor.reset(), open_editor(editor)), opens)[0])
+
+
+def bench_undo(existing=20000, count=10000):
+    """
+    Hoàn tác/làm lại dán rồi di chuyển `count` pad trên layer top_copper, có view đang hiển thị:
+    mỗi pad một lệnh (mỗi lệnh một lần cập nhật scene) và một lệnh cho cả nhóm (một bulk_update).
+    """
+    print(f"undo: paste/move {count} pads in a {existing}-pad scene")
+    app = QApplication.instance()
+    via = PadSpec.from_data(THT_PAD)
+    for name in ("per item", "one command"):
+        scene = QGraphicsScene(0, 0, 10000, 10000)
+        view = QGraphicsView(scene)
+        view.show()
+        layers = LayerManager(scene)
+        stack = UndoStack()
+        set_undo_stack(scene, stack)
+        layers.add_items_to_layer("top_copper", [Pad(via) for _ in range(existing)])
+        app.processEvents()
+        pads = []
+        for x, y in bga_positions(count, 12):
+            pad = Pad(via)
+            pad.setPos(x, y)
+            pads.append(pad)
+        attach = lambda items: layers.add_items_to_layer("top_copper", items)
+        detach = lambda items: layers.remove_items_from_layer("top_copper", items)
+        groups = [[pad] for pad in pads] if name == "per item" else [pads]
+
+        def settle():
+            scene.itemAt(0, 0, view.transform())
+            app.processEvents()
+
+        def paste():
+            for group in groups:
+                stack.push(AddItemsCommand(scene, group, attach, detach, "Paste"))
+            settle()
+
+        def move():
+            for group in groups:
+                old = item_positions(group)
+                stack.push(MoveItemsCommand(scene, group, old, old + (25.0, 10.0)))
+            settle()
+
+        def undo():
+            for _ in groups:
+                stack.undo()
+            settle()
+
+        def redo():
+            for _ in groups:
+                stack.redo()
+            settle()
+
+        report(f"{name}: paste", timed(paste)[0])
+        report(f"{name}: undo paste", timed(undo)[0])
+        report(f"{name}: redo paste", timed(redo)[0])
+        report(f"{name}: move", timed(move)[0])
+        report(f"{name}: undo move", timed(undo)[0])
+        report(f"{name}: redo move", timed(redo)[0])
+        report(f"{name}: history memory", stack.memory_used / 1024, "KiB")
+        view.close()
+
+
+def bench_project(pads=490000, shapes=10000):
+    """
+    Lưu/mở một board `pads + shapes` đối tượng: file project nhị phân (mmap) so với bản JSON tương đương.
+    Kiểm tra round trip: lưu -> mở -> dựng lại scene -> gom lại cho kết quả giống hệt.
+    """
+    print(f"project: {pads + shapes} objects ({pads} pads in PadFields, {shapes} shapes)")
+    scene = QGraphicsScene()
+    layers = LayerManager(scene)
+    specs = [PadSpec.from_data(THT_PAD).with_changes(width=1.0 + index * 0.25) for index in range(4)]
+    positions = np.array(bga_positions(pads, 3), dtype=np.float64)
+    field = PadField()
+    field.set_pads(specs, np.arange(pads) % len(specs), positions)
+    layers.add_item_to_layer("top_copper", field)
+    random.seed(1)
+    items = []
+    for index in range(shapes):
+        x, y = random.uniform(0, 2000), random.uniform(0, 2000)
+        if index % 4:
+            items.append(LayerLineItem(x, y, x + 20, y + 5))
+        else:
+            items.append(TraceItem(np.array([(x, y), (x + 10, y), (x + 10, y + 10), (x + 30, y + 10)])))
+    layers.add_items_to_layer("top_mark", items)
+
+    collect_ms, data = timed(lambda: collect_project(layers))
+    report("collect", collect_ms)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "board.pcbp")
+        json_path = os.path.join(directory, "board.json")
+        report("save (binary)", timed(lambda: save_project(path, data))[0])
+
+        def save_json():
+            with open(json_path, "w") as file:
+                json.dump({"layers": data.layers, "specs": [spec.to_data() for spec in data.specs],
+                           "pens": data.pens, "fields": data.fields,
+                           "pads": [[x, y, int(spec), int(layer), int(field)] for (x, y), spec, layer, field in zip(
+                               data.pads["pos"].tolist(), data.pads["spec"], data.pads["layer"], data.pads["field"])],
+                           "shapes": [[int(kind), int(layer), int(pen), geometry, int(start), int(count)]
+                                      for kind, layer, pen, geometry, start, count in zip(
+                                          data.shapes["kind"], data.shapes["layer"], data.shapes["pen"],
+                                          data.shapes["geometry"].tolist(), data.shapes["start"],
+                                          data.shapes["count"])],
+                           "points": data.points.tolist()}, file)
+        report("save (JSON)", timed(save_json)[0])
+        report("file size (binary)", os.path.getsize(path) / 1e6, "MB")
+        report("file size (JSON)", os.path.getsize(json_path) / 1e6, "MB")
+
+        def load_json():
+            with open(json_path) as file:
+                return json.load(file)
+        report("load (JSON)", timed(load_json)[0])
+        load_ms, loaded = timed(lambda: load_project(path))
+        report("load (mmap)", load_ms)
+
+        apply_ms, _ = timed(lambda: apply_project(loaded, layers))
+        report("apply to scene", apply_ms)
+        again = collect_project(layers)
+        same = (all(np.array_equal(getattr(data, name), getattr(again, name)) for name in ("pads", "shapes", "points"))
+                and data.specs == again.specs and data.layers == again.layers and data.pens == again.pens)
+        print(f"  {'round trip':<40} {'ok' if same else 'MISMATCH'}")
+        del loaded  # Giải phóng mmap trước khi xóa thư mục tạm
+
+
+def bench_autosave(boards=(1000, 500000), edits=200):
+    """
+    Tự động lưu sau mỗi lần di chuyển một pad: nhật ký (chi phí trên luồng GUI theo kích thước thay đổi)
+    so với lưu lại cả board mỗi lần. Kiểm tra khôi phục: phát lại nhật ký lên snapshot cho ra đúng board.
+    """
+    via = PadSpec.from_data(THT_PAD)
+    for count in boards:
+        print(f"autosave: {edits} single-pad moves on a {count}-pad board")
+        scene = QGraphicsScene()
+        layers = LayerManager(scene)
+        stack = UndoStack()
+        set_undo_stack(scene, stack)
+        field = PadField()
+        field.add_pads(via, np.array(bga_positions(count, 3), dtype=np.float64))
+        pads = [Pad(via) for _ in range(100)]
+        layers.add_items_to_layer("top_copper", [field])
+        layers.add_items_to_layer("bottom_copper", pads)
+        with tempfile.TemporaryDirectory() as directory:
+            journal = ProjectJournal(layers, directory=directory, compact_interval_ms=0)
+            stack.command_applied.connect(journal.record_command)
+            journal.compact(wait=True)
+            journal.flush()
+            random.seed(2)
+
+            def edit():
+                pad = random.choice(pads)
+                old = item_positions([pad])
+                stack.push(MoveItemsCommand(scene, [pad], old, old + (random.uniform(-5, 5), 2.0)))
+
+            report("per edit: journal (GUI thread)", timed(edit, edits)[0])
+            report("per edit: journal record size", journal.journal_bytes / edits, "B")
+            path = os.path.join(directory, "full.pcbp")
+            report("per edit: full save", timed(lambda: save_project(path, collect_project(layers)), 3)[0])
+            report("journal flush (writer thread)", timed(journal.flush)[0])
+            expected = collect_project(layers)
+
+            recovered_scene = QGraphicsScene()
+            recovered = LayerManager(recovered_scene)
+            recover_ms, result = timed(lambda: recover_journal(recovered, directory=directory))
+            report(f"recover ({result[1]} edits)", recover_ms)
+            again = collect_project(recovered)
+            same = all(np.array_equal(getattr(expected, name), getattr(again, name))
+                       for name in ("pads", "shapes", "points"))
+            print(f"  {'recovered board':<40} {'ok' if same else 'MISMATCH'}")
+            report("compact (all at once, GUI thread)", timed(lambda: (journal.compact(wait=True), journal.flush()))[0])
+            app = QApplication.instance()
+            slices = []
+            journal.compact()
+            while journal.compacting:
+                start = time.perf_counter()
+                app.processEvents()
+                slices.append((time.perf_counter() - start) * 1000)
+            report(f"compact: longest GUI slice ({len(slices)} slices)", max(slices))
+            report("compact: snapshot write (writer thread)", timed(journal.flush)[0])
+            journal.close()
+
+
+def bench_progressive_load(field_pads=130000, pads=20000, shapes=50000):
+    """
+    Mở một board khoảng 200k đối tượng: dựng toàn bộ rồi mới dùng được (apply_project) so với nạp từng phần
+    (vùng đang xem trước, phần còn lại theo lô). Đo thời gian tới khi vùng đang xem dùng được,
+    thời gian nạp xong và lượt dài nhất luồng GUI bị chiếm (cửa sổ không phản hồi).
+    """
+    print(f"progressive_load: {field_pads + pads + shapes} objects "
+          f"({field_pads} field pads, {pads} Pad items, {shapes} shapes)")
+    app = QApplication.instance()
+    via = PadSpec.from_data(THT_PAD)
+    scene = QGraphicsScene()
+    layers = LayerManager(scene)
+    field = PadField()
+    field.add_pads(via, np.array(bga_positions(field_pads, 3), dtype=np.float64) + 2000)
+    layers.add_item_to_layer("top_copper", field)
+    items = []
+    for x, y in bga_positions(pads, 10):
+        pad = Pad(via)
+        pad.setPos(x, y)
+        items.append(pad)
+    layers.add_items_to_layer("bottom_copper", items)
+    random.seed(3)
+    shape_items = []
+    for index in range(shapes):
+        x, y = random.uniform(0, 3000), random.uniform(0, 3000)
+        if index % 4:
+            shape_items.append(LayerLineItem(x, y, x + 20, y + 5))
+        else:
+            shape_items.append(TraceItem(np.array([(x, y), (x + 10, y), (x + 10, y + 10)])))
+    layers.add_items_to_layer("top_mark", shape_items)
+    expected = collect_project(layers)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "board.pcbp")
+        save_project(path, expected)
+        for name in ("full load", "progressive"):
+            scene = QGraphicsScene(0, 0, 3000, 3000)
+            view = ZoomableGraphicsView(scene)
+            view.resize(800, 600)
+            view.show()
+            view.scale(2, 2)
+            view.centerOn(300, 300)
+            layers = LayerManager(scene)
+            app.processEvents()
+            if name == "full load":
+                report("full load: usable after", timed(lambda: (apply_project(load_project(path), layers),
+                                                                 app.processEvents()))[0])
+            else:
+                loader = ProgressiveLoader(layers, view=view)
+                marks = {}
+                loader.visible_loaded.connect(lambda: marks.setdefault("visible", time.perf_counter()))
+                loader.finished.connect(lambda count: marks.setdefault("done", time.perf_counter()))
+                longest = 0.0
+                start = time.perf_counter()
+                loader.load(path)
+                while "done" not in marks:
+                    tick = time.perf_counter()
+                    app.processEvents()
+                    longest = max(longest, (time.perf_counter() - tick) * 1000)
+                report("progressive: visible region ready", (marks["visible"] - start) * 1000)
+                report("progressive: fully loaded", (marks["done"] - start) * 1000)
+                report("progressive: longest GUI stall", longest)
+            again = collect_project(layers)
+            same = (len(again.pads) == len(expected.pads) and len(again.shapes) == len(expected.shapes)
+                    and np.array_equal(np.sort(again.pads["pos"], axis=0), np.sort(expected.pads["pos"], axis=0)))
+            print(f"  {name + ': all objects loaded':<40} {'ok' if same else 'MISMATCH'}")
+            view.close()
+
+
+GERBER_HEADER = (
+    "%TF.FileFunction,Copper,L1,Top*%\n%FSLAX46Y46*%\n%MOMM*%\nG75*\n"
+    "%AMRoundRect*0 Rectangle with rounded corners*21,1,$1,$2-$3x2,0,0,0*21,1,$1-$3x2,$2,0,0,0*%\n"
+    "%ADD10C,0.200000*%\n%ADD11C,0.250000*%\n%ADD12R,1.500000X0.800000*%\n%ADD13O,1.000000X2.000000*%\n"
+    "%ADD14RoundRect,1.000000X0.600000X0.100000*%\n%ADD15P,1.000000X6*%\n"
+)
+
+
+def synthetic_gerber(path, megabytes, nets=2000, seed=5):
+    """
+    Ghi một file Gerber lớp đồng (mm, định dạng 4.6) khoảng `megabytes` MB: mỗi nhóm `nets` nét mạch 3 đoạn,
+    2 flash mỗi nét, vài cung tròn và vùng G36/G37; cuối file là một khối step-repeat 3x2 một flash.
+    :return: (số flash, số nét, số vùng) mà file chứa.
+    """
+    rng = np.random.default_rng(seed)
+    flashes = strokes = regions = 0
+    with open(path, "w") as file:
+        file.write(GERBER_HEADER)
+        written = len(GERBER_HEADER)
+        group = 0
+        while written < megabytes * 1e6:
+            x, y = rng.integers(0, 200_000_000, (2, nets))
+            dx, dy = rng.integers(-3_000_000, 3_000_000, (2, nets))
+            lines = [f"D{10 + group % 2}*"]
+            lines += [f"X{a}Y{b}D02*\nX{a + c}Y{b}D01*\nX{a + c}Y{b + d}D01*\nX{a + 2 * c}Y{b + d}D01*"
+                      for a, b, c, d in zip(x.tolist(), y.tolist(), dx.tolist(), dy.tolist())]
+            # Cung tròn: nửa đường tròn quanh điểm đầu của 100 nét
+            lines += [f"X{a}Y{b}D02*\nG03X{a + 2_000_000}Y{b}I1000000J0D01*\nG01*" for a, b in
+                      zip(x[:100].tolist(), y[:100].tolist())]
+            lines.append(f"D{12 + group % 4}*")
+            lines += [f"X{a}Y{b}D03*\nX{a + 2 * c}Y{b + d}D03*" for a, b, c, d in
+                      zip(x.tolist(), y.tolist(), dx.tolist(), dy.tolist())]
+            lines += [f"G36*\nX{a}Y{b}D02*\nX{a + 5_000_000}D01*\nY{b + 5_000_000}D01*\nX{a}D01*\nY{b}D01*\nG37*"
+                      for a, b in zip(x[:20].tolist(), y[:20].tolist())]
+            text = "\n".join(lines) + "\n"
+            file.write(text)
+            written += len(text)
+            flashes += 2 * nets
+            strokes += nets + 100
+            regions += 20
+            group += 1
+        file.write("%SRX3Y2I5.0J5.0*%\nD12*\nX1000000Y1000000D03*\n%SR*%\nM02*\n")
+    return flashes + 6, strokes, regions
+
+
+def bench_gerber(megabytes=50):
+    """
+    Nhập file Gerber tổng hợp khoảng `megabytes` MB: tốc độ đọc của GerberParser (không dựng scene),
+    bộ nhớ Python cao nhất khi đọc (tracemalloc, chỉ phụ thuộc kích thước khối chứ không phụ thuộc kích thước file)
+    và thời gian nhập vào LayerManager (PadField + TraceItem qua add_items_to_layer).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "board.gbr")
+        flashes, strokes, regions = synthetic_gerber(path, megabytes)
+        size = os.path.getsize(path) / 1e6
+        print(f"gerber: {size:.1f} MB ({flashes} flashes, {strokes} strokes, {regions} regions)")
+
+        def parse():
+            parser = GerberParser()
+            with open(path, "rb") as stream:
+                for chunk in iter(lambda: stream.read(1 << 20), b""):
+                    parser.feed(chunk)
+                    parser.take()
+            parser.finish()
+            parser.take()
+        parse_ms, _ = timed(parse)
+        report("parse", parse_ms)
+        report("parse throughput", size / parse_ms * 1000, "MB/s")
+        tracemalloc.start()
+        parse()
+        report("parse peak memory (tracemalloc)", tracemalloc.get_traced_memory()[1] / 1e6, "MB")
+        tracemalloc.stop()
+
+        scene = QGraphicsScene()
+        layers = LayerManager(scene)
+        importer = GerberImporter(layers)
+        import_ms, items = timed(lambda: importer.import_file(path))
+        report("import into layers", import_ms)
+        report("import throughput", size / import_ms * 1000, "MB/s")
+        report("scene items created", len(items), "items")
+        # Nét đi qua ranh giới khối đọc được tách làm hai nên số nét có thể lớn hơn số nét trong file
+        same = ((importer.flashes, importer.regions) == (flashes, regions) and importer.strokes >= strokes
+                and importer.layer_name == "top_copper" and len(importer.field) == flashes)
+        print(f"  {'all objects imported':<40} {'ok' if same else 'MISMATCH'}")
+
+
+BENCHMARKS = {
+    "pad_paint": bench_pad_paint,
+    "pad_lod": bench_pad_lod,
+    "pad_create": bench_pad_create,
+    "pad_field": bench_pad_field,
+    "scene_batch": bench_scene_batch,
+    "layers": bench_layers,
+    "spatial_index": bench_spatial_index,
+    "layer_rasters": bench_layer_rasters,
+    "layer_composite": bench_layer_composite,
+    "tile_cache": bench_tile_cache,
+    "pan": bench_pan,
+    "adaptive_quality": bench_adaptive_quality,
+    "draw_preview": bench_draw_preview,
+    "trace": bench_trace,
+    "snap": bench_snap,
+    "settings": bench_settings,
+    "pad_preview": bench_pad_preview,
+    "bulk_edit": bench_bulk_edit,
+    "pad_editor_open": bench_pad_editor_open,
+    "undo": bench_undo,
+    "project": bench_project,
+    "autosave": bench_autosave,
+    "progressive_load": bench_progressive_load,
+    "gerber": bench_gerber,
+}
+
+
+def main(argv):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication.instance() or QApplication(sys.argv)
+    names = argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            return 1
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,9 +1,10 @@
 from PyQt5.QtWidgets import (QMainWindow, QApplication, QWidget, QVBoxLayout,
                              QHBoxLayout, QCheckBox, QLabel, QScrollArea, QGridLayout,
                              QGroupBox, QPushButton, QRadioButton)
-from PyQt5.QtGui import QPainter, QColor, QPen, QBrush, QPixmap
+from PyQt5.QtGui import QPainter, QColor, QPen, QBrush, QPixmap, QPicture, QRegion
 from PyQt5.QtCore import Qt, QRect, pyqtSignal, QSize
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
 import sys
 
 # Color constants
@@ -38,10 +39,80 @@ LAYER_COLORS = {
 }
 
 
+TILE_SIZE = 256  # Tile size in pixels
+TILE_BYTES = TILE_SIZE * TILE_SIZE * 4  # ARGB32
+DEFAULT_TILE_BUDGET = 64 * 1024 * 1024  # 64 MB
+CONTENT_MARGIN = 2  # Extra pixels around recorded content bounds
+DIM_OPACITY = 0.25  # Opacity of the other layers in 'Current Layer Only' mode
+
+
+class TileCache:
+    """LRU cache of layer tiles with a memory budget, shared by all layers of a manager"""
+
+    def __init__(self, budget_bytes: int = DEFAULT_TILE_BUDGET):
+        self.budget_bytes = budget_bytes
+        self._tiles: "OrderedDict[Tuple[int, int, int], QPixmap]" = OrderedDict()
+
+    @property
+    def used_bytes(self) -> int:
+        return len(self._tiles) * TILE_BYTES
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def __contains__(self, key) -> bool:
+        """Whether a tile is cached, without marking it as recently used"""
+        return key in self._tiles
+
+    def get(self, key: Tuple[int, int, int]) -> Optional[QPixmap]:
+        """Return a cached tile and mark it as recently used"""
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def put(self, key: Tuple[int, int, int], tile: QPixmap) -> None:
+        """Store a tile, evicting the least recently used tiles over the budget"""
+        self._tiles[key] = tile
+        self._tiles.move_to_end(key)
+        while len(self._tiles) > 1 and self.used_bytes > self.budget_bytes:
+            self._tiles.popitem(last=False)
+
+    def keys(self) -> List[Tuple[int, int, int]]:
+        """Keys of the cached tiles, least recently used first"""
+        return list(self._tiles)
+
+    def clear(self) -> None:
+        self._tiles.clear()
+
+    def discard(self, layer_id: int, tile_keys) -> None:
+        """Drop the given (tx, ty) tiles of a layer"""
+        for tx, ty in tile_keys:
+            self._tiles.pop((layer_id, tx, ty), None)
+
+    def discard_layer(self, layer_id: int) -> None:
+        """Drop every tile of a layer"""
+        for key in [key for key in self._tiles if key[0] == layer_id]:
+            del self._tiles[key]
+
+    def set_budget(self, budget_bytes: int) -> None:
+        """Change the memory budget, evicting tiles if needed"""
+        self.budget_bytes = budget_bytes
+        while self._tiles and self.used_bytes > self.budget_bytes:
+            self._tiles.popitem(last=False)
+
+
+def tile_range(rect: QRect) -> Tuple[range, range]:
+    """Tile columns and rows touched by a rectangle"""
+    return (range(rect.left() // TILE_SIZE, rect.right() // TILE_SIZE + 1),
+            range(rect.top() // TILE_SIZE, rect.bottom() // TILE_SIZE + 1))
+
+
 class PCBLayer:
     """Represents a single PCB layer with properties and content"""
 
-    def __init__(self, name: str, layer_type: str, side: str, layer_id: int):
+    def __init__(self, name: str, layer_type: str, side: str, layer_id: int,
+                 tile_cache: Optional[TileCache] = None):
         self.name = name
         self.type = layer_type
         self.side = side  # top, bottom, other, system
@@ -50,17 +121,73 @@ class PCBLayer:
         self.locked = False
         self.color = LAYER_COLORS.get(layer_type, QColor(150, 150, 150, 150))
 
-        # Create a QPixmap for the layer content
-        self.pixmap = QPixmap(800, 600)
-        self.pixmap.fill(Qt.transparent)
+        # Layer content is recorded as QPictures and rasterized lazily into tiles,
+        # so empty or hidden layers never allocate pixels
+        self.tile_cache = tile_cache if tile_cache is not None else TileCache()
+        self.content: List[Tuple[QPicture, QRect]] = []  # (picture, padded bounds)
+        self.content_rect = QRect()
+        self.on_invalidate: Optional[Callable[["PCBLayer", QRect], None]] = None  # Set by the manager
 
         # Add some example content for visualization
         self._add_sample_content()
 
+    def add_content(self, draw: Callable[[QPainter], None]) -> QRect:
+        """Record new content drawn by `draw(painter)` and invalidate the tiles it touches"""
+        picture = QPicture()
+        painter = QPainter(picture)
+        painter.setRenderHint(QPainter.Antialiasing)
+        draw(painter)
+        painter.end()
+
+        dirty = picture.boundingRect()
+        if dirty.isEmpty():
+            return dirty
+        # Pen widths may reach slightly outside the recorded bounds
+        dirty = dirty.adjusted(-CONTENT_MARGIN, -CONTENT_MARGIN, CONTENT_MARGIN, CONTENT_MARGIN)
+        self.content.append((picture, dirty))
+        self.content_rect = self.content_rect.united(dirty)
+        self.invalidate(dirty)
+        return dirty
+
+    def clear_content(self) -> None:
+        """Remove all content and release the layer's tiles"""
+        if self.on_invalidate is not None and not self.content_rect.isEmpty():
+            self.on_invalidate(self, self.content_rect)
+        self.content = []
+        self.content_rect = QRect()
+        self.tile_cache.discard_layer(self.id)
+
+    def invalidate(self, rect: QRect) -> None:
+        """Drop cached tiles intersecting a dirty region"""
+        columns, rows = tile_range(rect)
+        self.tile_cache.discard(self.id, ((tx, ty) for tx in columns for ty in rows))
+        if self.on_invalidate is not None:
+            self.on_invalidate(self, rect)
+
+    def _tile(self, tx: int, ty: int) -> QPixmap:
+        """Return a tile, rasterizing it from the recorded content if needed"""
+        key = (self.id, tx, ty)
+        tile = self.tile_cache.get(key)
+        if tile is None:
+            tile = QPixmap(TILE_SIZE, TILE_SIZE)
+            tile.fill(Qt.transparent)
+            tile_rect = QRect(tx * TILE_SIZE, ty * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+            painter = QPainter(tile)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.translate(-tile_rect.x(), -tile_rect.y())
+            for picture, bounds in self.content:
+                if bounds.intersects(tile_rect):
+                    painter.drawPicture(0, 0, picture)  # Keeps painter state
+            painter.end()
+            self.tile_cache.put(key, tile)
+        return tile
+
     def _add_sample_content(self):
         """Add sample visual content to the layer for demonstration"""
-        painter = QPainter(self.pixmap)
-        painter.setRenderHint(QPainter.Antialiasing)
+        self.add_content(self._draw_sample_content)
+
+    def _draw_sample_content(self, painter: QPainter) -> None:
+        """Draw the demonstration content for this layer type"""
 
         pen = QPen(self.color, 2)
         painter.setPen(pen)
@@ -97,24 +224,82 @@ class PCBLayer:
             else:
                 painter.fillRect(400, 300, 250, 200, brush)
 
+    def render(self, painter: QPainter, rect: Optional[QRect] = None) -> None:
+        """Render the visible tiles of the layer that intersect `rect` (default: all content)"""
+        if not self.visible or self.content_rect.isEmpty():
+            return
+        area = self.content_rect if rect is None else rect.intersected(self.content_rect)
+        if area.isEmpty():
+            return
+        columns, rows = tile_range(area)
+        for ty in rows:
+            for tx in columns:
+                painter.drawPixmap(tx * TILE_SIZE, ty * TILE_SIZE, self._tile(tx, ty))
+
+
+class CompositeBand:
+    """Pre-blended image of a contiguous run of layers in the stack"""
+
+    def __init__(self):
+        self.layers: List[PCBLayer] = []  # Bottom to top
+        self.pixmap: Optional[QPixmap] = None  # Allocated on first paint
+        self.dirty = QRegion()
+
+    def invalidate(self, rect: QRect) -> None:
+        if self.pixmap is not None:
+            self.dirty = self.dirty.united(rect)
+
+    def reset(self) -> None:
+        if self.pixmap is not None:
+            self.dirty = QRegion(self.pixmap.rect())
+
+    def add_layers(self, layers: List[PCBLayer], below: bool) -> None:
+        """Blend layers on top of (or underneath) the cached image without recompositing it"""
+        if self.pixmap is None:
+            return
+        painter = QPainter(self.pixmap)
+        if below:
+            # Destination-over puts each new layer underneath what is already there
+            painter.setCompositionMode(QPainter.CompositionMode_DestinationOver)
+            layers = layers[::-1]
+        for layer in layers:
+            layer.render(painter)
         painter.end()
 
-    def render(self, painter: QPainter) -> None:
-        """Render the layer to the given painter"""
-        if self.visible:
-            painter.drawPixmap(0, 0, self.pixmap)
+    def refresh(self, size: QSize, rect: QRect) -> None:
+        """Recomposite the dirty part of the band that intersects `rect`"""
+        if self.pixmap is None or self.pixmap.size() != size:
+            self.pixmap = QPixmap(size)
+            self.pixmap.fill(Qt.transparent)  # Gives the pixmap an alpha channel
+            self.dirty = QRegion(self.pixmap.rect())
+        region = self.dirty.intersected(rect)
+        if region.isEmpty():
+            return
+        self.dirty = self.dirty.subtracted(region)
+        area = region.boundingRect()
+        painter = QPainter(self.pixmap)
+        painter.setClipRegion(region)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.fillRect(area, Qt.transparent)
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        for layer in self.layers:
+            layer.render(painter, area)
+        painter.end()
 
 
 class PCBLayerManager(QWidget):
     """Manages the PCB layers and rendering"""
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, pcb_size: QSize = QSize(800, 600), tile_budget: int = DEFAULT_TILE_BUDGET):
         super().__init__(parent)
 
         # Create main PCB drawing surface
-        self.pcb_size = QSize(800, 600)
+        self.pcb_size = QSize(pcb_size)
         self.setMinimumSize(self.pcb_size)
 
+        # Layer rasters share one tile cache with a bounded memory budget
+        self.tile_cache = TileCache(tile_budget)
+
         # Initialize layer collections
         self.next_layer_id = 0
         self.layers: Dict[str, PCBLayer] = {}
@@ -123,52 +308,96 @@ class PCBLayerManager(QWidget):
         # Top layers
         for layer_type in ["silk", "electric", "solder", "paste", "assembly", "designRule", "dimension"]:
             layer_name = f"top.{layer_type}"
-            self.layers[layer_name] = PCBLayer(layer_name, layer_type, "top", self.next_layer_id)
+            self.layers[layer_name] = PCBLayer(layer_name, layer_type, "top", self.next_layer_id, self.tile_cache)
             self.next_layer_id += 1
 
         # Additional top layers shown in the image
         for layer_type in ["route", "plane", "padstack", "viastack"]:
             layer_name = f"top.{layer_type}"
-            self.layers[layer_name] = PCBLayer(layer_name, layer_type, "top", self.next_layer_id)
+            self.layers[layer_name] = PCBLayer(layer_name, layer_type, "top", self.next_layer_id, self.tile_cache)
             self.next_layer_id += 1
 
         # Top keepout layers
         for layer_type in ["keepoutRoute", "keepoutDrill", "keepoutComponent", "heightLimit"]:
             layer_name = f"top.{layer_type}"
-            self.layers[layer_name] = PCBLayer(layer_name, layer_type, "top", self.next_layer_id)
+            self.layers[layer_name] = PCBLayer(layer_name, layer_type, "top", self.next_layer_id, self.tile_cache)
             self.next_layer_id += 1
 
         # Bottom layers
         for layer_type in ["silk", "electric", "solder", "paste", "assembly"]:
             layer_name = f"bottom.{layer_type}"
-            self.layers[layer_name] = PCBLayer(layer_name, layer_type, "bottom", self.next_layer_id)
+            self.layers[layer_name] = PCBLayer(layer_name, layer_type, "bottom", self.next_layer_id, self.tile_cache)
             self.next_layer_id += 1
 
         # Other layers
-        self.layers["other.board"] = PCBLayer("other.board", "board", "other", self.next_layer_id)
+        self.layers["other.board"] = PCBLayer("other.board", "board", "other", self.next_layer_id, self.tile_cache)
         self.next_layer_id += 1
 
         # Other keepout and design rule layers
         for layer_type in ["keepoutRoute", "keepoutDrill", "keepoutComponent", "heightLimit", "designRule",
                            "dimension"]:
             layer_name = f"other.{layer_type}"
-            self.layers[layer_name] = PCBLayer(layer_name, layer_type, "other", self.next_layer_id)
+            self.layers[layer_name] = PCBLayer(layer_name, layer_type, "other", self.next_layer_id, self.tile_cache)
             self.next_layer_id += 1
 
         # System layers
-        self.layers["system.drill"] = PCBLayer("system.drill", "drill", "system", self.next_layer_id)
+        self.layers["system.drill"] = PCBLayer("system.drill", "drill", "system", self.next_layer_id, self.tile_cache)
         self.next_layer_id += 1
 
         # Current selected layer
         self.current_layer = None
         self.current_layer_only_mode = False
 
+        # Composite cache: the stack is split into the layers below the current one,
+        # the current layer and the layers above it, each pre-blended into one image
+        self.stack: List[PCBLayer] = list(self.layers.values())  # Bottom to top
+        self.below = CompositeBand()
+        self.current = CompositeBand()
+        self.above = CompositeBand()
+        self._split_stack()
+        for layer in self.stack:
+            layer.on_invalidate = self._layer_invalidated
+
+    def _current_index(self) -> int:
+        """Stack index of the current layer, or len(stack) when none is selected"""
+        if self.current_layer is None:
+            return len(self.stack)
+        return self.stack.index(self.current_layer)
+
+    def _split_stack(self) -> None:
+        """Assign the visible layers to the below/current/above bands"""
+        index = self._current_index()
+        self.below.layers = [layer for layer in self.stack[:index] if layer.visible]
+        self.current.layers = [layer for layer in self.stack[index:index + 1] if layer.visible]
+        self.above.layers = [layer for layer in self.stack[index + 1:] if layer.visible]
+
+    def _band_of(self, layer: PCBLayer) -> CompositeBand:
+        index = self.stack.index(layer)
+        current = self._current_index()
+        if index < current:
+            return self.below
+        return self.current if index == current else self.above
+
+    def _layer_invalidated(self, layer: PCBLayer, rect: QRect) -> None:
+        """Content of a layer changed: recomposite only its band, only in the dirty region"""
+        if layer.visible:
+            self._band_of(layer).invalidate(rect)
+            self.update(rect)
+
     def set_layer_visibility(self, side: str, layer_type: str, is_visible: bool) -> None:
         """Set visibility for a specific layer"""
         layer_name = f"{side}.{layer_type}"
         if layer_name in self.layers:
-            self.layers[layer_name].visible = is_visible
-            self.update()  # Trigger a repaint
+            layer = self.layers[layer_name]
+            if layer.visible == is_visible:
+                return
+            layer.visible = is_visible
+            if not is_visible:
+                self.tile_cache.discard_layer(layer.id)  # Hidden layers keep no pixels
+            # Only the band holding the layer is recomposited, only where the layer has content
+            self._split_stack()
+            self._band_of(layer).invalidate(layer.content_rect)
+            self.update(layer.content_rect)
 
     def set_layer_locked(self, side: str, layer_type: str, is_locked: bool) -> None:
         """Set locked status for a specific layer"""
@@ -183,15 +412,44 @@ class PCBLayerManager(QWidget):
 
     def set_current_layer(self, layer_name: str) -> None:
         """Set the current active layer"""
-        if layer_name in self.layers:
+        if layer_name in self.layers and self.layers[layer_name] is not self.current_layer:
+            old_index = self._current_index()
             self.current_layer = self.layers[layer_name]
+            new_index = self._current_index()
+            self._split_stack()
+
+            # Layers that move between bands are blended into the cached images where
+            # possible; a band only gets rebuilt when layers must be taken out of it
+            moved = [layer for layer in self.stack[min(old_index, new_index):max(old_index, new_index) + 1]
+                     if layer.visible and layer is not self.current_layer]
+            if new_index > old_index:
+                self.below.add_layers(moved, below=False)
+                self.above.reset()
+            else:
+                self.above.add_layers(moved, below=True)
+                self.below.reset()
+            self.current.reset()
             self.update()  # Trigger a repaint
 
-
-def paintEvent(self, event) -> None:
-    painter = QPainter(self)
-    painter.fillRect(self.rect(), BLACK)  # Chỉ fill nền đen
-
+    def paintEvent(self, event) -> None:
+        painter = QPainter(self)
+        painter.fillRect(event.rect(), BLACK)  # Chỉ fill nền đen
+        rect = event.rect().intersected(QRect(0, 0, self.pcb_size.width(), self.pcb_size.height()))
+        if rect.isEmpty():
+            painter.end()
+            return
+        # Three cached images whatever the number of layers; other layers are dimmed
+        # from their cached images in 'Current Layer Only' mode
+        dim = self.current_layer_only_mode and self.current_layer is not None
+        for band, opacity in ((self.below, DIM_OPACITY if dim else 1.0),
+                              (self.current, 1.0),
+                              (self.above, DIM_OPACITY if dim else 1.0)):
+            if not band.layers:
+                continue
+            band.refresh(self.pcb_size, rect)
+            painter.setOpacity(opacity)
+            painter.drawPixmap(rect, band.pixmap, rect)
+        painter.end()
 
 
 class LayerPanel(QScrollArea):
@@ -1,9 +1,43 @@
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QGraphicsView, QGraphicsScene, QColorDialog
-from PyQt5.QtCore import Qt, QRectF
-from PyQt5.QtGui import QPen, QColor
+from PyQt5.QtWidgets import QApplication, QMainWindow, QGraphicsScene, QColorDialog
+from PyQt5.QtCore import Qt, QPointF, QRectF, QLineF, QTimer
+from PyQt5.QtGui import QPen, QColor, QPolygonF
 from PyQt5.QtWidgets import QGraphicsLineItem, QGraphicsRectItem, QGraphicsEllipseItem
 
+from zoomable_graphics_view import ZoomableGraphicsView
+from trace_item import StrokeSimplifier, TraceItem
+from snapping import snap_engine
+from scene_batch import bulk_update
+from spatial_index import SpatialIndex
+from undo_stack import push, AddItemsCommand
+
+FRAME_INTERVAL_MS = 16  # Gom các sự kiện di chuột: tối đa một lần cập nhật hình xem trước mỗi khung hình
+SHAPE_PEN_WIDTH = 2
+TRACE_TOLERANCE_PX = 0.75  # Sai lệch tối đa khi đơn giản hóa đường mạch, tính bằng pixel màn hình
+
+
+def shape_geometry(mode, start_point, end_point):
+    """
+    Hình học của hình đang vẽ: QLineF cho "line", QRectF (đã chuẩn hóa) cho "rect" và "circle".
+    """
+    if mode == "line":
+        return QLineF(start_point, end_point)
+    return QRectF(start_point, end_point).normalized()
+
+
+def create_shape_item(mode, geometry, pen):
+    """
+    Tạo item thật của scene cho một hình đã vẽ xong.
+    """
+    if mode == "line":
+        item = QGraphicsLineItem(geometry)
+    elif mode == "rect":
+        item = QGraphicsRectItem(geometry)
+    else:
+        item = QGraphicsEllipseItem(geometry)
+    item.setPen(pen)
+    return item
+
 class DrawingApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -11,22 +45,37 @@ class DrawingApp(QMainWindow):
         self.setGeometry(100, 100, 800, 600)
 
         self.scene = QGraphicsScene()
-        self.drawing_window = QGraphicsView(self.scene)
+        self.drawing_window = ZoomableGraphicsView(self.scene)
         self.setCentralWidget(self.drawing_window)
 
         self.drawing_mode = None
         self.selected_color = QColor(Qt.black)
         self.layers = {0: []}
+        self.shape_index = SpatialIndex()  # Chỉ mục không gian của self.layers[0] (hình không di chuyển được)
 
-        self.current_item = None
+        self.current_item = None  # Item vừa được thêm vào scene ở lần nhả chuột gần nhất
         self.start_point = None
+        self.end_point = None
+        self.trace = None  # StrokeSimplifier của đường mạch đang vẽ ("trace")
+        self._trace_dirty = QRectF()  # Vùng scene của các đoạn mạch mới chưa được vẽ lại
+
+        # Hình đang vẽ dở chỉ là lớp phủ của view (drawForeground), chưa phải item của scene
+        self._pending_pos = None  # Vị trí chuột mới nhất chưa được áp dụng
+        self._move_timer = QTimer(self)
+        self._move_timer.setSingleShot(True)
+        self._move_timer.setInterval(FRAME_INTERVAL_MS)
+        self._move_timer.timeout.connect(self.apply_pending_move)
+        self.drawing_window.overlays.append(self.draw_preview)
 
         # Assign event handlers correctly
         self.drawing_window.setMouseTracking(True)  # Enable mouse tracking
         self.drawing_window.viewport().installEventFilter(self)
 
     def eventFilter(self, source, event):
-        if source is self.drawing_window.viewport():
+        # Chỉ chặn sự kiện chuột khi đang vẽ; nếu không, view xử lý chọn và kéo đối tượng
+        # Pan (chuột giữa, Space + kéo) luôn do view xử lý
+        if (source is self.drawing_window.viewport() and self.drawing_mode
+                and not self.drawing_window.handles_pan(event)):
             if event.type() == event.MouseButtonPress:
                 self.mouse_press(event)
                 return True  # Trả về True để báo hiệu đã xử lý xong sự kiện
@@ -38,50 +87,173 @@ class DrawingApp(QMainWindow):
                 return True
         return super().eventFilter(source, event)  # Không chặn các sự kiện khác
 
-    # Fix the mouse_press method in DrawingApp class
     def mouse_press(self, event):
-        if event.button() == Qt.LeftButton:
-            self.start_point = self.drawing_window.mapToScene(event.pos())
-            if self.drawing_mode == "line":
-                # Create a line with proper initialization (from start point to itself initially)
-                self.current_item = QGraphicsLineItem(
-                    self.start_point.x(), self.start_point.y(),
-                    self.start_point.x(), self.start_point.y()
-                )
-                self.current_item.setPen(QPen(self.selected_color, 2))
-                self.scene.addItem(self.current_item)
-            elif self.drawing_mode == "rect":
-                # Create an empty rectangle at the start point
-                self.current_item = QGraphicsRectItem(
-                    QRectF(self.start_point.x(), self.start_point.y(), 0, 0)
-                )
-                self.current_item.setPen(QPen(self.selected_color, 2))
-                self.scene.addItem(self.current_item)
-            elif self.drawing_mode == "circle":
-                # Create an empty ellipse at the start point
-                self.current_item = QGraphicsEllipseItem(
-                    QRectF(self.start_point.x(), self.start_point.y(), 0, 0)
-                )
-                self.current_item.setPen(QPen(self.selected_color, 2))
-                self.scene.addItem(self.current_item)
+        if event.button() != Qt.LeftButton:
+            return
+        if self.drawing_mode == "trace":
+            # Sai lệch theo pixel màn hình: zoom càng lớn càng giữ nhiều chi tiết
+            scale = abs(self.drawing_window.transform().m11()) or 1.0
+            self.start_point = self.scene_point(event.pos())
+            self.trace = StrokeSimplifier(self.start_point, TRACE_TOLERANCE_PX / scale)
+            self._trace_dirty = QRectF()
+        elif self.drawing_mode in ("line", "rect", "circle"):
+            self.start_point = self.scene_point(event.pos())
+            self.end_point = self.start_point
+            self._pending_pos = None
+            self.update_preview()
 
     def mouse_release(self, event):
-        if self.current_item:
-            self.layers[0].append(self.current_item)  # Lưu lại vào danh sách
+        if self.start_point is None:
+            return
+        if self.trace is not None:
+            self.finish_trace(event)
+            return
+        # Áp dụng vị trí cuối cùng rồi mới thêm item thật vào scene và vào layer
+        self._move_timer.stop()
+        self._pending_pos = event.pos()
+        self.apply_pending_move()
+        geometry = shape_geometry(self.drawing_mode, self.start_point, self.end_point)
+        self.current_item = create_shape_item(self.drawing_mode, geometry, QPen(self.selected_color, SHAPE_PEN_WIDTH))
+        self.add_shape(self.current_item, f"Draw {self.drawing_mode}")
+        self.update_preview()
+        self.start_point = None
+        self.end_point = None
         self.current_item = None
 
     def mouse_move(self, event):
-        if self.current_item and self.start_point:
-            self.end_point = self.drawing_window.mapToScene(event.pos())
-            if isinstance(self.current_item, QGraphicsLineItem):
-                self.current_item.setLine(self.start_point.x(), self.start_point.y(),
-                                          self.end_point.x(), self.end_point.y())
-            elif isinstance(self.current_item, QGraphicsRectItem) or isinstance(self.current_item,
-                                                                                QGraphicsEllipseItem):
-                rect = QRectF(self.start_point, self.end_point).normalized()
-                self.current_item.setRect(rect)
+        if self.start_point is None:
+            return True
+        if self.trace is not None:
+            self.add_trace_point(event.pos())
+            return True
+        # Gom sự kiện: áp dụng ngay nếu đã qua một khung hình, nếu không chỉ giữ vị trí mới nhất
+        self._pending_pos = event.pos()
+        if not self._move_timer.isActive():
+            self.apply_pending_move()
+            self._move_timer.start()
         return True
 
+    def scene_point(self, pos):
+        """
+        Tọa độ scene của vị trí chuột, đã bắt lưới/bắt đối tượng nếu scene có SnapEngine.
+        """
+        point = self.drawing_window.mapToScene(pos)
+        engine = snap_engine(self.scene)
+        if engine is None:
+            return point
+        scale = abs(self.drawing_window.transform().m11()) or 1.0
+        return engine.snap_point(self.scene, point, scale)[0]
+
+    def add_trace_point(self, pos):
+        """
+        Nhận mọi điểm của đường mạch (chi phí O(1) mỗi điểm); chỉ vẽ lại mỗi khung hình một lần.
+        """
+        last = self.trace.last_point()
+        point = self.drawing_window.mapToScene(pos)
+        if self.trace.add_point(point):
+            segment = QRectF(QPointF(*last), point).normalized()
+            self._trace_dirty = self._trace_dirty.united(segment) if not self._trace_dirty.isNull() else segment
+        if not self._move_timer.isActive():
+            self.apply_pending_move()
+            self._move_timer.start()
+
+    def finish_trace(self, event):
+        self._move_timer.stop()
+        self.add_trace_point(event.pos())
+        points = self.trace.finish()
+        self.trace = None
+        self.start_point = None
+        self.current_item = TraceItem(points, QPen(self.selected_color, SHAPE_PEN_WIDTH))
+        self.add_shape(self.current_item, "Draw trace")
+        self.current_item = None
+        self._trace_dirty = QRectF()
+
+    def add_shape(self, item, text="Draw"):
+        """
+        Thêm hình vừa vẽ vào scene và vào layer như một bước hoàn tác.
+        """
+        push(self.scene, AddItemsCommand(self.scene, [item], self.add_shapes, self.remove_shapes, text))
+
+    def add_shapes(self, items):
+        """
+        Thêm các hình vào scene và vào danh sách layer (một lần cập nhật scene).
+        """
+        with bulk_update(self.scene) as batch:
+            batch.add_items(items)
+        self.layers[0].extend(items)  # Lưu lại vào danh sách
+        for item in items:
+            self.shape_index.insert(item, item.sceneBoundingRect())
+
+    def remove_shapes(self, items):
+        """
+        Gỡ các hình khỏi scene và khỏi danh sách layer (hoàn tác vẽ).
+        """
+        with bulk_update(self.scene) as batch:
+            batch.remove_items(items)
+        removed = set(items)
+        self.layers[0] = [item for item in self.layers[0] if item not in removed]
+        for item in items:
+            self.shape_index.remove(item)
+
+    def apply_pending_move(self):
+        """
+        Cập nhật hình xem trước theo vị trí chuột mới nhất (tối đa một lần mỗi khung hình).
+        """
+        if self.trace is not None:
+            if not self._trace_dirty.isNull():
+                margin = SHAPE_PEN_WIDTH * abs(self.drawing_window.transform().m11())
+                self.drawing_window.update_scene_rect(self._trace_dirty, margin)
+                self._trace_dirty = QRectF()
+            return
+        if self._pending_pos is None or self.start_point is None:
+            return
+        old_rect = self.preview_rect()
+        self.end_point = self.scene_point(self._pending_pos)
+        self._pending_pos = None
+        self.update_preview(old_rect)
+
+    def preview_rect(self):
+        """
+        Vùng scene của hình xem trước, hoặc QRectF rỗng nếu không vẽ.
+        """
+        if self.start_point is None:
+            return QRectF()
+        return QRectF(self.start_point, self.end_point).normalized()
+
+    def update_preview(self, old_rect=None):
+        # Chỉ vẽ lại vùng viewport quanh hình xem trước cũ và mới
+        rect = self.preview_rect()
+        if old_rect is not None:
+            rect = rect.united(old_rect)
+        margin = SHAPE_PEN_WIDTH * abs(self.drawing_window.transform().m11())
+        self.drawing_window.update_scene_rect(rect, margin)
+
+    def draw_preview(self, painter, rect):
+        """
+        Vẽ hình đang vẽ dở trong drawForeground của view.
+        """
+        if self.start_point is None:
+            return
+        painter.save()
+        painter.setPen(QPen(self.selected_color, SHAPE_PEN_WIDTH, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
+        painter.setBrush(Qt.NoBrush)
+        if self.trace is not None:
+            # Chỉ vẽ các đoạn đã chốt giao với vùng cần vẽ, cộng phần đuôi đang kéo dài
+            for polygon, bounds in self.trace.chunks:
+                if bounds.adjusted(-SHAPE_PEN_WIDTH, -SHAPE_PEN_WIDTH, SHAPE_PEN_WIDTH, SHAPE_PEN_WIDTH).intersects(rect):
+                    painter.drawPolyline(polygon)
+            painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in self.trace.tail()]))
+            painter.restore()
+            return
+        geometry = shape_geometry(self.drawing_mode, self.start_point, self.end_point)
+        if self.drawing_mode == "line":
+            painter.drawLine(geometry)
+        elif self.drawing_mode == "rect":
+            painter.drawRect(geometry)
+        else:
+            painter.drawEllipse(geometry)
+        painter.restore()
+
     def choose_color(self):
         color = QColorDialog.getColor(self.selected_color, self, "Choose Color")
         if color.isValid():
@@ -0,0 +1,876 @@
+# gerber_import.py
+
+import ast
+import math
+import operator
+import os
+import re
+from dataclasses import dataclass
+from functools import partial
+
+import numpy as np
+from PyQt5.QtWidgets import QGraphicsItem
+from PyQt5.QtGui import QPainterPath, QPen
+from PyQt5.QtCore import Qt
+
+from layer_manager import LayerRegionItem
+from pad_field import PadField, points_to_polygon
+from pad_geometry import PAD_SCALE
+from pad_spec import PadSpec
+from scene_batch import bulk_update
+from trace_item import TraceItem
+from undo_stack import record, AddItemsCommand
+
+GERBER_FILTER = "Gerber Files (*.gbr *.ger *.gtl *.gbl *.gto *.gbo *.gtp *.gbp *.pho *.art);;All Files (*)"
+GERBER_CHUNK_BYTES = 1 << 20  # Đọc file theo khối 1 MB; đối tượng được thêm vào scene sau mỗi khối
+VECTOR_MIN_WORDS = 32  # Dãy lệnh tọa độ ngắn hơn được đọc từng lệnh (chi phí cố định của NumPy không đáng)
+TRACE_ITEM_POINTS = 4096  # Số đỉnh tối đa (xấp xỉ) của một TraceItem gom các nét cùng aperture
+ARC_TOLERANCE = 0.005 * PAD_SCALE  # Sai lệch tối đa khi xấp xỉ cung tròn bằng đoạn thẳng (0.005 mm)
+DEFAULT_GERBER_LAYER = "top_copper"
+INCH = 25.4
+
+# Đuôi file (hoặc hậu tố tên file kiểu KiCad) -> layer của LayerManager
+GERBER_LAYERS = {
+    "gtl": "top_copper", "gbl": "bottom_copper",
+    "gto": "top_mark", "gbo": "bottom_mark",
+    "gtp": "top_paste", "gbp": "bottom_paste",
+    "f_cu": "top_copper", "b_cu": "bottom_copper",
+    "f_silks": "top_mark", "b_silks": "bottom_mark",
+    "f_silkscreen": "top_mark", "b_silkscreen": "bottom_mark",
+    "f_paste": "top_paste", "b_paste": "bottom_paste",
+}
+# Loại trong thuộc tính .FileFunction -> (layer mặt trên, layer mặt dưới)
+FILE_FUNCTIONS = {
+    "Copper": ("top_copper", "bottom_copper"),
+    "Legend": ("top_mark", "bottom_mark"),
+    "Paste": ("top_paste", "bottom_paste"),
+}
+
+WHITESPACE = b" \t\r\n"
+NAN_PAIR = (math.nan, math.nan)
+COMPLEX_CHARACTER = re.compile(rb"[^0-9XYDG*+\-]")  # Lệnh chứa ký tự khác được đọc từng lệnh
+NUMBER_SEPARATORS = bytes.maketrans(b"XYDG*", b"     ")
+WORD = re.compile(rb"(?:G0*(\d+))?(?:X([+-]?[\d.]+))?(?:Y([+-]?[\d.]+))?"
+                  rb"(?:I([+-]?[\d.]+))?(?:J([+-]?[\d.]+))?(?:D0*(\d+))?$")
+FORMAT = re.compile(r"FS([LTD]?)([AI])X(\d)(\d)Y(\d)(\d)")
+APERTURE = re.compile(r"ADD(\d+)([^,]+),?(.*)")
+STEP_REPEAT = re.compile(r"SRX(\d+)Y(\d+)I([\d.]+)J([\d.]+)")
+# Phép toán của biểu thức aperture macro (x đã được đổi thành *)
+MACRO_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+                   ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+@dataclass(frozen=True)
+class GerberAperture:
+    """Aperture đã quy về pad: kích thước theo mm, tâm lệch khỏi điểm flash (dx, dy, trục Y hướng lên)"""
+
+    shape: str
+    width: float
+    height: float
+    hole_diameter: float = 0.0
+    dx: float = 0.0
+    dy: float = 0.0
+
+
+def gerber_layer(path, file_function=None):
+    """
+    Đoán layer đích của một file Gerber: theo thuộc tính .FileFunction nếu có, rồi theo đuôi/tên file.
+    :param file_function: Các trường của .FileFunction (ví dụ ["Copper", "L1", "Top"]).
+    :return: Tên layer, hoặc None nếu không đoán được.
+    """
+    if file_function and file_function[0] in FILE_FUNCTIONS:
+        top, bottom = FILE_FUNCTIONS[file_function[0]]
+        return bottom if file_function[-1] == "Bot" else top
+    stem, extension = os.path.splitext(os.path.basename(path).lower())
+    if extension[1:] in GERBER_LAYERS:
+        return GERBER_LAYERS[extension[1:]]
+    stem = stem.replace(".", "_").replace("-", "_")
+    for suffix, layer in GERBER_LAYERS.items():
+        if "_" in suffix and stem.endswith(suffix):
+            return layer
+    return None
+
+
+def macro_value(text, variables) -> float:
+    """
+    Tính một biểu thức của aperture macro ($n là tham số, x là phép nhân).
+    """
+    expression = re.sub(r"\$(\d+)", lambda match: repr(variables.get(int(match.group(1)), 0.0)), text)
+    expression = expression.replace("x", "*").replace("X", "*")
+    try:
+        return macro_node_value(ast.parse(expression.strip(), mode="eval").body)
+    except (SyntaxError, ValueError, ZeroDivisionError, RecursionError):
+        raise ValueError(f"Biểu thức aperture macro không hợp lệ: {text}") from None
+
+
+def macro_node_value(node) -> float:
+    # Chỉ hằng số, + - đơn ngôi và + - * /: không có lũy thừa, tên hay lời gọi hàm
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return float(node.value)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in MACRO_OPERATORS:
+        return MACRO_OPERATORS[type(node.op)](macro_node_value(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in MACRO_OPERATORS:
+        return MACRO_OPERATORS[type(node.op)](macro_node_value(node.left), macro_node_value(node.right))
+    raise ValueError(f"Phần tử không được hỗ trợ: {type(node).__name__}")
+
+
+def macro_bounds(primitives, params):
+    """
+    Hình chữ nhật bao (x1, y1, x2, y2) các primitive phủ (exposure on) của một aperture macro.
+    :param primitives: Các primitive của macro (chuỗi, như trong lệnh %AM).
+    :param params: Tham số của lệnh %AD ($1, $2, ...).
+    :return: Hình chữ nhật bao, hoặc None nếu macro không có primitive nào được hỗ trợ.
+    """
+    variables = {index + 1: value for index, value in enumerate(params)}
+    corners = []
+    for primitive in primitives:
+        if not primitive or primitive.startswith("0"):
+            continue  # Chú thích
+        if primitive.startswith("$"):
+            name, _, expression = primitive.partition("=")
+            variables[int(name[1:])] = macro_value(expression, variables)
+            continue
+        values = [macro_value(value, variables) for value in primitive.split(",")]
+        code, args = int(values[0]), values[1:]
+        if code == 7:  # Thermal: tâm, đường kính ngoài (không có exposure)
+            x, y, size = args[0], args[1], args[2] / 2
+            points, rotation = [(x - size, y - size), (x + size, y + size)], args[5] if len(args) > 5 else 0.0
+        elif not args or args[0] == 0:
+            continue  # Primitive xóa (exposure off)
+        elif code == 1:  # Circle: đường kính, tâm
+            x, y, size = args[2], args[3], args[1] / 2
+            points, rotation = [(x - size, y - size), (x + size, y + size)], args[4] if len(args) > 4 else 0.0
+        elif code == 20:  # Vector line: độ rộng, hai đầu mút
+            size = args[1] / 2
+            points = [(x + sx, y + sy) for x, y in ((args[2], args[3]), (args[4], args[5]))
+                      for sx in (-size, size) for sy in (-size, size)]
+            rotation = args[6]
+        elif code == 21:  # Center line: rộng, cao, tâm
+            w, h = args[1] / 2, args[2] / 2
+            points = [(args[3] + sx, args[4] + sy) for sx in (-w, w) for sy in (-h, h)]
+            rotation = args[5]
+        elif code == 4:  # Outline: số đỉnh, các đỉnh
+            count = int(args[1])
+            points = list(zip(args[2:4 + 2 * count:2], args[3:4 + 2 * count:2]))
+            rotation = args[4 + 2 * count] if len(args) > 4 + 2 * count else 0.0
+        elif code == 5:  # Polygon: số đỉnh, tâm, đường kính ngoài
+            x, y, size = args[2], args[3], args[4] / 2
+            points, rotation = [(x - size, y - size), (x + size, y + size)], args[5] if len(args) > 5 else 0.0
+        else:
+            continue
+        if rotation:
+            cos, sin = math.cos(math.radians(rotation)), math.sin(math.radians(rotation))
+            points = [(x * cos - y * sin, x * sin + y * cos) for x, y in points]
+        corners += points
+    if not corners:
+        return None
+    xs, ys = zip(*corners)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def forward_fill(has, values, start):
+    """
+    Giá trị theo kiểu modal của Gerber: phần tử không có giá trị (has False) lấy giá trị có gần nhất trước nó,
+    hoặc `start` nếu chưa có.
+    """
+    last = np.maximum.accumulate(np.where(has, np.arange(len(has)), -1))
+    return np.where(last >= 0, values[last], start)
+
+
+def split_strokes(points, limit=TRACE_ITEM_POINTS):
+    """
+    Cắt một mảng nét (ngăn cách bởi hàng NaN) thành các phần khoảng `limit` đỉnh, chỉ cắt tại chỗ ngăn cách.
+    """
+    if len(points) <= limit:
+        return [points]
+    breaks = np.flatnonzero(np.isnan(points[:, 0]))
+    cut = np.searchsorted(breaks, np.arange(limit, len(points), limit)) - 1
+    pieces, start = [], 0
+    for row in np.unique(breaks[cut[cut >= 0]]).tolist():
+        pieces.append(points[start:row])
+        start = row + 1
+    pieces.append(points[start:])
+    return [piece for piece in pieces if len(piece)]
+
+
+class GerberOutput:
+    """Các đối tượng đã đọc (tọa độ scene) chưa được lấy ra, gom theo D-code của aperture"""
+
+    def __init__(self):
+        self.flashes = {}  # D-code -> danh sách phẳng x, y của các flash
+        self.traces = {}  # D-code -> danh sách phẳng x, y của các nét đang gom (NaN ngăn cách)
+        self.flash_arrays = []  # (D-code, mảng (N, 2)) flash của các khối step-repeat
+        self.trace_arrays = []  # (D-code, mảng (N, 2)) các nhóm nét đã đủ lớn
+        self.regions = []  # Mỗi vùng G36/G37: danh sách đường bao (mảng (N, 2))
+
+
+class GerberBatch:
+    """Phần kết quả lấy ra bởi GerberParser.take(): các mảng (N, 2) theo tọa độ scene"""
+
+    def __init__(self, output: GerberOutput = None):
+        output = output or GerberOutput()
+        self.flashes = list(output.flash_arrays)  # (D-code, vị trí các flash)
+        self.flashes += [(code, np.array(flat).reshape(-1, 2)) for code, flat in output.flashes.items() if flat]
+        self.traces = list(output.trace_arrays)  # (D-code, các nét cùng aperture, NaN ngăn cách)
+        self.traces += [(code, np.array(flat).reshape(-1, 2)) for code, flat in output.traces.items() if flat]
+        self.regions = output.regions
+
+    def __len__(self):
+        return sum(len(points) for _, points in self.flashes) + len(self.traces) + len(self.regions)
+
+
+class GerberParser:
+    """
+    Bộ đọc Gerber RS-274X theo luồng: nhận dữ liệu từng khối (feed), giữ trạng thái đồ họa
+    (định dạng tọa độ, đơn vị, aperture, chế độ nội suy, vùng, polarity, step-repeat) và gom kết quả
+    theo aperture; take() lấy phần đã đọc, nên bộ nhớ chỉ phụ thuộc vào lượng dữ liệu giữa hai lần take().
+    Tọa độ kết quả là tọa độ scene (mm * PAD_SCALE, trục Y hướng xuống); cung tròn được xấp xỉ bằng đoạn thẳng.
+    Đối tượng có polarity clear (LPC) không được nhập mà chỉ được đếm trong `skipped`.
+    """
+
+    def __init__(self):
+        self.apertures = {}  # D-code -> GerberAperture (None nếu không hỗ trợ)
+        self.macros = {}  # Tên aperture macro -> các primitive
+        self.file_function = None  # Các trường của thuộc tính .FileFunction
+        self.skipped = 0  # Số đối tượng polarity clear đã bỏ qua
+        self.finished = False  # Đã gặp M02
+        self.unit = 1.0  # Số mm của một đơn vị trong file
+        self.x = self.y = 0.0  # Điểm hiện tại (tọa độ scene)
+        self._integer, self._decimals, self._trailing = 2, 4, False
+        self._number = self._scale = None
+        self._update_number()
+        self._rest = b""
+        self._extended = False
+        self._interpolation = 1  # 1: đường thẳng, 2: cung thuận chiều kim đồng hồ, 3: ngược chiều
+        self._multi_quadrant = True
+        self._operation = None  # D01/D02/D03 cuối cùng (tọa độ không kèm D-code dùng lại nó)
+        self._aperture = None
+        self._dark = True
+        self._region = None  # Các đường bao của vùng đang đọc (G36)
+        self._contour = None
+        self._drawing = False  # Nét hiện tại đang mở (D01 nối tiếp)
+        self._block = None  # (số lần lặp X, Y, bước X, Y) của khối step-repeat đang đọc
+        self._root = GerberOutput()
+        self._output = self._root  # Khối step-repeat ghi vào một GerberOutput riêng
+        self._discard = GerberOutput()  # Đích của đối tượng polarity clear
+        self._flashes = self._trace = None
+        self._select()
+
+    # --- Đọc dữ liệu ---
+
+    def feed(self, data: bytes):
+        """
+        Đọc thêm một khối dữ liệu của file; lệnh bị cắt ở cuối khối được giữ lại tới lần sau.
+        """
+        data = self._rest + data if self._rest else data
+        position = 0
+        while not self.finished:
+            end = data.find(b"%", position)
+            if self._extended:
+                if end < 0:
+                    break
+                self._extended_command(data[position:end])
+                self._extended = False
+            else:
+                last = data.rfind(b"*", position, len(data) if end < 0 else end)
+                if last >= 0:
+                    self._words(data[position:last + 1])
+                    position = last + 1
+                if end < 0:
+                    break
+                self._extended = True
+            position = end + 1
+        self._rest = data[position:] if not self.finished else b""
+
+    def finish(self):
+        """
+        Kết thúc file: đóng khối step-repeat và nét đang mở.
+        """
+        if self._rest.strip(WHITESPACE) and not self._extended:
+            self._words(self._rest + b"*")
+        self._rest = b""
+        self._close_block()
+        self._drawing = False
+
+    def take(self) -> GerberBatch:
+        """
+        Lấy các đối tượng đã đọc xong (khối step-repeat đang đọc dở được giữ lại tới khi đóng).
+        """
+        stroke = self._open_stroke() if self._drawing else None  # Nét đang mở được giữ lại để nối tiếp
+        batch = GerberBatch(self._root)
+        self.skipped += sum(len(flat) // 2 for flat in self._discard.flashes.values())
+        self.skipped += sum(flat.count(math.nan) // 2 + 1 for flat in self._discard.traces.values() if flat)
+        self._discard = GerberOutput()
+        self._root = GerberOutput()
+        if self._block is None:
+            self._output = self._root
+        self._select()
+        if stroke:
+            self._trace += stroke
+            self._drawing = True
+        return batch
+
+    def _open_stroke(self) -> list:
+        # Lấy các đỉnh (phẳng) của nét đang mở ra khỏi danh sách đích, cùng cặp NaN ngăn cách đứng trước nó
+        trace = self._trace
+        start = len(trace)
+        while start and not math.isnan(trace[start - 2]):
+            start -= 2
+        stroke = trace[start:]
+        del trace[max(start - 2, 0):]
+        return stroke
+
+    # --- Lệnh dạng word (tọa độ, G/D/M) ---
+
+    def _words(self, data: bytes):
+        # Dãy lệnh chỉ gồm tọa độ và D01/D02/D03 được đọc bằng NumPy (_vector_words); lệnh có ký tự khác
+        # (chú thích, I/J của cung tròn, M02, số thập phân, ...) được đọc từng lệnh (_word_loop)
+        data = data.translate(None, WHITESPACE)
+        if self._scale is None:
+            self._word_loop(data)
+            return
+        position = 0  # Đầu phần chưa đọc
+        pending = None  # (đầu, cuối) các lệnh phức tạp liền nhau chưa đọc
+        for bad in COMPLEX_CHARACTER.finditer(data):
+            if pending is not None and bad.start() < pending[1]:
+                continue
+            start = data.rfind(b"*", 0, bad.start()) + 1
+            end = data.find(b"*", bad.start()) + 1 or len(data)
+            if pending is not None:
+                if data.count(b"*", pending[1], start) < VECTOR_MIN_WORDS:
+                    pending = (pending[0], end)  # Dãy lệnh đơn giản xen giữa quá ngắn: đọc từng lệnh luôn
+                    continue
+                self._word_loop(data[pending[0]:pending[1]])
+                if self.finished:
+                    return
+                position = pending[1]
+            if start > position:
+                self._vector_words(data[position:start])
+            pending = (start, end)
+        if pending is not None:
+            self._word_loop(data[pending[0]:pending[1]])
+            if self.finished:
+                return
+            position = pending[1]
+        if position < len(data):
+            self._vector_words(data[position:])
+
+    def _vector_words(self, data: bytes):
+        # Tách mọi số của dãy lệnh trong một lần gọi NumPy, rồi ghép với chữ cái đứng trước mỗi số
+        numbers = np.fromstring(data.translate(NUMBER_SEPARATORS), dtype=np.int64, sep=" ")
+        markers = np.frombuffer(data.translate(None, b"0123456789+-"), dtype=np.uint8)
+        ends = markers == ord("*")
+        letters = markers[~ends]
+        if len(numbers) != len(letters):  # Chữ không kèm số (lệnh sai dạng)
+            self._word_loop(data)
+            return
+        count = len(markers) - len(letters)
+        words = np.cumsum(ends)[~ends]  # Chỉ số lệnh của từng chữ
+        fields = {}
+        for letter in b"XYDG":
+            mask = letters == letter
+            has = np.zeros(count, dtype=bool)
+            has[words[mask]] = True
+            values = np.zeros(count, dtype=np.int64)
+            values[words[mask]] = numbers[mask]
+            fields[letter] = (has, values)
+
+        # Lệnh đổi trạng thái (chọn aperture, G36/G37, G02/G03, ...) chia dãy thành các đoạn
+        has_g, g_values = fields[ord("G")]
+        has_d, d_values = fields[ord("D")]
+        special = np.flatnonzero((has_g & (g_values != 1)) | (has_d & ((d_values < 1) | (d_values > 3))))
+        stars = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("*")) if len(special) else None
+        start = 0
+        for stop in special.tolist() + [count]:
+            # Đoạn [start, stop) rồi lệnh đặc biệt `stop`; đoạn ngắn được đọc từng lệnh cùng lệnh đặc biệt
+            first = start
+            if stop - start >= VECTOR_MIN_WORDS and self._interpolation == 1:
+                self._vector_run(fields, start, stop)
+                first = stop
+            last = min(stop, count - 1)
+            if first <= last:
+                if stars is None:
+                    stars = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("*"))
+                self._word_loop(data[int(stars[first - 1]) + 1 if first else 0:int(stars[last]) + 1])
+                if self.finished:
+                    return
+            start = stop + 1
+
+    def _vector_run(self, fields, start, stop):
+        # Đọc các lệnh [start, stop) chỉ gồm tọa độ, D01/D02/D03 và G01 bằng các phép toán trên mảng
+        has_x, x_values = (array[start:stop] for array in fields[ord("X")])
+        has_y, y_values = (array[start:stop] for array in fields[ord("Y")])
+        has_d, d_values = (array[start:stop] for array in fields[ord("D")])
+        rows = np.flatnonzero(has_x | has_y | has_d)
+        if not len(rows):
+            return
+        x = forward_fill(has_x[rows], x_values[rows] * self._scale, self.x)
+        y = forward_fill(has_y[rows], y_values[rows] * -self._scale, self.y)
+        operations = forward_fill(has_d[rows], d_values[rows], self._operation or 0)
+
+        flash = operations == 3
+        if flash.any():
+            if self._dark:
+                self._output.flash_arrays.append((self._aperture, np.column_stack([x[flash], y[flash]])))
+            else:
+                self.skipped += int(flash.sum())
+        if self._region is not None and self._contour is not None:
+            moves = np.flatnonzero(operations != 3)
+            if len(moves) and operations[moves[0]] == 2:
+                self._close_contour()
+        draw = operations == 1
+        if draw.any():
+            self._vector_draw(x, y, operations, draw)
+        self.x, self.y, self._operation = float(x[-1]), float(y[-1]), int(operations[-1])
+        self._drawing = self._region is None and self._operation == 1
+
+    def _vector_draw(self, x, y, operations, draw):
+        # Các nét (NaN ngăn cách) từ các lệnh D01; nét mới bắt đầu từ điểm của lệnh đứng trước nó.
+        # Nét (đường bao) đang mở từ trước được nối tiếp, nét cuối còn mở được giữ lại cho lệnh sau
+        previous = np.empty_like(operations)
+        previous[0] = 1 if (self._contour is not None if self._region is not None else self._drawing) else 0
+        previous[1:] = operations[:-1]
+        rows = np.flatnonzero(draw)
+        new = previous[rows] != 1
+        offsets = np.arange(len(rows)) + 2 * np.cumsum(new)
+        points = np.empty((len(rows) + 2 * int(new.sum()), 2))
+        points[offsets, 0], points[offsets, 1] = x[rows], y[rows]
+        firsts, starts = offsets[new], rows[new] - 1
+        points[firsts - 1, 0] = np.where(starts >= 0, x[starts], self.x)
+        points[firsts - 1, 1] = np.where(starts >= 0, y[starts], self.y)
+        points[firsts - 2] = np.nan
+        if new[0]:
+            points = points[1:]
+
+        if self._region is None:
+            if not new[0]:
+                points = np.concatenate([np.array(self._open_stroke()).reshape(-1, 2), points])
+            if operations[-1] == 1:
+                breaks = np.flatnonzero(np.isnan(points[:, 0]))
+                last = int(breaks[-1]) if len(breaks) else -1
+                if self._trace:
+                    self._trace += NAN_PAIR
+                self._trace += points[last + 1:].ravel().tolist()
+                points = points[:max(last, 0)]
+            if not len(points):
+                return
+            if self._dark:
+                self._output.trace_arrays += [(self._aperture, piece) for piece in split_strokes(points)]
+            else:
+                self.skipped += int(np.isnan(points[:, 0]).sum()) + 1
+            return
+        if not new[0]:
+            points = np.concatenate([np.array(self._contour).reshape(-1, 2), points])
+        elif self._contour is not None:
+            self._close_contour()
+        breaks = np.flatnonzero(np.isnan(points[:, 0]))
+        contours = [points[first + 1:last] for first, last in
+                    zip([-1] + breaks.tolist(), breaks.tolist() + [len(points)])]
+        # Đường bao cuối còn mở nếu chưa có D02 sau nó
+        self._contour = contours.pop().ravel().tolist() if operations[-1] == 1 else None
+        self._region += [contour for contour in contours if len(contour) >= 3]
+
+    def _word_loop(self, data: bytes):
+        match = WORD.match
+        number = self._number
+        for word in data.split(b"*"):
+            if not word:
+                continue
+            parsed = match(word)
+            if parsed is None:
+                self._other_word(word)
+                if self.finished:
+                    return
+                number = self._number
+                continue
+            code, xs, ys, i_s, js, operation = parsed.groups()
+            if code is not None:
+                if code == b"4":
+                    continue  # Chú thích
+                self._g_code(int(code))
+                number = self._number
+            if operation is None:
+                if xs is None and ys is None:
+                    continue
+                operation = self._operation  # Tọa độ không kèm D-code: lặp lại thao tác trước
+            else:
+                operation = int(operation)
+                if operation not in (1, 2, 3):
+                    self._aperture = operation
+                    self._select()
+                    continue
+            self._operation = operation
+            x = number(xs) if xs is not None else self.x
+            y = -number(ys) if ys is not None else self.y
+
+            if operation == 1:
+                if self._region is not None:
+                    target = self._contour
+                    if target is None:
+                        target = self._contour = [self.x, self.y]
+                else:
+                    target = self._trace
+                    if not self._drawing:
+                        if target:
+                            if len(target) >= 2 * TRACE_ITEM_POINTS:
+                                self._output.trace_arrays.append(
+                                    (self._aperture, np.array(target).reshape(-1, 2)))
+                                target.clear()
+                            else:
+                                target += NAN_PAIR
+                        target += (self.x, self.y)
+                        self._drawing = True
+                if self._interpolation == 1:
+                    target += (x, y)
+                else:
+                    self._arc(x, y, number(i_s) if i_s is not None else 0.0,
+                              -number(js) if js is not None else 0.0, target)
+            elif operation == 2:
+                self._drawing = False
+                if self._region is not None:
+                    self._close_contour()
+            elif operation == 3:
+                self._drawing = False
+                self._flashes += (x, y)
+            self.x, self.y = x, y
+
+    def _other_word(self, word: bytes):
+        if word.startswith(b"G04") or word.startswith(b"G4"):
+            return  # Chú thích
+        if word in (b"M02", b"M2", b"M00", b"M0"):
+            self._close_block()
+            self._drawing = False
+            self.finished = True
+            return
+        if word.startswith(b"G"):
+            # G-code kèm phần không dùng tới (ví dụ G54D10 đã khớp ở trên; G01 kiểu cũ có số thập phân)
+            digits = re.match(rb"G0*(\d+)", word)
+            if digits is not None:
+                self._g_code(int(digits.group(1)))
+                rest = word[digits.end():]
+                if rest:
+                    self._word_loop(rest)
+
+    def _g_code(self, code: int):
+        if code in (1, 2, 3):
+            self._interpolation = code
+        elif code == 36:
+            self._drawing = False
+            self._region = []
+        elif code == 37:
+            self._close_contour()
+            if self._region:
+                if self._dark:
+                    self._output.regions.append(self._region)
+                else:
+                    self.skipped += 1
+            self._region = None
+        elif code == 74:
+            self._multi_quadrant = False
+        elif code == 75:
+            self._multi_quadrant = True
+        elif code in (70, 71):  # Đơn vị kiểu cũ: G70 inch, G71 mm
+            self.unit = INCH if code == 70 else 1.0
+            self._update_number()
+        elif code == 91:
+            raise ValueError("Không hỗ trợ tọa độ tương đối (G91) trong file Gerber.")
+
+    def _close_contour(self):
+        if self._contour is not None and len(self._contour) >= 6:
+            self._region.append(np.array(self._contour).reshape(-1, 2))
+        self._contour = None
+
+    def _select(self):
+        # Gắn danh sách đích của aperture hiện tại (theo polarity và khối step-repeat)
+        output = self._output if self._dark else self._discard
+        self._flashes = output.flashes.setdefault(self._aperture, [])
+        self._trace = output.traces.setdefault(self._aperture, [])
+        self._drawing = False
+
+    def _update_number(self):
+        # Hàm đổi chuỗi tọa độ của file ra tọa độ scene theo định dạng (FS) và đơn vị (MO) hiện tại
+        scale = self.unit * PAD_SCALE / 10 ** self._decimals
+        decimal_scale = self.unit * PAD_SCALE
+        self._scale = None if self._trailing else scale  # Bước đổi của đường đọc bằng NumPy
+        if self._trailing:
+            digits = self._integer + self._decimals
+
+            def number(text):
+                if b"." in text:
+                    return float(text) * decimal_scale
+                value = int(text.lstrip(b"+-").ljust(digits, b"0")) * scale
+                return -value if text.startswith(b"-") else value
+        else:
+            def number(text):
+                try:
+                    return int(text) * scale
+                except ValueError:
+                    return float(text) * decimal_scale
+        self._number = number
+
+    def _arc(self, x, y, i, j, target):
+        # Xấp xỉ cung tròn từ điểm hiện tại tới (x, y) bằng các đoạn thẳng, nối vào target (không gồm điểm đầu)
+        start_x, start_y = self.x, self.y
+        clockwise = self._interpolation == 2
+        if self._multi_quadrant:
+            center_x, center_y = start_x + i, start_y + j
+        else:
+            center_x, center_y = self._quadrant_center(x, y, abs(i), abs(j), clockwise)
+        radius = math.hypot(start_x - center_x, start_y - center_y)
+        start = math.atan2(start_y - center_y, start_x - center_x)
+        sweep = self._sweep(start, math.atan2(y - center_y, x - center_x), clockwise)
+        if radius > ARC_TOLERANCE:
+            step = 2 * math.acos(1 - ARC_TOLERANCE / radius)
+            steps = max(1, math.ceil(abs(sweep) / step))
+            for k in range(1, steps):
+                angle = start + sweep * k / steps
+                target += (center_x + radius * math.cos(angle), center_y + radius * math.sin(angle))
+        target += (x, y)
+
+    def _sweep(self, start, end, clockwise):
+        # Trục Y của scene hướng xuống nên cung thuận chiều kim đồng hồ của Gerber có góc tăng dần
+        sweep = (end - start) % math.tau if clockwise else -((start - end) % math.tau)
+        if abs(sweep) < 1e-9 and self._multi_quadrant:
+            sweep = math.tau if clockwise else -math.tau  # Điểm đầu trùng điểm cuối: cả đường tròn
+        return sweep
+
+    def _quadrant_center(self, x, y, i, j, clockwise):
+        # G74: I, J không dấu; chọn tâm cho cung không quá 90 độ và hai bán kính gần bằng nhau nhất
+        best, best_error = (self.x + i, self.y + j), math.inf
+        for center_x in (self.x - i, self.x + i):
+            for center_y in (self.y - j, self.y + j):
+                start = math.atan2(self.y - center_y, self.x - center_x)
+                sweep = self._sweep(start, math.atan2(y - center_y, x - center_x), clockwise)
+                error = abs(math.hypot(self.x - center_x, self.y - center_y) - math.hypot(x - center_x, y - center_y))
+                if abs(sweep) <= math.pi / 2 + 1e-6 and error < best_error:
+                    best, best_error = (center_x, center_y), error
+        return best
+
+    # --- Lệnh mở rộng (%...%) ---
+
+    def _extended_command(self, data: bytes):
+        text = data.decode("ascii", "replace").replace("\r", "").replace("\n", "")
+        parts = [part for part in text.split("*") if part]
+        if parts and parts[0].startswith("AM"):
+            self.macros[parts[0][2:]] = [part.strip() for part in parts[1:]]
+            return
+        for part in parts:
+            command = part[:2]
+            if command == "FS":
+                match = FORMAT.match(part)
+                if match is None:
+                    raise ValueError(f"Lệnh định dạng tọa độ không hợp lệ: {part}")
+                if match.group(2) == "I":
+                    raise ValueError("Không hỗ trợ tọa độ tương đối (FS...I) trong file Gerber.")
+                self._trailing = match.group(1) == "T"
+                self._integer, self._decimals = int(match.group(3)), int(match.group(4))
+                self._update_number()
+            elif command == "MO":
+                self.unit = INCH if part[2:4] == "IN" else 1.0
+                self._update_number()
+            elif command == "AD":
+                self._define_aperture(part)
+            elif command == "LP":
+                self._dark = part[2:3] != "C"
+                self._select()
+            elif command == "SR":
+                self._step_repeat(part)
+            elif part.startswith("TF.FileFunction"):
+                self.file_function = part.split(",")[1:]
+            # Các lệnh khác (TF/TA/TO/TD, LM/LR/LS, IP, OF, ...) không ảnh hưởng tới hình được nhập
+
+    def _define_aperture(self, text):
+        match = APERTURE.match(text)
+        if match is None:
+            raise ValueError(f"Lệnh định nghĩa aperture không hợp lệ: {text}")
+        code, template = int(match.group(1)), match.group(2)
+        values = [float(value) for value in match.group(3).split("X") if value]
+        params = [value * self.unit for value in values]
+        aperture = None
+        if template == "C" and params:
+            aperture = GerberAperture("Circle", params[0], params[0], params[1] if len(params) > 1 else 0.0)
+        elif template in ("R", "O") and len(params) >= 2:
+            aperture = GerberAperture("Rectangle" if template == "R" else "Oval", params[0], params[1],
+                                      params[2] if len(params) > 2 else 0.0)
+        elif template == "P" and params:  # Đa giác đều: xấp xỉ bằng hình tròn ngoại tiếp
+            aperture = GerberAperture("Circle", params[0], params[0], params[3] if len(params) > 3 else 0.0)
+        elif template in self.macros:
+            # Macro: xấp xỉ bằng hình chữ nhật bao (tính theo đơn vị của file rồi đổi sang mm)
+            bounds = macro_bounds(self.macros[template], values)
+            if bounds is not None:
+                x1, y1, x2, y2 = (value * self.unit for value in bounds)
+                aperture = GerberAperture("Rectangle", x2 - x1, y2 - y1, 0.0, (x1 + x2) / 2, (y1 + y2) / 2)
+        self.apertures[code] = aperture
+
+    def _step_repeat(self, text):
+        self._close_block()
+        match = STEP_REPEAT.match(text)
+        if match is None:
+            return  # %SR*%: kết thúc khối
+        repeat_x, repeat_y = int(match.group(1)), int(match.group(2))
+        if repeat_x * repeat_y > 1:
+            step = self.unit * PAD_SCALE
+            self._block = (repeat_x, repeat_y, float(match.group(3)) * step, float(match.group(4)) * step)
+            self._output = GerberOutput()
+            self._select()
+
+    def _close_block(self):
+        # Nhân bản nội dung khối step-repeat theo lưới rồi đưa vào kết quả chung
+        if self._block is None:
+            return
+        repeat_x, repeat_y, step_x, step_y = self._block
+        block = GerberBatch(self._output)
+        self._block = None
+        self._output = self._root
+        self._select()
+        offsets = np.array([(column * step_x, -row * step_y) for row in range(repeat_y) for column in range(repeat_x)])
+        for code, points in block.flashes:
+            self._root.flash_arrays.append((code, (points[None] + offsets[:, None]).reshape(-1, 2)))
+        for code, points in block.traces:
+            for offset in offsets:
+                self._root.trace_arrays += [(code, piece) for piece in split_strokes(points + offset)]
+        for region in block.regions:
+            self._root.regions += [[contour + offset for contour in region] for offset in offsets]
+
+
+class GerberImporter:
+    """
+    Nhập một file Gerber vào một layer của LayerManager: flash thành pad của một PadField
+    (mỗi aperture một PadSpec dùng chung), nét vẽ thành TraceItem gom các nét cùng aperture,
+    vùng G36/G37 thành LayerRegionItem (tô màu layer). File được đọc theo khối GERBER_CHUNK_BYTES và đối tượng
+    của mỗi khối được thêm vào layer qua add_items_to_layer, nên bộ nhớ tạm không phụ thuộc kích thước file.
+    Cả lần nhập là một bước hoàn tác; nếu file lỗi giữa chừng, phần đã nhập được giữ lại và vẫn là một bước hoàn tác.
+    """
+
+    def __init__(self, layer_manager, layer_name=None, chunk_size=GERBER_CHUNK_BYTES):
+        """
+        :param layer_name: Layer đích; None để đoán theo .FileFunction hoặc tên file (mặc định DEFAULT_GERBER_LAYER).
+        :param chunk_size: Số byte đọc mỗi lần.
+        """
+        self.layer_manager = layer_manager
+        self.layer_name = layer_name
+        self.chunk_size = int(chunk_size)
+        self.items = []  # Các item đã tạo
+        self.field = None  # PadField chứa các flash
+        self.flashes = 0
+        self.strokes = 0
+        self.regions = 0
+        self.skipped = 0  # Flash/nét có aperture không hỗ trợ và đối tượng polarity clear
+        self._specs = {}  # D-code -> PadSpec
+        self._pens = {}  # D-code -> QPen
+
+    def import_file(self, path) -> list:
+        """
+        Đọc file và thêm các đối tượng vào layer.
+        :return: Các item đã tạo.
+        """
+        parser = GerberParser()
+        scene = self.layer_manager.scene
+        try:
+            with open(path, "rb") as stream, bulk_update(scene):
+                while not parser.finished:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    parser.feed(chunk)
+                    self._add(path, parser, parser.take())
+                parser.finish()
+                self._add(path, parser, parser.take())
+        finally:
+            # Lỗi giữa chừng: bulk_update vẫn thêm các item đã xếp hàng vào scene (xem SceneBatch),
+            # nên phần đã nhập được ghi thành một bước hoàn tác để người dùng gỡ được
+            self.skipped += parser.skipped
+            if self.items:
+                record(scene, AddItemsCommand(scene, self.items,
+                                              partial(self.layer_manager.add_items_to_layer, self.layer_name),
+                                              partial(self.layer_manager.remove_items_from_layer, self.layer_name),
+                                              "Import Gerber"))
+            elif self.layer_name is None:
+                self.layer_name = gerber_layer(path, parser.file_function) or DEFAULT_GERBER_LAYER
+        return self.items
+
+    def _add(self, path, parser, batch):
+        if not len(batch):
+            return
+        if self.layer_name is None:
+            self.layer_name = gerber_layer(path, parser.file_function) or DEFAULT_GERBER_LAYER
+        layer = self.layer_manager.layers.get(self.layer_name)
+        if layer is None:
+            raise ValueError(f"Layer '{self.layer_name}' không tồn tại.")
+        items = []
+
+        specs, spec_indices, positions = [], [], []
+        for code, points in batch.flashes:
+            spec = self._spec(parser, code)
+            if spec is None:
+                self.skipped += len(points)
+                continue
+            aperture = parser.apertures[code]
+            if aperture.dx or aperture.dy:
+                points = points + (aperture.dx * PAD_SCALE, -aperture.dy * PAD_SCALE)
+            spec_indices.append(np.full(len(points), len(specs), dtype=np.int32))
+            specs.append(spec)
+            positions.append(points)
+        if positions:
+            spec_indices, positions = np.concatenate(spec_indices), np.concatenate(positions)
+            self.flashes += len(positions)
+            if self.field is None:
+                self.field = PadField()
+                self.field.set_pads(specs, spec_indices, positions)
+                items.append(self.field)
+            else:
+                self.field.append_pads(specs, spec_indices, positions)
+                layer.item_moved(self.field)
+
+        for code, points in batch.traces:
+            pen = self._pen(parser, code, layer)
+            strokes = int(np.isnan(points[:, 0]).sum()) + 1
+            if pen is None:
+                self.skipped += strokes
+                continue
+            self.strokes += strokes
+            items.append(TraceItem(points, pen))
+
+        for contours in batch.regions:
+            # Tô bằng màu của layer (LayerRegionItem) để lưu/mở project và khôi phục giữ được phần tô
+            outline = QPainterPath()
+            outline.setFillRule(Qt.WindingFill)
+            for contour in contours:
+                outline.addPolygon(points_to_polygon(contour))
+                outline.closeSubpath()
+            path_item = LayerRegionItem(outline)
+            path_item.setFlag(QGraphicsItem.ItemIsSelectable, True)
+            items.append(path_item)
+        self.regions += len(batch.regions)
+
+        if items:
+            self.layer_manager.add_items_to_layer(self.layer_name, items)
+            self.items += items
+
+    def _spec(self, parser, code):
+        # PadSpec dùng chung cho mọi flash của một aperture (None nếu aperture không dùng được)
+        if code not in self._specs:
+            aperture = parser.apertures.get(code)
+            spec = None
+            if aperture is not None and aperture.width > 0 and aperture.height > 0:
+                spec = PadSpec.from_data({
+                    'type': 'SMD',
+                    'shape': aperture.shape,
+                    'width': aperture.width,
+                    'height': aperture.height,
+                    'hole_diameter': aperture.hole_diameter,
+                    'layers': {self.layer_name: True},
+                    'thermal': {'enabled': False},
+                })
+            self._specs[code] = spec
+        return self._specs[code]
+
+    def _pen(self, parser, code, layer):
+        # Bút của các nét vẽ bằng một aperture: màu layer, độ rộng là kích thước aperture
+        if code not in self._pens:
+            aperture = parser.apertures.get(code)
+            pen = None
+            if aperture is not None:
+                pen = QPen(layer.color, min(aperture.width, aperture.height) * PAD_SCALE)
+            self._pens[code] = pen
+        return self._pens[code]
@@ -0,0 +1,674 @@
+# journal.py
+
+import glob
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtGui import QColor
+
+from pad import Pad
+from pad_spec import PadSpec
+from pad_bulk_edit import PadBulkEdit
+from layer_manager import LayerItem
+from project_file import (NO_LAYER, NO_FIELD, ProjectData, collect_items, project_groups, concat_projects, project_blob,
+                          project_from_blob, encode_blob, decode_blob, save_project, load_project, add_project_items,
+                          apply_project)
+from scene_batch import bulk_update
+from setting_manager import write_file_atomic
+from undo_stack import (AddItemsCommand, MoveItemsCommand, PadFieldMoveCommand, LayerPropertyCommand, LayerCommand,
+                        undo_stack, set_undo_stack, item_positions)
+
+# Bố cục nhật ký: JOURNAL_MAGIC, rồi các bản ghi nối tiếp. Mỗi bản ghi: độ dài và CRC32 (RECORD_HEADER),
+# rồi một khối encode_blob (header JSON có "op", cùng các mảng NumPy nhỏ của thay đổi).
+# Bản ghi đầu tiên ("start") trỏ tới snapshot; phát lại các bản ghi sau lên snapshot cho ra thiết kế.
+JOURNAL_MAGIC = b"PCBJRNL1"
+RECORD_HEADER = struct.Struct("<II")
+RECORD_ALIGNMENT = 8
+AUTOSAVE_DIR = "autosave"
+JOURNAL_NAME = "session.journal"
+SNAPSHOT_PATTERN = re.compile(r"session\.(\d+)\.pcbp$")
+COMPACT_BYTES = 16 * 1024 * 1024  # Gộp nhật ký vào snapshot mới khi vượt kích thước này
+COMPACT_INTERVAL_MS = 5 * 60 * 1000  # và định kỳ, nếu có bản ghi mới
+COMPACT_SLICE_MS = 8  # Thời gian tối đa mỗi lượt gom snapshot trên luồng GUI
+COMPACT_CHUNK = 500  # Số item gom mỗi phần (vài ms)
+COMPACT_RETRY_MS = 200  # Chờ trước khi thử gom lại khi view đang tương tác hoặc nhật ký tạm dừng
+COMPACT_RESTARTS = 3  # Số lần gom theo lát bị bản ghi mới làm dở; sau đó gom hết trong một lượt
+
+
+def journal_path(directory=AUTOSAVE_DIR):
+    return os.path.join(directory, JOURNAL_NAME)
+
+
+def snapshot_path(directory, generation: int):
+    return os.path.join(directory, f"session.{generation}.pcbp")
+
+
+def snapshot_generations(directory):
+    """
+    Các snapshot tự động trong thư mục: {thế hệ: đường dẫn}.
+    """
+    snapshots = {}
+    for path in glob.glob(os.path.join(directory, "session.*.pcbp")):
+        match = SNAPSHOT_PATTERN.search(os.path.basename(path))
+        if match:
+            snapshots[int(match.group(1))] = path
+    return snapshots
+
+
+def remove_snapshots(directory, keep=None):
+    """
+    Xóa các snapshot tự động, trừ `keep`.
+    """
+    for path in snapshot_generations(directory).values():
+        if keep is None or os.path.abspath(path) != os.path.abspath(keep):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def encode_record(header: dict, arrays: dict = None) -> bytes:
+    """
+    Mã hóa một bản ghi nhật ký (độ dài, CRC32, khối encode_blob).
+    """
+    body = b"".join(encode_blob(header, arrays or {}, alignment=RECORD_ALIGNMENT))
+    return RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def read_records(buffer):
+    """
+    Các bản ghi (header, {tên: mảng}) của nhật ký. Dừng ở bản ghi đầu tiên bị cắt ngang hoặc sai CRC
+    (đang ghi dở khi chương trình dừng); mọi bản ghi trước đó vẫn được dùng.
+    """
+    offset = len(JOURNAL_MAGIC)
+    while offset + RECORD_HEADER.size <= len(buffer):
+        length, crc = RECORD_HEADER.unpack_from(buffer, offset)
+        start = offset + RECORD_HEADER.size
+        body = buffer[start:start + length]
+        if len(body) < length or zlib.crc32(body) != crc:
+            return
+        yield decode_blob(body, 0, RECORD_ALIGNMENT)
+        offset = start + length
+
+
+def layer_state(layer: LayerItem) -> dict:
+    return {"op": "layer", "name": layer.name, "color": layer.color.name(QColor.HexArgb),
+            "z": layer.zValue(), "opacity": layer.opacity()}
+
+
+def assign_ids(ids: dict, items, next_id: int = 0) -> int:
+    """
+    Đánh id cho các item theo thứ tự của collect_items: ids[item] = (id đầu, số hàng, dx, dy).
+    :return: Id tiếp theo.
+    """
+    # Một item chiếm nhiều hàng liên tiếp nếu được tạo lại thành nhiều item (path nhiều đoạn)
+    for item in items:
+        entry = ids.get(item)
+        if entry is None:
+            # Pad được tạo lại đúng vị trí; các item khác gộp vị trí vào hình học, tạo lại ở (0, 0)
+            offset = (0.0, 0.0) if isinstance(item, Pad) else (item.pos().x(), item.pos().y())
+            ids[item] = (next_id, 1) + offset
+        else:
+            ids[item] = (entry[0], entry[1] + 1) + entry[2:]
+        next_id += 1
+    return next_id
+
+
+class SnapshotCollector:
+    """
+    Gom thiết kế thành snapshot theo từng phần nhỏ, để luồng GUI không bị chiếm lâu:
+    trước hết các cột dữ liệu, rồi id của các item (xem assign_ids).
+    Các phần dùng chung bảng layer, PadSpec và bút; concat_projects ghép chúng thành một ProjectData.
+    """
+
+    def __init__(self, layer_manager, drawing_app=None, chunk=COMPACT_CHUNK):
+        self.data, groups = project_groups(layer_manager, drawing_app)
+        self.groups = [(layer_id, list(group)) for layer_id, group in groups]  # Danh sách của layer đổi khi sửa
+        self.chunk = int(chunk)
+        self.parts = [self.data]
+        # Item theo thứ tự add_project_items tạo lại chúng: Pad, rồi PadField, rồi hình vẽ
+        self._pads, self._fields, self._shapes = [], [], []
+        self._group = 0
+        self._row = 0
+        self._items = None  # Mọi item theo thứ tự id, khi đã gom xong các cột
+        self.ids = {}
+        self.next_id = 0
+
+    def step(self, budget_ms=None) -> bool:
+        """
+        Gom các phần tiếp theo cho tới khi hết `budget_ms` (None: gom hết).
+        :return: True nếu đã gom xong.
+        """
+        deadline = None if budget_ms is None else time.perf_counter() + budget_ms / 1000
+        while self._group < len(self.groups):
+            layer_id, group = self.groups[self._group]
+            part = ProjectData()
+            part.layers, part.specs, part.pens = self.data.layers, self.data.specs, self.data.pens
+            part.fields = self.data.fields
+            items = []
+            collect_items(part, [(layer_id, group[self._row:self._row + self.chunk])], items)
+            pads = int(np.count_nonzero(part.pads["field"] == NO_FIELD))
+            fields = pads + part.fields - self.data.fields
+            self._pads += items[:pads]
+            self._fields += items[pads:fields]
+            self._shapes += items[fields:]
+            self.data.fields = part.fields
+            self.parts.append(part)
+            self._row += self.chunk
+            if self._row >= len(group):
+                self._group += 1
+                self._row = 0
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+        if self._items is None:
+            self._items = self._pads + self._fields + self._shapes
+        while self.next_id < len(self._items):
+            self.next_id = assign_ids(self.ids, self._items[self.next_id:self.next_id + self.chunk], self.next_id)
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+        return True
+
+
+class ProjectJournal(QObject):
+    """
+    Tự động lưu dạng nhật ký chỉ nối thêm: mỗi thay đổi của thiết kế (lệnh của UndoStack, cài đặt)
+    được ghi thành một bản ghi nhỏ chứa trạng thái sau thay đổi của đúng các item bị chạm tới,
+    nên chi phí mỗi lần lưu tỉ lệ với thay đổi chứ không với cả bo mạch.
+    Luồng GUI chỉ mã hóa bản ghi; ghi file và fsync chạy trên luồng nền (gom nhiều bản ghi mỗi lần fsync).
+
+    Item được nhận diện bằng số thứ tự trong snapshot (thứ tự của collect_project/apply_project);
+    item mới nhận số tiếp theo theo thứ tự add_project_items tạo lại chúng khi phát lại.
+    Hình vẽ và PadField được tạo lại với vị trí gộp vào hình học, nên mỗi id nhớ thêm độ lệch đó.
+
+    Gộp nhật ký vào snapshot mới (compact) gom thiết kế theo từng lát ngắn giữa các sự kiện, và chờ
+    khi view đang được zoom/pan/kéo; ghép các phần, mã hóa và ghi snapshot chạy trên luồng nền.
+    """
+
+    def __init__(self, layer_manager, drawing_app=None, settings_manager=None, directory=AUTOSAVE_DIR,
+                 compact_bytes=COMPACT_BYTES, compact_interval_ms=COMPACT_INTERVAL_MS, parent=None):
+        """
+        :param directory: Thư mục chứa nhật ký và các snapshot tự động.
+        :param compact_bytes: Kích thước nhật ký (byte) mà từ đó thiết kế được gộp vào snapshot mới.
+        :param compact_interval_ms: Chu kỳ gộp nhật ký (0 để tắt).
+        """
+        super().__init__(parent)
+        self.layer_manager = layer_manager
+        self.drawing_app = drawing_app
+        self.settings_manager = settings_manager
+        self.view = getattr(drawing_app, "drawing_window", None)  # Không gom snapshot khi view đang tương tác
+        self.directory = directory
+        self.journal_path = journal_path(directory)
+        self.compact_bytes = int(compact_bytes)
+        self.project_path = None  # File project của phiên, ghi vào bản ghi "start" để khôi phục
+        self.generation = max(snapshot_generations(directory), default=0)
+        self.journal_bytes = 0  # Số byte bản ghi kể từ snapshot cuối
+        self.record_count = 0
+        self._ids = {}  # item -> (id đầu, số hàng, dx, dy)
+        self._next_id = 0
+        self._compact_pending = False  # Đang chờ/đang gom snapshot
+        self._collector = None  # SnapshotCollector đang gom dở
+        self._compact_restarts = 0  # Số lần gom dở bị bỏ vì có bản ghi mới
+        self.paused = False  # Bỏ qua lệnh (ví dụ khi đang nạp project từng phần); compact() khi tiếp tục
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="JournalWriter", daemon=True)
+        self._writer.start()
+
+        self._compact_timer = QTimer(self)
+        self._compact_timer.setSingleShot(True)
+        self._compact_timer.timeout.connect(self._compact_step)
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._periodic_compact)
+        if compact_interval_ms:
+            self._timer.start(int(compact_interval_ms))
+        if settings_manager is not None:
+            for category in settings_manager.settings:
+                settings_manager.add_listener(category, self.record_setting)
+
+    # --- Snapshot ---
+
+    def start(self, project_path=None, items=()):
+        """
+        Bắt đầu nhật ký mới với file project vừa mở hoặc vừa lưu làm snapshot.
+        :param items: Các item theo thứ tự apply_project/collect_project (tham số items của chúng).
+        """
+        self.project_path = project_path
+        self._begin(None, project_path, items)
+
+    def compact(self, wait: bool = False):
+        """
+        Gộp nhật ký: chụp thiết kế thành snapshot mới rồi bắt đầu nhật ký rỗng.
+        Luồng GUI gom các cột dữ liệu theo từng lát COMPACT_SLICE_MS; bản ghi mới trong lúc gom làm việc gom
+        bắt đầu lại (các phần đã gom không còn đúng). Sau COMPACT_RESTARTS lần như vậy, lượt sau gom hết
+        trong một lần để thay đổi liên tục không làm việc gộp chờ mãi. Lần gom đang dở cũng bắt đầu lại.
+        :param wait: Gom hết ngay trong lần gọi này thay vì theo từng lát.
+        """
+        self._compact_pending = True
+        self._collector = None
+        if wait:
+            self._collector = SnapshotCollector(self.layer_manager, self.drawing_app)
+            self._collector.step()
+            self._finish_compact()
+        else:
+            self._compact_timer.start(0)
+
+    @property
+    def compacting(self) -> bool:
+        """
+        True khi đang chờ hoặc đang gom snapshot mới.
+        """
+        return self._compact_pending
+
+    def _compact_step(self):
+        if not self._compact_pending:
+            return
+        if self.paused or (self.view is not None and self.view.interacting):
+            # Kéo dở chưa thành lệnh nên chưa có bản ghi: các phần gom lúc này có thể sai
+            self._collector = None
+            self._compact_timer.start(COMPACT_RETRY_MS)
+            return
+        if self._compact_restarts >= COMPACT_RESTARTS:
+            self.compact(wait=True)
+            return
+        if self._collector is None:
+            self._collector = SnapshotCollector(self.layer_manager, self.drawing_app)
+        if self._collector.step(COMPACT_SLICE_MS):
+            self._finish_compact()
+        else:
+            self._compact_timer.start(0)
+
+    def _finish_compact(self):
+        collector = self._collector
+        self.generation += 1
+        self._begin(collector.parts, snapshot_path(self.directory, self.generation))
+        self._ids, self._next_id = collector.ids, collector.next_id
+
+    def _begin(self, parts, snapshot, items=()):
+        self._ids = {}
+        self._next_id = 0
+        self._assign_ids(items)
+        self.journal_bytes = 0
+        self.record_count = 0
+        self._compact_pending = False
+        self._collector = None
+        self._compact_restarts = 0
+        self._compact_timer.stop()
+        start = encode_record({"op": "start", "snapshot": snapshot, "project": self.project_path})
+        self._queue.put(("start", (parts, snapshot, start)))
+
+    def _periodic_compact(self):
+        if self.record_count and not self.paused and not self._compact_pending:
+            self.compact()
+
+    def _assign_ids(self, items):
+        self._next_id = assign_ids(self._ids, items, self._next_id)
+
+    # --- Ghi bản ghi ---
+
+    def _append(self, header: dict, arrays: dict = None):
+        record = encode_record(header, arrays)
+        self.journal_bytes += len(record)
+        self.record_count += 1
+        self._queue.put(("record", record))
+        if self._compact_pending:
+            if self._collector is not None:
+                self._collector = None  # Thiết kế đã đổi: gom lại từ đầu ở lượt sau
+                self._compact_restarts += 1
+        elif self.journal_bytes > self.compact_bytes:
+            self.compact()
+
+    def _item_rows(self, items):
+        """
+        Id và độ lệch của các item đã biết, một hàng cho mỗi id.
+        :return: (ids, chỉ số item của từng hàng, độ lệch (N, 2)).
+        """
+        ids, index, offsets = [], [], []
+        for position, item in enumerate(items):
+            entry = self._ids.get(item)
+            if entry is not None:
+                first, count, dx, dy = entry
+                ids.extend(range(first, first + count))
+                index.extend([position] * count)
+                offsets.extend([(dx, dy)] * count)
+        return (np.array(ids, dtype=np.uint32), np.array(index, dtype=np.intp),
+                np.array(offsets, dtype=np.float64).reshape(-1, 2))
+
+    @staticmethod
+    def _layer_index(item, names):
+        parent = item.parentItem()
+        if not isinstance(parent, LayerItem):
+            return NO_LAYER
+        if parent.name not in names:
+            names.append(parent.name)
+        return names.index(parent.name)
+
+    def record_command(self, command):
+        """
+        Ghi trạng thái sau lệnh của những gì lệnh chạm tới (nối với UndoStack.command_applied).
+        """
+        if self.paused:
+            return
+        if isinstance(command, LayerCommand):
+            self._record_layer_command(command)
+        elif isinstance(command, AddItemsCommand):  # Cả RemoveItemsCommand
+            self.record_items(command.items)
+        elif isinstance(command, MoveItemsCommand):
+            self.record_moves(command.items)
+        elif isinstance(command, PadFieldMoveCommand):
+            self.record_field_pads(command.field, command.rows)
+        elif isinstance(command, PadBulkEdit):
+            self._record_pad_edit(command)
+        elif isinstance(command, LayerPropertyCommand):
+            layer = self.layer_manager.layers.get(command.layer_name)
+            if layer is not None:
+                self._append(layer_state(layer))
+        # SettingCommand đi qua listener của SettingsManager (record_setting)
+
+    def record_items(self, items):
+        """
+        Ghi các item vừa được thêm, đưa lại hoặc gỡ khỏi scene.
+        Item mới được ghi đầy đủ (như một project nhỏ), item đã biết chỉ ghi id.
+        """
+        removed = [item for item in items if item.scene() is None]
+        present = [item for item in items if item.scene() is not None]
+        if removed:
+            ids = self._item_rows(removed)[0]
+            if len(ids):
+                self._append({"op": "remove"}, {"ids": ids})
+        known = [item for item in present if item in self._ids]
+        if known:
+            names = []
+            layers = np.array([self._layer_index(item, names) for item in known], dtype=np.int16)
+            ids, index, _ = self._item_rows(known)
+            self._append({"op": "restore", "layers": names}, {"ids": ids, "layer": layers[index]})
+        new = [item for item in present if item not in self._ids]
+        if new:
+            names, groups = [], {}
+            for item in new:
+                groups.setdefault(self._layer_index(item, names), []).append(item)
+            data = ProjectData()
+            data.layers = [{"name": name} for name in names]
+            created = []
+            collect_items(data, groups.items(), created)
+            if created:
+                self._assign_ids(created)
+                header, arrays = project_blob(data)
+                self._append(dict(header, op="add"), arrays)
+
+    def record_moves(self, items):
+        """
+        Ghi vị trí hiện tại của các item (sau khi kéo, hoàn tác kéo, ...).
+        """
+        ids, index, offsets = self._item_rows(items)
+        if len(ids):
+            self._append({"op": "move"}, {"ids": ids, "pos": item_positions(items)[index] - offsets})
+
+    def record_field_pads(self, field, rows):
+        """
+        Ghi vị trí hiện tại của một số pad trong PadField.
+        """
+        entry = self._ids.get(field)
+        if entry is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            self._append({"op": "field_pads", "id": entry[0]},
+                         {"rows": rows, "pos": field.positions[rows] + entry[2:]})
+
+    def _record_pad_edit(self, edit: PadBulkEdit):
+        # Ghi spec hiện tại của các pad đã sửa; bảng spec dùng chung như trong file project
+        specs, spec_ids = [], {}
+
+        def spec_index(spec):
+            index = spec_ids.get(id(spec))
+            if index is None:
+                index = spec_ids[id(spec)] = len(specs)
+                specs.append(spec)
+            return index
+
+        ids, pad_specs = [], []
+        for _, _, pads in edit.pad_groups:
+            for pad in pads:
+                entry = self._ids.get(pad)
+                if entry is not None:
+                    ids.append(entry[0])
+                    pad_specs.append(spec_index(pad.spec))
+        arrays = {"ids": np.array(ids, dtype=np.uint32), "spec": np.array(pad_specs, dtype=np.uint32)}
+        fields = []
+        for field, rows, _, _ in edit.field_changes:
+            entry = self._ids.get(field)
+            if entry is None:
+                continue
+            used, inverse = np.unique(field.spec_indices[rows], return_inverse=True)
+            table = np.array([spec_index(field.specs[index]) for index in used], dtype=np.uint32)
+            arrays[f"rows{len(fields)}"] = np.asarray(rows, dtype=np.int64)
+            arrays[f"spec{len(fields)}"] = table[inverse]
+            fields.append(entry[0])
+        if specs:
+            self._append({"op": "specs", "specs": [spec.to_data() for spec in specs], "fields": fields}, arrays)
+
+    def _record_layer_command(self, command: LayerCommand):
+        layer = command.layer
+        if self.layer_manager.layers.get(layer.name) is layer:
+            self._append(layer_state(layer))
+            self.record_items(command.items)
+        else:
+            self._append({"op": "remove_layer", "name": layer.name})
+
+    def record_setting(self, category, key, value):
+        """
+        Ghi một cài đặt vừa đổi (listener của SettingsManager).
+        """
+        self._append({"op": "setting", "category": category, "key": key, "value": value})
+
+    # --- Luồng ghi ---
+
+    def flush(self):
+        """
+        Chờ tới khi mọi bản ghi đã gửi được ghi và fsync xuống đĩa.
+        """
+        done = threading.Event()
+        self._queue.put(("sync", done))
+        done.wait()
+
+    def close(self, discard: bool = True):
+        """
+        Dừng luồng ghi. Khi thoát bình thường (discard=True), nhật ký và snapshot tự động bị xóa.
+        """
+        self._timer.stop()
+        self._compact_timer.stop()
+        if self.settings_manager is not None:
+            for category in self.settings_manager.settings:
+                self.settings_manager.remove_listener(category, self.record_setting)
+        if self._writer.is_alive():
+            self._queue.put(("stop", discard))
+            self._writer.join()
+
+    def _write_loop(self):
+        # Luồng nền: ghi hết các bản ghi đang chờ rồi mới fsync một lần (group commit)
+        file = None
+        running = True
+        while running:
+            tasks = [self._queue.get()]
+            while True:
+                try:
+                    tasks.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for kind, payload in tasks:
+                try:
+                    if kind == "record":
+                        if file is not None:
+                            file.write(payload)
+                    elif kind == "start":
+                        file = self._switch_journal(file, *payload)
+                    elif kind == "sync":
+                        if file is not None:
+                            file.flush()
+                            os.fsync(file.fileno())
+                        payload.set()
+                    elif kind == "stop":
+                        running = False
+                        if file is not None:
+                            file.close()
+                            file = None
+                        if payload:
+                            if os.path.exists(self.journal_path):
+                                os.remove(self.journal_path)
+                            remove_snapshots(self.directory)
+                        break
+                except Exception as e:
+                    print(f"Journal Error: {e}")
+            if file is not None:
+                try:
+                    file.flush()
+                    os.fsync(file.fileno())
+                except OSError as e:
+                    print(f"Journal Error: {e}")
+
+    def _switch_journal(self, file, parts, snapshot, start_record):
+        # Snapshot ghi xong (nguyên tử) trước khi nhật ký mới thay nhật ký cũ: dừng ở bất kỳ bước nào
+        # thì nhật ký trên đĩa vẫn trỏ tới một snapshot đầy đủ
+        os.makedirs(self.directory, exist_ok=True)
+        if parts is not None:
+            save_project(snapshot, concat_projects(parts))
+        write_file_atomic(self.journal_path, [JOURNAL_MAGIC, start_record])
+        if file is not None:
+            file.close()
+        file = open(self.journal_path, "ab")
+        remove_snapshots(self.directory, keep=snapshot)
+        return file
+
+
+class JournalReplay:
+    """
+    Phát lại các bản ghi nhật ký lên thiết kế vừa dựng từ snapshot.
+    """
+
+    def __init__(self, layer_manager, drawing_app=None, settings_manager=None, items=()):
+        """
+        :param items: Các item theo thứ tự apply_project đã tạo từ snapshot (id là chỉ số).
+        """
+        self.layer_manager = layer_manager
+        self.drawing_app = drawing_app
+        self.settings_manager = settings_manager
+        self.items = list(items)
+
+    def apply(self, header: dict, arrays: dict):
+        getattr(self, "replay_" + header["op"])(header, arrays)
+
+    def _sync_pads(self, restored=()):
+        # Danh sách pad của DrawingApp theo các Pad đang có trong scene
+        if self.drawing_app is not None:
+            pads = [pad for pad in getattr(self.drawing_app, "pads", []) if pad.scene() is not None]
+            self.drawing_app.pads = pads + [item for item in restored if isinstance(item, Pad)]
+
+    def replay_add(self, header, arrays):
+        add_project_items(project_from_blob(header, arrays), self.layer_manager, self.drawing_app, self.items)
+
+    def replay_restore(self, header, arrays):
+        names = header["layers"]
+        groups = {}
+        for item_id, layer_id in zip(arrays["ids"].tolist(), arrays["layer"].tolist()):
+            item = self.items[item_id]
+            if item.scene() is None:
+                groups.setdefault(layer_id, []).append(item)
+        with bulk_update(self.layer_manager.scene):
+            for layer_id, group in groups.items():
+                if layer_id != NO_LAYER:
+                    self.layer_manager.add_items_to_layer(names[layer_id], group)
+                elif self.drawing_app is not None:
+                    self.drawing_app.add_shapes(group)
+        self._sync_pads([item for group in groups.values() for item in group])
+
+    def replay_remove(self, header, arrays):
+        groups = {}
+        for item_id in arrays["ids"].tolist():
+            item = self.items[item_id]
+            if item.scene() is not None:
+                parent = item.parentItem()
+                groups.setdefault(parent.name if isinstance(parent, LayerItem) else None, []).append(item)
+        with bulk_update(self.layer_manager.scene):
+            for name, group in groups.items():
+                if name is not None:
+                    self.layer_manager.remove_items_from_layer(name, group)
+                elif self.drawing_app is not None:
+                    self.drawing_app.remove_shapes(group)
+        self._sync_pads()
+
+    def replay_move(self, header, arrays):
+        with bulk_update(self.layer_manager.scene):
+            for item_id, (x, y) in zip(arrays["ids"].tolist(), arrays["pos"].tolist()):
+                self.items[item_id].setPos(x, y)
+
+    def replay_field_pads(self, header, arrays):
+        self.items[header["id"]].set_pad_positions(arrays["rows"], arrays["pos"])
+
+    def replay_specs(self, header, arrays):
+        specs = [PadSpec.from_data(spec) for spec in header["specs"]]
+        with bulk_update(self.layer_manager.scene):
+            for item_id, spec in zip(arrays["ids"].tolist(), arrays["spec"].tolist()):
+                self.items[item_id].set_spec(specs[spec])
+            for index, item_id in enumerate(header["fields"]):
+                field = self.items[item_id]
+                table = np.array([field.spec_index(spec) for spec in specs], dtype=field.spec_indices.dtype)
+                field.set_pad_specs(arrays[f"rows{index}"], table[arrays[f"spec{index}"]])
+
+    def replay_layer(self, header, arrays):
+        name = header["name"]
+        if name not in self.layer_manager.layers:
+            self.layer_manager.add_layer(name, QColor(header["color"]), header["z"])
+        else:
+            self.layer_manager.set_layer_color(name, QColor(header["color"]))
+            self.layer_manager.set_layer_z_index(name, header["z"])
+        self.layer_manager.set_layer_opacity(name, header["opacity"])
+
+    def replay_remove_layer(self, header, arrays):
+        if header["name"] in self.layer_manager.layers:
+            self.layer_manager.remove_layer(header["name"])
+            self._sync_pads()
+
+    def replay_setting(self, header, arrays):
+        if self.settings_manager is not None:
+            self.settings_manager.set_setting(header["category"], header["key"], header["value"])
+
+
+def recover_journal(layer_manager, drawing_app=None, settings_manager=None, directory=AUTOSAVE_DIR):
+    """
+    Nếu phiên trước kết thúc bất thường (còn nhật ký), dựng lại thiết kế: áp dụng snapshot rồi phát lại nhật ký.
+    Các thao tác phát lại không được ghi vào lịch sử hoàn tác.
+    :return: (file project của phiên đó hoặc None, số bản ghi đã phát lại), hoặc None nếu không có gì để khôi phục.
+    """
+    path = journal_path(directory)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        buffer = file.read()
+    if not buffer.startswith(JOURNAL_MAGIC):
+        return None
+    records = read_records(buffer)
+    start = next(records, None)
+    if start is None or start[0].get("op") != "start":
+        return None
+    header = start[0]
+    data = load_project(header["snapshot"]) if header["snapshot"] else ProjectData()
+
+    scene = layer_manager.scene
+    stack = undo_stack(scene)
+    set_undo_stack(scene, None)
+    try:
+        items = []
+        apply_project(data, layer_manager, drawing_app, items)
+        replay = JournalReplay(layer_manager, drawing_app, settings_manager, items)
+        count = 0
+        for record in records:
+            replay.apply(*record)
+            count += 1
+    finally:
+        set_undo_stack(scene, stack)
+    return header["project"], count
@@ -1,14 +1,147 @@
-from PyQt5.QtGui import QPen, QColor
-from PyQt5.QtWidgets import QGraphicsScene, QGraphicsItem
+from PyQt5.QtGui import QPen, QBrush, QColor
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtWidgets import (
+    QGraphicsScene, QGraphicsItem, QGraphicsLineItem, QGraphicsRectItem,
+    QGraphicsEllipseItem, QGraphicsPathItem, QStyle
+)
+
+from functools import partial
+
+from scene_batch import bulk_update, add_item, remove_item
+from spatial_index import SpatialIndex
+from undo_stack import recording, record, RemoveItemsCommand, LayerPropertyCommand, LayerCommand
+
+# Tên layer trong settings.json -> tên layer trong LayerManager
+SETTINGS_LAYERS = {
+    "TopPattern": "top_copper",
+    "BottomPattern": "bottom_copper",
+    "TopSilk": "top_mark",
+    "BottomSilk": "bottom_mark",
+    "TopPlacement": "top_paste",
+    "BottomPlacement": "bottom_paste",
+}
+
+
+class LayerItem(QGraphicsItem):
+    """
+    Item cha của một layer. Giữ z-value, hiển thị, độ mờ và bút/cọ dùng chung,
+    nên ẩn, sắp xếp lại hay đổi màu layer chỉ tốn O(1).
+    """
+
+    def __init__(self, name: str, color: QColor, z_index: int = 0):
+        super().__init__()
+        self.name = name
+        self.items = []  # Các đối tượng trong layer, theo thứ tự thêm vào
+        self.index = SpatialIndex()  # Chỉ mục không gian theo tọa độ layer (trùng tọa độ scene)
+        self.color = QColor(color)
+        self.pen = QPen(self.color, 2)
+        self.brush = QBrush(Qt.NoBrush)
+        self.setZValue(z_index)
+        self.setFlag(QGraphicsItem.ItemHasNoContents, True)
+
+    def boundingRect(self):
+        return QRectF()
+
+    def paint(self, painter, option, widget):
+        pass
+
+    def adopt(self, item: QGraphicsItem):
+        """
+        Chuẩn bị item trước khi thêm vào layer: item LayerStyled nhận bút của layer làm bút riêng để
+        boundingRect()/shape() (và chỉ mục) tính theo đúng độ rộng nét được vẽ. Đổi màu layer giữ nguyên
+        độ rộng nên không cần cập nhật lại từng item.
+        """
+        if isinstance(item, LayerStyled):
+            item.setPen(self.pen)
+
+    def item_rect(self, item: QGraphicsItem) -> QRectF:
+        """Hình chữ nhật bao của item theo tọa độ layer"""
+        return item.mapRectToParent(item.boundingRect())
+
+    def item_moved(self, item: QGraphicsItem):
+        """
+        Cập nhật chỉ mục khi item con di chuyển hoặc đổi hình dạng.
+        """
+        if item in self.index:
+            self.index.update(item, self.item_rect(item))
+
+    def set_color(self, color: QColor):
+        """
+        Đổi màu dùng chung; các item LayerStyled đọc bút của layer khi vẽ.
+        Độ rộng bút không đổi nên hình bao của các item (xem adopt) vẫn đúng.
+        """
+        self.color = QColor(color)
+        self.pen = QPen(self.color, self.pen.widthF())
+        if self.scene() is not None:
+            self.scene().update()
+
+
+class LayerStyled:
+    """Mixin: item vẽ bằng bút/cọ của LayerItem cha thay vì bút riêng"""
+
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.ItemPositionHasChanged:
+            layer = self.parentItem()
+            if isinstance(layer, LayerItem):
+                layer.item_moved(self)
+        return super().itemChange(change, value)
+
+    def paint(self, painter, option, widget):
+        layer = self.parentItem()
+        if not isinstance(layer, LayerItem):
+            super().paint(painter, option, widget)
+            return
+        painter.setPen(layer.pen)
+        painter.setBrush(layer.brush)
+        self.paint_shape(painter)
+        if option.state & QStyle.State_Selected:
+            painter.setPen(QPen(Qt.black, 0, Qt.DashLine))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(self.boundingRect())
+
+    def paint_shape(self, painter):
+        """Vẽ hình của item bằng bút/cọ đã đặt sẵn; lớp con ghi đè, mặc định không vẽ gì"""
+
+
+class LayerLineItem(LayerStyled, QGraphicsLineItem):
+    def paint_shape(self, painter):
+        painter.drawLine(self.line())
+
+
+class LayerRectItem(LayerStyled, QGraphicsRectItem):
+    def paint_shape(self, painter):
+        painter.drawRect(self.rect())
+
+
+class LayerEllipseItem(LayerStyled, QGraphicsEllipseItem):
+    def paint_shape(self, painter):
+        painter.drawEllipse(self.rect())
+
+
+class LayerPathItem(LayerStyled, QGraphicsPathItem):
+    def paint_shape(self, painter):
+        painter.drawPath(self.path())
+
+
+class LayerRegionItem(LayerStyled, QGraphicsPathItem):
+    """Vùng tô kín (ví dụ vùng G36/G37 của Gerber): tô bằng màu của layer, viền mảnh không đổi theo zoom"""
+
+    def paint_shape(self, painter):
+        color = self.parentItem().color
+        painter.setPen(QPen(color, 0))
+        painter.setBrush(color)
+        painter.drawPath(self.path())
+
 
 class LayerManager:
     def __init__(self, scene: QGraphicsScene):
         """
-        Quản lý các layer trong cảnh vẽ.
+        Quản lý các layer trong cảnh vẽ. Mỗi layer là một LayerItem trong scene,
+        các đối tượng của layer là item con của nó.
         :param scene: QGraphicsScene nơi các layer sẽ được quản lý.
         """
         self.scene = scene
-        self.layers = {}  # Dictionary để lưu các layer theo tên
+        self.layers = {}  # Dictionary để lưu các LayerItem theo tên
         # Thêm các layer mặc định
         self.add_layer("top_copper", QColor(240, 240, 240), z_index=-3)
         self.add_layer("bottom_copper", QColor(0, 0, 255), z_index=-2)
@@ -17,6 +150,11 @@ class LayerManager:
         self.add_layer("top_paste", QColor(255, 255, 0), z_index=1)
         self.add_layer("bottom_paste", QColor(255, 165, 0), z_index=2)
 
+    def _layer(self, layer_name: str) -> LayerItem:
+        if layer_name not in self.layers:
+            raise ValueError(f"Layer '{layer_name}' không tồn tại.")
+        return self.layers[layer_name]
+
     def add_layer(self, layer_name: str, color: QColor = QColor(0, 0, 0), z_index: int = 0):
         """
         Thêm một layer mới vào cảnh.
@@ -28,25 +166,46 @@ class LayerManager:
             raise ValueError(f"Layer '{layer_name}' đã tồn tại.")
 
         # Tạo một layer mới
-        layer = {
-            "items": [],  # Danh sách các đối tượng trong layer
-            "color": color,
-            "z_index": z_index
-        }
+        layer = LayerItem(layer_name, color, z_index)
         self.layers[layer_name] = layer
+        self.scene.addItem(layer)
+        if recording(self.scene):
+            record(self.scene, LayerCommand(self, layer, [], removed=False))
+        return layer
 
     def remove_layer(self, layer_name: str):
         """
         Xóa một layer khỏi cảnh.
         :param layer_name: Tên của layer cần xóa.
         """
-        if layer_name not in self.layers:
-            raise ValueError(f"Layer '{layer_name}' không tồn tại.")
+        layer = self._layer(layer_name)
+        items = list(layer.items)
+        self.detach_layer(layer)
+        if recording(self.scene):
+            record(self.scene, LayerCommand(self, layer, items, removed=True))
 
-        # Xóa tất cả các đối tượng trong layer khỏi scene
-        for item in self.layers[layer_name]["items"]:
-            self.scene.removeItem(item)
-        del self.layers[layer_name]
+    def attach_layer(self, layer: LayerItem, items=()):
+        """
+        Đưa lại một LayerItem đã gỡ (hoàn tác xóa layer) cùng các đối tượng của nó.
+        """
+        if layer.name in self.layers:
+            raise ValueError(f"Layer '{layer.name}' đã tồn tại.")
+        self.layers[layer.name] = layer
+        with bulk_update(self.scene) as batch:
+            batch.add_item(layer)
+            self.add_items_to_layer(layer.name, items)
+
+    def detach_layer(self, layer: LayerItem):
+        """
+        Gỡ một layer và các đối tượng của nó khỏi scene; LayerItem vẫn dùng lại được.
+        """
+        # Xóa tất cả các đối tượng trong layer khỏi scene trong một lần cập nhật
+        with bulk_update(self.scene) as batch:
+            batch.remove_items(layer.items)
+            batch.remove_item(layer)
+        layer.items = []
+        layer.index.clear()
+        del self.layers[layer.name]
 
     def add_item_to_layer(self, layer_name: str, item: QGraphicsItem):
         """
@@ -54,37 +213,154 @@ class LayerManager:
         :param layer_name: Tên của layer.
         :param item: Đối tượng QGraphicsItem cần thêm.
         """
-        if layer_name not in self.layers:
-            raise ValueError(f"Layer '{layer_name}' không tồn tại.")
+        layer = self._layer(layer_name)
+
+        # Thêm đối tượng vào layer; z-value, hiển thị và độ mờ lấy từ layer cha
+        layer.adopt(item)
+        layer.items.append(item)
+        layer.index.insert(item, layer.item_rect(item))
+        item.setFlag(QGraphicsItem.ItemSendsGeometryChanges, True)  # Báo di chuyển cho chỉ mục
+        add_item(self.scene, item, layer)  # Đi qua bulk_update nếu đang mở
+
+    def remove_item_from_layer(self, layer_name: str, item: QGraphicsItem):
+        """
+        Xóa một đối tượng khỏi layer và khỏi scene.
+        :param layer_name: Tên của layer.
+        :param item: Đối tượng cần xóa.
+        """
+        layer = self._layer(layer_name)
+        if item not in layer.index:
+            raise ValueError(f"Đối tượng không thuộc layer '{layer_name}'.")
+        layer.index.remove(item)
+        layer.items.remove(item)
+        remove_item(self.scene, item)
 
-        # Thêm đối tượng vào layer và scene
-        self.layers[layer_name]["items"].append(item)
-        item.setZValue(self.layers[layer_name]["z_index"])  # Đặt z-index cho đối tượng
-        self.scene.addItem(item)
+    def add_items_to_layer(self, layer_name: str, items):
+        """
+        Thêm nhiều đối tượng vào layer trong một lần cập nhật scene (đặt nhiều pad, dán, hoàn tác).
+        :param layer_name: Tên của layer.
+        :param items: Các đối tượng QGraphicsItem cần thêm.
+        """
+        layer = self._layer(layer_name)
+        items = list(items)
+        with bulk_update(self.scene) as batch:
+            for item in items:
+                layer.adopt(item)
+                layer.index.insert(item, layer.item_rect(item))
+                item.setFlag(QGraphicsItem.ItemSendsGeometryChanges, True)
+            layer.items.extend(items)
+            batch.add_items(items, layer)
+
+    def remove_items_from_layer(self, layer_name: str, items):
+        """
+        Xóa nhiều đối tượng khỏi layer và khỏi scene trong một lần cập nhật.
+        :param layer_name: Tên của layer.
+        :param items: Các đối tượng cần xóa.
+        """
+        layer = self._layer(layer_name)
+        items = list(items)
+        if any(item not in layer.index for item in items):
+            raise ValueError(f"Đối tượng không thuộc layer '{layer_name}'.")
+        for item in items:
+            layer.index.remove(item)
+        removed = set(items)
+        layer.items = [item for item in layer.items if item not in removed]  # Một lượt thay vì list.remove O(n) mỗi item
+        with bulk_update(self.scene) as batch:
+            batch.remove_items(items)
+
+    def update_item(self, layer_name: str, item: QGraphicsItem):
+        """
+        Đồng bộ chỉ mục sau khi đổi hình dạng một đối tượng (ví dụ setLine, setRect).
+        :param layer_name: Tên của layer.
+        :param item: Đối tượng đã thay đổi.
+        """
+        self._layer(layer_name).item_moved(item)
+
+    def items_in_rect(self, layer_name: str, rect: QRectF):
+        """
+        Các đối tượng trên layer giao với hình chữ nhật (tọa độ scene).
+        """
+        return self._layer(layer_name).index.query_rect(rect)
+
+    def items_in_radius(self, layer_name: str, point, radius: float):
+        """
+        Các đối tượng trên layer cách điểm không quá radius, từ gần đến xa.
+        """
+        return self._layer(layer_name).index.query_radius(point, radius)
+
+    def nearest_items(self, layer_name: str, point, k: int = 1, max_distance: float = None):
+        """
+        Tối đa k đối tượng gần điểm nhất trên layer, từ gần đến xa.
+        """
+        return self._layer(layer_name).index.nearest(point, k, max_distance)
 
     def clear_layer(self, layer_name: str):
         """
         Xóa tất cả các đối tượng trong một layer.
         :param layer_name: Tên của layer cần xóa.
         """
-        if layer_name not in self.layers:
-            raise ValueError(f"Layer '{layer_name}' không tồn tại.")
+        layer = self._layer(layer_name)
+        items = layer.items
 
-        for item in self.layers[layer_name]["items"]:
-            self.scene.removeItem(item)
-        self.layers[layer_name]["items"].clear()
+        with bulk_update(self.scene) as batch:
+            batch.remove_items(items)
+        layer.items = []
+        layer.index.clear()
+        if recording(self.scene) and items:
+            record(self.scene, RemoveItemsCommand(
+                self.scene, items, partial(self.add_items_to_layer, layer_name),
+                partial(self.remove_items_from_layer, layer_name), f"Clear layer {layer_name}"))
 
     def set_layer_color(self, layer_name: str, color: QColor):
         """
-        Đặt màu cho tất cả các đối tượng trong layer.
+        Đặt màu cho layer. Các item LayerStyled dùng bút của layer nên không cần duyệt từng item.
         :param layer_name: Tên của layer.
         :param color: Màu mới.
         """
-        if layer_name not in self.layers:
-            raise ValueError(f"Layer '{layer_name}' không tồn tại.")
+        layer = self._layer(layer_name)
+        old = QColor(layer.color)
+        layer.set_color(color)
+        if recording(self.scene) and old != layer.color:
+            record(self.scene, LayerPropertyCommand(self, layer_name, "set_layer_color", old, QColor(layer.color)))
+
+    def set_layer_visible(self, layer_name: str, visible: bool):
+        """
+        Ẩn/hiện một layer. Không ghi lịch sử hoàn tác ở đây: hiển thị layer là một cài đặt,
+        giao diện hoàn tác nó qua SettingCommand (listener của cài đặt gọi lại hàm này).
+        :param layer_name: Tên của layer.
+        :param visible: True để hiển thị.
+        """
+        self._layer(layer_name).setVisible(visible)
+
+    def set_layer_opacity(self, layer_name: str, opacity: float):
+        """
+        Đặt độ mờ cho một layer.
+        :param layer_name: Tên của layer.
+        :param opacity: Độ mờ từ 0.0 đến 1.0.
+        """
+        layer = self._layer(layer_name)
+        old = layer.opacity()
+        layer.setOpacity(opacity)
+        if recording(self.scene) and old != layer.opacity():
+            record(self.scene, LayerPropertyCommand(self, layer_name, "set_layer_opacity", old, layer.opacity()))
 
-        for item in self.layers[layer_name]["items"]:
-            if isinstance(item, QGraphicsItem):
-                pen = QPen(color)
-                item.setPen(pen)
-        self.layers[layer_name]["color"] = color
\ No newline at end of file
+    def set_layer_z_index(self, layer_name: str, z_index: int):
+        """
+        Đổi thứ tự hiển thị của một layer.
+        :param layer_name: Tên của layer.
+        :param z_index: Thứ tự hiển thị mới.
+        """
+        layer = self._layer(layer_name)
+        old = layer.zValue()
+        layer.setZValue(z_index)
+        if recording(self.scene) and old != layer.zValue():
+            record(self.scene, LayerPropertyCommand(self, layer_name, "set_layer_z_index", old, layer.zValue()))
+
+    def apply_settings(self, settings_manager):
+        """
+        Áp dụng hiển thị layer từ mục "layers" trong settings.json.
+        :param settings_manager: SettingsManager của ứng dụng.
+        """
+        for setting_name, layer_name in SETTINGS_LAYERS.items():
+            if layer_name in self.layers:
+                self.set_layer_visible(layer_name, settings_manager.get_setting("layers", setting_name, True))
@@ -1,15 +1,27 @@
 import  traceback
+import time
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QDockWidget, QTreeWidget, QTreeWidgetItem,
     QWidget, QGridLayout, QLabel, QLineEdit, QComboBox, QTabWidget,
-    QGraphicsScene, QListWidget, QToolBar, QAction, QMessageBox, QDialog
+    QGraphicsScene, QListWidget, QListWidgetItem, QToolBar, QAction, QMessageBox, QDialog, QFileDialog
 )
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QPen, QColor
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QKeySequence
 
 from drawing import DrawingApp
 from pad_editor import PadEditor
 from pad import Pad
+from pad_spec import PadSpec
+from layer_manager import LayerManager, SETTINGS_LAYERS
+from setting_manager import SettingsManager
+from snapping import SnapEngine, set_snap_engine
+from undo_stack import UndoStack, set_undo_stack, push, AddItemsCommand, SettingCommand
+from project_file import PROJECT_FILTER, ProjectData, collect_project, save_project, apply_project
+from journal import ProjectJournal, recover_journal
+from progressive_load import ProgressiveLoader
+from gerber_import import GERBER_FILTER, GerberImporter
+
+PAD_EDITOR_PREWARM_MS = 300  # Dựng sẵn Pad Editor sau khi cửa sổ chính đã hiện và vẽ xong
 
 class main_app(QMainWindow):
     def __init__(self):
@@ -17,8 +29,18 @@ class main_app(QMainWindow):
             super().__init__()
             self.setWindowTitle('PCB Design Studio')
             self.setGeometry(100, 100, 1200, 800)
+            self.settings_manager = SettingsManager()  # Đọc settings.json
             self.drawing_app = DrawingApp()  # Create an instance of DrawingApp
+            self._pad_editor = None  # Một PadEditor dùng lại cho mọi lần mở, xem pad_editor()
+            self.project_path = None  # File project đang mở (None: chưa lưu)
+            self.undo_stack = UndoStack(parent=self)  # Lịch sử hoàn tác của thiết kế
+            self.journal = None  # Nhật ký tự động lưu, xem start_autosave()
+            self.loader = None  # ProgressiveLoader của file đang mở dở
+            self._load_message = None  # Dòng tiến độ trong bảng Messages
+            self.apply_undo_settings()
             self.init_ui()  # Call init_ui method
+            self.start_autosave()
+            QTimer.singleShot(PAD_EDITOR_PREWARM_MS, self.prewarm_pad_editor)
         except Exception as e:
             # Fallback error handling
             print(f"Initialization Error: {e}")
@@ -50,16 +72,29 @@ class main_app(QMainWindow):
         new_project_action = QAction('New Project', self)
         open_project_action = QAction('Open Project', self)
         save_action = QAction('Save', self)
+        import_gerber_action = QAction('Import Gerber', self)
+        new_project_action.triggered.connect(self.new_project)
+        open_project_action.triggered.connect(self.open_project)
+        save_action.triggered.connect(self.save_current_project)
+        import_gerber_action.triggered.connect(self.import_gerber)
         file_menu.addAction(new_project_action)
         file_menu.addAction(open_project_action)
         file_menu.addAction(save_action)
+        file_menu.addSeparator()
+        file_menu.addAction(import_gerber_action)
 
         # Edit Menu
         edit_menu = self.menubar.addMenu('Edit')
-        undo_action = QAction('Undo', self)
-        redo_action = QAction('Redo', self)
-        edit_menu.addAction(undo_action)
-        edit_menu.addAction(redo_action)
+        self.undo_action = QAction('Undo', self)
+        self.undo_action.setShortcut(QKeySequence.Undo)
+        self.undo_action.triggered.connect(self.undo_stack.undo)
+        self.redo_action = QAction('Redo', self)
+        self.redo_action.setShortcut(QKeySequence.Redo)
+        self.redo_action.triggered.connect(self.undo_stack.redo)
+        edit_menu.addAction(self.undo_action)
+        edit_menu.addAction(self.redo_action)
+        self.undo_stack.changed.connect(self.update_undo_actions)
+        self.update_undo_actions()
 
         # Design Menu
         design_menu = self.menubar.addMenu('Design')
@@ -67,12 +102,27 @@ class main_app(QMainWindow):
         layer_manager_action = QAction('Layer Manager', self)
         design_menu.addAction(create_footprint_action)
         design_menu.addAction(layer_manager_action)
+
+        # Hiển thị layer theo mục "layers" của settings.json
+        layers_menu = design_menu.addMenu('Layers')
+        self.layer_actions = {}
+        for setting_name in SETTINGS_LAYERS:
+            layer_action = QAction(setting_name, self, checkable=True)
+            layer_action.setChecked(self.settings_manager.get_setting("layers", setting_name, True))
+            layer_action.toggled.connect(
+                lambda checked, name=setting_name: self.set_settings_layer_visible(name, checked))
+            layers_menu.addAction(layer_action)
+            self.layer_actions[setting_name] = layer_action
     # Design tootbar
     def create_toolbar(self):
         toolbar = QToolBar('Design Tools')
         self.addToolBar(toolbar)
 
         # Drawing tools
+        select_action = QAction('Select', self)
+        select_action.triggered.connect(lambda: self.set_drawing_mode(None))
+        toolbar.addAction(select_action)
+
         draw_line_action = QAction('Draw Line', self)
         draw_line_action.triggered.connect(lambda: self.set_drawing_mode("line"))
         toolbar.addAction(draw_line_action)
@@ -85,6 +135,10 @@ class main_app(QMainWindow):
         draw_circle_action.triggered.connect(lambda: self.set_drawing_mode("circle"))
         toolbar.addAction(draw_circle_action)
 
+        draw_trace_action = QAction('Draw Trace', self)
+        draw_trace_action.triggered.connect(lambda: self.set_drawing_mode("trace"))
+        toolbar.addAction(draw_trace_action)
+
         color_action = QAction('Choose Color', self)
         color_action.triggered.connect(self.choose_drawing_color)
         toolbar.addAction(color_action)
@@ -94,6 +148,10 @@ class main_app(QMainWindow):
         pad_editor_action.triggered.connect(self.show_pad_editor)
         toolbar.addAction(pad_editor_action)
 
+        edit_pads_action = QAction('Edit Selected Pads', self)
+        edit_pads_action.triggered.connect(self.edit_selected_pads)
+        toolbar.addAction(edit_pads_action)
+
     def set_drawing_mode(self, mode):
         print(f"Setting drawing mode to: {mode}")  # Debug print
         if hasattr(self, 'drawing_app'):
@@ -112,18 +170,210 @@ class main_app(QMainWindow):
         scene.setSceneRect(0, 0, 2000, 2000)
         self.drawing_app.scene = scene
         self.drawing_app.drawing_window.setScene(scene)
+        self.layer_manager = LayerManager(scene)
+        self.layer_manager.apply_settings(self.settings_manager)
+        set_undo_stack(scene, self.undo_stack)  # Thêm/xóa/kéo item, vẽ hình và thao tác layer ghi vào lịch sử
 
-        self.add_grid(scene)
+        self.apply_grid_settings()
+        self.apply_rendering_settings()
+        # Phản ứng theo giá trị đã cache khi cài đặt thay đổi, không đọc lại settings.json
+        self.settings_manager.add_listener("layers", self.on_layer_setting_changed)
+        self.settings_manager.add_listener("objects", lambda category, key, value: self.apply_grid_settings())
+        self.settings_manager.add_listener("objects", lambda category, key, value: self.apply_undo_settings(),
+                                           key="undo_memory_mb")
+        self.settings_manager.add_listener("rendering", lambda category, key, value: self.apply_rendering_settings())
         self.canvas_widget.addTab(self.drawing_app.drawing_window, 'PCB Design')
         self.setCentralWidget(self.canvas_widget)
 
-    def add_grid(self, scene):
-        grid_color = QColor(240, 240, 240)
-        grid_spacing = 10
-        for x in range(0, 2000, grid_spacing):
-            scene.addLine(x, 0, x, 2000, QPen(grid_color))
-        for y in range(0, 2000, grid_spacing):
-            scene.addLine(0, y, 2000, y, QPen(grid_color))
+    def apply_grid_settings(self):
+        # Lưới được vẽ bởi ZoomableGraphicsView.drawBackground, scene không chứa item lưới nào
+        show_grid = self.settings_manager.get_setting("objects", "show_grid", True)
+        self.drawing_app.drawing_window.set_grid_visible(show_grid)
+        # Bắt lưới theo khoảng cách lưới của view, bắt tâm pad/đầu mút đường trong bán kính màn hình
+        engine = SnapEngine(
+            self.drawing_app.drawing_window.grid_spacing,
+            self.settings_manager.get_setting("objects", "snap_to_grid", True),
+            self.settings_manager.get_setting("objects", "object_snap", True),
+            self.settings_manager.get_setting("objects", "snap_radius_px", 8),
+            self.layer_manager, self.drawing_app.shape_index)
+        set_snap_engine(self.drawing_app.scene, engine)
+
+    def apply_undo_settings(self):
+        # Giới hạn bộ nhớ của lịch sử hoàn tác (MB); các bước cũ nhất bị bỏ khi vượt
+        memory_mb = self.settings_manager.get_setting("objects", "undo_memory_mb", 64)
+        self.undo_stack.set_memory_limit(memory_mb * 1024 * 1024)
+
+    def update_undo_actions(self):
+        # Bật/tắt Undo/Redo và ghi tên bước sẽ hoàn tác lên menu
+        self.undo_action.setEnabled(self.undo_stack.can_undo())
+        self.undo_action.setText(f"Undo {self.undo_stack.undo_text()}".strip())
+        self.redo_action.setEnabled(self.undo_stack.can_redo())
+        self.redo_action.setText(f"Redo {self.undo_stack.redo_text()}".strip())
+
+    def apply_rendering_settings(self):
+        # Ngưỡng level-of-detail khi vẽ pad
+        Pad.set_lod_thresholds(
+            self.settings_manager.get_setting("rendering", "pad_lod_full_detail", Pad.lod_full_detail),
+            self.settings_manager.get_setting("rendering", "pad_lod_outline", Pad.lod_outline))
+        # Vẽ nháp khi zoom/pan/kéo vượt ngân sách khung hình
+        view = self.drawing_app.drawing_window
+        view.set_adaptive_quality(
+            self.settings_manager.get_setting("rendering", "adaptive_quality", True),
+            self.settings_manager.get_setting("rendering", "frame_budget_ms", view.frame_budget_ms))
+
+    def set_settings_layer_visible(self, setting_name, visible):
+        # Lưu vào cài đặt (ghi settings.json ở luồng nền); on_layer_setting_changed ẩn/hiện layer.
+        # Đi qua lịch sử hoàn tác: Undo đặt lại cài đặt, listener đồng bộ layer và menu
+        old = self.settings_manager.get_setting("layers", setting_name, True)
+        if old == visible:
+            return
+        text = f"{'Show' if visible else 'Hide'} {setting_name}"
+        self.undo_stack.push(SettingCommand(self.settings_manager, "layers", setting_name, old, visible, text))
+
+    def on_layer_setting_changed(self, category, setting_name, visible):
+        # Ẩn/hiện ngay LayerItem tương ứng và đồng bộ menu Layers
+        if setting_name in SETTINGS_LAYERS:
+            self.layer_manager.set_layer_visible(SETTINGS_LAYERS[setting_name], visible)
+        if setting_name in getattr(self, 'layer_actions', {}):
+            self.layer_actions[setting_name].setChecked(visible)
+
+    def start_autosave(self):
+        # Khôi phục phiên trước nếu nó kết thúc bất thường (còn nhật ký), rồi ghi nhật ký cho phiên này
+        recovered = None
+        try:
+            recovered = recover_journal(self.layer_manager, self.drawing_app, self.settings_manager)
+        except Exception as e:
+            self.show_error_message("Recovery Error", f"Error recovering unsaved edits: {str(e)}")
+        self.journal = ProjectJournal(self.layer_manager, self.drawing_app, self.settings_manager, parent=self)
+        self.undo_stack.command_applied.connect(self.journal.record_command)
+        if recovered is not None:
+            self.project_path, count = recovered
+            self.undo_stack.clear()
+            self.display_message(f"Recovered {count} unsaved edits")
+        self.journal.project_path = self.project_path
+        self.journal.compact()
+
+    def new_project(self):
+        # Một project rỗng: xóa mọi đối tượng, giữ các layer
+        try:
+            self.cancel_project_load()
+            apply_project(ProjectData(), self.layer_manager, self.drawing_app)
+            self.undo_stack.clear()
+            self.project_path = None
+            self.journal.project_path = None
+            self.journal.compact()
+            self.display_message("New project")
+        except Exception as e:
+            self.show_error_message("New Project Error", f"Error creating project: {str(e)}")
+
+    def open_project(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open Project", "", PROJECT_FILTER)
+        if not path:
+            return
+        self.cancel_project_load()
+        # Vùng đang xem được dựng trước, phần còn lại theo từng lô; cửa sổ vẫn dùng được trong khi nạp
+        start = time.perf_counter()
+        self.loader = ProgressiveLoader(self.layer_manager, self.drawing_app, self.drawing_app.drawing_window,
+                                        parent=self)
+        self.loader.progress.connect(lambda loaded, total: self._load_message.setText(
+            f"Opening {path}: {loaded}/{total} objects ({loaded * 100 // max(total, 1)}%)"))
+        self.loader.visible_loaded.connect(lambda: self.display_message(
+            f"Visible region of {path} ready in {(time.perf_counter() - start) * 1000:.0f} ms"))
+        self.loader.finished.connect(lambda count: self.finish_project_load(path, count, start))
+        self.loader.failed.connect(lambda error: self.finish_project_load(path, None, start, error))
+        self.loader.design_cleared.connect(self.forget_project)
+        # Lệnh trong lúc nạp không được ghi (id item chưa ổn định). File project và nhật ký chỉ đổi khi nạp xong:
+        # file lỗi thì project trước vẫn nguyên
+        self.journal.paused = True
+        self._load_message = QListWidgetItem(f"Opening {path}...")
+        self.message_list.addItem(self._load_message)
+        self.message_list.scrollToBottom()
+        self.loader.load(path)
+
+    def forget_project(self):
+        # Thiết kế trước vừa bị xóa để dựng file đang mở: lịch sử hoàn tác và file project của nó không còn đúng
+        self.undo_stack.clear()
+        self.project_path = None
+        self.journal.project_path = None
+
+    def finish_project_load(self, path, count, start, error=None):
+        # Nạp xong (hoặc lỗi): cập nhật dòng tiến độ và chụp thiết kế làm snapshot của nhật ký
+        self.loader = None
+        self.journal.paused = False
+        if error is None:
+            self.undo_stack.clear()
+            self.project_path = path
+            self.journal.project_path = path
+        # Cả khi lỗi: các lệnh trong lúc nạp không được ghi vào nhật ký
+        self.journal.compact()
+        if error is not None:
+            self._load_message.setText(f"Opening {path} failed")
+            self.show_error_message("Open Project Error", f"Error opening project: {error}")
+        else:
+            self._load_message.setText(
+                f"Opened {path}: {count} objects in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def cancel_project_load(self):
+        # Dừng nạp file đang mở dở (mở file khác, project mới)
+        if self.loader is not None:
+            self.loader.cancel()
+            self.loader = None
+            self.journal.paused = False
+            self._load_message.setText(f"{self._load_message.text()} (cancelled)")
+
+    def save_current_project(self):
+        if self.loader is not None:
+            self.display_message("Wait until the project has finished loading before saving")
+            return
+        path = self.project_path
+        if path is None:
+            path, _ = QFileDialog.getSaveFileName(self, "Save Project", "untitled.pcbp", PROJECT_FILTER)
+            if not path:
+                return
+        try:
+            items = []
+            data = collect_project(self.layer_manager, self.drawing_app, items)
+            save_project(path, data)
+            self.project_path = path
+            self.journal.start(path, items)  # File vừa lưu là snapshot của nhật ký mới
+            self.display_message(f"Saved {path}: {len(data)} objects")
+        except Exception as e:
+            self.show_error_message("Save Project Error", f"Error saving project: {str(e)}")
+
+    def import_gerber(self):
+        if self.loader is not None:
+            self.display_message("Wait until the project has finished loading before importing")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Import Gerber", "", GERBER_FILTER)
+        if not path:
+            return
+        # Layer đích đoán theo .FileFunction hoặc tên file; cả lần nhập là một bước hoàn tác
+        importer = GerberImporter(self.layer_manager)
+        start = time.perf_counter()
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            importer.import_file(path)
+        except Exception as e:
+            QApplication.restoreOverrideCursor()
+            message = f"Error importing Gerber file: {str(e)}"
+            if importer.items:
+                message += "\nThe objects imported before the error were kept; use Edit > Undo to remove them."
+            self.show_error_message("Import Gerber Error", message)
+            return
+        QApplication.restoreOverrideCursor()
+        message = (f"Imported {path} into {importer.layer_name}: {importer.flashes} pads, {importer.strokes} traces, "
+                   f"{importer.regions} regions in {(time.perf_counter() - start) * 1000:.0f} ms")
+        if importer.skipped:
+            message += f" ({importer.skipped} unsupported or clear-polarity objects skipped)"
+        self.display_message(message)
+
+    def closeEvent(self, event):
+        # Ghi các cài đặt còn chờ trước khi thoát; thoát bình thường thì bỏ nhật ký tự động lưu
+        self.cancel_project_load()
+        if self.journal is not None:
+            self.journal.close()
+        self.settings_manager.close()
+        super().closeEvent(event)
 
     def create_left_sidebar(self):
         dock = QDockWidget('Component Library', self)
@@ -163,14 +413,20 @@ class main_app(QMainWindow):
     def create_bottom_panel(self):
         dock = QDockWidget('Messages', self)
         dock.setAllowedAreas(Qt.BottomDockWidgetArea)
-        message_list = QListWidget()
-        message_list.addItems([
+        self.message_list = QListWidget()
+        self.message_list.addItems([
             'Welcome to PCB Design Studio',
             'Ready to start designing'
         ])
-        dock.setWidget(message_list)
+        dock.setWidget(self.message_list)
         self.addDockWidget(Qt.BottomDockWidgetArea, dock)
 
+    def display_message(self, message):
+        # Thêm một dòng vào bảng Messages
+        if hasattr(self, 'message_list'):
+            self.message_list.addItem(message)
+            self.message_list.scrollToBottom()
+
     def show_error_message(self, title, message):
         error_dialog = QMessageBox()
         error_dialog.setIcon(QMessageBox.Critical)
@@ -179,11 +435,25 @@ class main_app(QMainWindow):
         error_dialog.setDetailedText(traceback.format_exc())
         error_dialog.exec_()
 
+    def pad_editor(self):
+        # Tạo Pad Editor ở lần dùng đầu tiên, sau đó dùng lại (không dựng lại widget, scene, tín hiệu)
+        if self._pad_editor is None:
+            self._pad_editor = PadEditor(self)
+            self._pad_editor.setWindowModality(Qt.ApplicationModal)
+        return self._pad_editor
+
+    def prewarm_pad_editor(self):
+        # Chạy khi ứng dụng rảnh sau khởi động: lần mở Pad Editor đầu tiên không phải chờ dựng hộp thoại
+        try:
+            self.pad_editor().prewarm()
+        except Exception as e:
+            print(f"Pad Editor prewarm error: {e}\n{traceback.format_exc()}")
+
     def show_pad_editor(self):
         # Open the pad editor dialog
         try:
-            pad_editor = PadEditor(self)
-            pad_editor.setWindowModality(Qt.ApplicationModal)
+            pad_editor = self.pad_editor()
+            pad_editor.reset()
 
             # Use a safe approach to show the dialog
             if pad_editor.exec_() == QDialog.Accepted and pad_editor.current_pad:
@@ -193,24 +463,46 @@ class main_app(QMainWindow):
             print(f"Error in pad editor: {str(e)}\n{traceback_str}")
             self.show_error_message("Pad Editor Error", f"Error in pad editor: {str(e)}")
 
+    def edit_selected_pads(self):
+        # Sửa hàng loạt mọi pad đang được chọn bằng Pad Editor
+        try:
+            pad_editor = self.pad_editor()
+            pad_editor.reset()
+            edit = pad_editor.edit_selected_pad(self.drawing_app.scene)
+            if edit is not None:
+                self.display_message(f"Updated {len(edit)} pads")
+        except Exception as e:
+            traceback_str = traceback.format_exc()
+            print(f"Error in pad editor: {str(e)}\n{traceback_str}")
+            self.show_error_message("Pad Editor Error", f"Error in pad editor: {str(e)}")
+
     def add_pad_to_design(self, pad_data):
         # Add a pad to the PCB design
         try:
-            pad = Pad(pad_data)
+            pad = Pad(PadSpec.from_data(pad_data))
             # Position the pad at the center of the view
             view_center = self.drawing_app.drawing_window.mapToScene(
                 self.drawing_app.drawing_window.viewport().rect().center())
             pad.setPos(view_center)
 
-            # Add to scene
-            self.drawing_app.scene.addItem(pad)
-
-            # Store in appropriate layer
-            if not hasattr(self.drawing_app, 'pads'):
-                self.drawing_app.pads = []
-            self.drawing_app.pads.append(pad)
+            # Add to the top copper layer as one undo step
+            scene = self.drawing_app.scene
+            push(scene, AddItemsCommand(scene, [pad], self.attach_pads, self.detach_pads, "Add pad"))
 
             # Select the pad so the user can move it
             pad.setSelected(True)
         except Exception as e:
-            self.show_error_message("Pad Creation Error", f"Error creating pad: {str(e)}")
\ No newline at end of file
+            self.show_error_message("Pad Creation Error", f"Error creating pad: {str(e)}")
+
+    def attach_pads(self, pads):
+        # Thêm pad vào layer top_copper (một lần cập nhật scene) và vào danh sách pad của thiết kế
+        self.layer_manager.add_items_to_layer("top_copper", pads)
+        if not hasattr(self.drawing_app, 'pads'):
+            self.drawing_app.pads = []
+        self.drawing_app.pads.extend(pads)
+
+    def detach_pads(self, pads):
+        # Gỡ pad khỏi layer và khỏi danh sách pad (hoàn tác đặt pad)
+        self.layer_manager.remove_items_from_layer("top_copper", pads)
+        removed = set(pads)
+        self.drawing_app.pads = [pad for pad in getattr(self.drawing_app, 'pads', []) if pad not in removed]
\ No newline at end of file
@@ -1,36 +1,28 @@
 # modules/pad_item.py
 
-import json
 import traceback
-from PyQt5.QtWidgets import QGraphicsItem, QMessageBox
-from PyQt5.QtGui import QPen, QBrush, QColor
-from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtWidgets import QGraphicsItem, QMessageBox, QStyleOptionGraphicsItem
+from PyQt5.QtCore import Qt
+
+from pad_spec import PadSpec
+from layer_manager import LayerItem
+from snapping import snap_engine
+from pad_geometry import (
+    pad_geometry, PAD_PEN, PAD_BRUSH, PAD_BRUSH_INACTIVE, HOLE_PEN, HOLE_BRUSH, SELECTION_PEN
+)
 
 
 class Pad(QGraphicsItem):
-    def __init__(self, pad_data, parent=None):
+    # Ngưỡng level-of-detail (tỉ lệ scene -> thiết bị), xem rendering trong settings.json
+    lod_full_detail = 0.5  # Từ mức này trở lên: vẽ đầy đủ lỗ, nan nhiệt và khung chọn
+    lod_outline = 0.2  # Từ mức này đến lod_full_detail: chỉ vẽ hình pad
+    draft_mode = False  # Do view bật khi đang zoom/pan/kéo và vượt ngân sách khung hình: bỏ chi tiết mịn
+
+    def __init__(self, spec, parent=None):
         super().__init__(parent)
-        self.pad_data = json.loads(json.dumps(pad_data))  # deep copy tránh lỗi
-
-        # Gán giá trị mặc định
-        if 'width' not in self.pad_data or not isinstance(self.pad_data['width'], (int, float)):
-            self.pad_data['width'] = 1.5
-        if 'height' not in self.pad_data or not isinstance(self.pad_data['height'], (int, float)):
-            self.pad_data['height'] = 1.5
-        if 'hole_diameter' not in self.pad_data or not isinstance(self.pad_data['hole_diameter'], (int, float)):
-            self.pad_data['hole_diameter'] = 0.8
-        if 'corner_radius' not in self.pad_data or not isinstance(self.pad_data['corner_radius'], (int, float)):
-            self.pad_data['corner_radius'] = 0
-
-        if 'layers' not in self.pad_data:
-            self.pad_data['layers'] = {
-                'top_copper': True, 'bottom_copper': False,
-                'top_mask': True, 'bottom_mask': False,
-                'top_paste': True, 'bottom_paste': False
-            }
-
-        if 'thermal' not in self.pad_data:
-            self.pad_data['thermal'] = {'enabled': True, 'spoke_width': 0.3, 'gap_width': 0.2}
+        # PadSpec dùng chung, không sao chép dữ liệu cho từng pad
+        self.spec = spec if isinstance(spec, PadSpec) else PadSpec.from_data(spec)
+        self.geometry = pad_geometry(self.spec)  # Hình học dùng chung giữa các pad giống nhau
 
         self.setFlag(QGraphicsItem.ItemIsSelectable, True)
         self.setFlag(QGraphicsItem.ItemIsMovable, True)
@@ -46,54 +38,105 @@ class Pad(QGraphicsItem):
         print(f"{title}: {message}\n{tb_str}")
         error_dialog.exec_()
 
+    @classmethod
+    def set_lod_thresholds(cls, full_detail, outline):
+        """
+        Đặt ngưỡng level-of-detail cho tất cả các pad.
+        :param full_detail: Mức zoom tối thiểu để vẽ đầy đủ chi tiết.
+        :param outline: Mức zoom tối thiểu để vẽ hình pad; nhỏ hơn thì chỉ vẽ một hình chữ nhật đặc.
+        """
+        cls.lod_full_detail = float(full_detail)
+        cls.lod_outline = float(outline)
+
+    @property
+    def pad_data(self):
+        """Bản sao dữ liệu pad dạng dict (chỉ đọc)"""
+        return self.spec.to_data()
+
+    def set_spec(self, spec, geometry=None):
+        """
+        Thay PadSpec của pad (spec cũ vẫn được các pad khác dùng chung) và cập nhật hình học.
+        :param spec: PadSpec mới hoặc dữ liệu pad dạng dict.
+        :param geometry: Hình học của spec nếu đã tra sẵn (sửa hàng loạt nhiều pad cùng spec).
+        """
+        spec = spec if isinstance(spec, PadSpec) else PadSpec.from_data(spec)
+        if spec is self.spec:
+            return
+        geometry = geometry or pad_geometry(spec)
+        if geometry.bounding_rect == self.geometry.bounding_rect:
+            # Cùng hình bao (ví dụ chỉ đổi lỗ khoan): không cần cập nhật BSP index hay chỉ mục layer
+            self.spec = spec
+            self.geometry = geometry
+            self.update()
+            return
+        self.prepareGeometryChange()
+        self.spec = spec
+        self.geometry = geometry
+        layer = self.parentItem()
+        if isinstance(layer, LayerItem):
+            layer.item_moved(self)
+        self.update()
+
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.ItemPositionHasChanged:
+            # Giữ chỉ mục không gian của layer đồng bộ khi pad được kéo
+            layer = self.parentItem()
+            if isinstance(layer, LayerItem):
+                layer.item_moved(self)
+        return super().itemChange(change, value)
+
+    def mouseMoveEvent(self, event):
+        # Bắt lưới: SnapEngine di chuyển cả vùng chọn trong một bước vector hóa
+        engine = snap_engine(self.scene())
+        if event.buttons() & Qt.LeftButton and engine is not None and engine.drag_selection(self, event):
+            return
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        engine = snap_engine(self.scene())
+        if engine is not None:
+            engine.end_drag()
+        super().mouseReleaseEvent(event)
+
     def boundingRect(self):
-        width = self.pad_data['width'] * 10
-        height = self.pad_data['height'] * 10
-        return QRectF(-width / 2, -height / 2, width, height)
+        return self.geometry.bounding_rect
+
+    def shape(self):
+        return self.geometry.pad_path
 
     def paint(self, painter, option, widget):
-        width = self.pad_data['width'] * 10
-        height = self.pad_data['height'] * 10
-        hole_diameter = self.pad_data['hole_diameter'] * 10
-        corner_radius = self.pad_data['corner_radius'] * 10
-
-        painter.setPen(QPen(QColor(0, 128, 0), 1))
-        painter.setBrush(QBrush(QColor(0, 200, 0, 128) if self.pad_data['layers']['top_copper']
-                                else QColor(0, 100, 0, 64)))
-
-        shape = self.pad_data.get('shape', 'Rectangle')
-
-        if shape == "Circle":
-            diameter = max(width, height)
-            painter.drawEllipse(-diameter / 2, -diameter / 2, diameter, diameter)
-        elif shape == "Rectangle":
-            if corner_radius > 0:
-                painter.drawRoundedRect(-width / 2, -height / 2, width, height, corner_radius, corner_radius)
-            else:
-                painter.drawRect(-width / 2, -height / 2, width, height)
-        elif shape == "Oval":
-            painter.drawEllipse(-width / 2, -height / 2, width, height)
-
-        if "THT" in self.pad_data.get('type', '') and hole_diameter > 0:
-            painter.setPen(QPen(QColor(0, 0, 0), 1))
-            painter.setBrush(QBrush(QColor(255, 255, 255)))
-            painter.drawEllipse(-hole_diameter / 2, -hole_diameter / 2, hole_diameter, hole_diameter)
-
-            if self.pad_data['thermal']['enabled']:
-                spoke_width = self.pad_data['thermal']['spoke_width'] * 10
-                gap_width = self.pad_data['thermal']['gap_width'] * 10
-                painter.save()
-                for angle in [0, 90, 180, 270]:
-                    painter.rotate(angle)
-                    painter.setPen(QPen(QColor(0, 128, 0), 1))
-                    painter.setBrush(QBrush(QColor(0, 200, 0, 128)))
-                    painter.drawRect(-width / 2, -spoke_width / 2,
-                                     width / 2 - hole_diameter / 2, spoke_width)
-                    painter.restore()
-                    painter.save()
-                painter.restore()
+        geometry = self.geometry
+        brush = PAD_BRUSH if "top_copper" in self.spec.layers else PAD_BRUSH_INACTIVE
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+
+        if lod < self.lod_outline:
+            # Zoom rất nhỏ: pad chỉ còn vài pixel, vẽ một hình chữ nhật đặc
+            painter.fillRect(geometry.outline_rect, SELECTION_PEN.brush() if self.isSelected() else brush)
+            return
+
+        painter.setPen(PAD_PEN)
+        painter.setBrush(brush)
+        painter.drawPath(geometry.pad_path)
+
+        if lod < self.lod_full_detail or self.draft_mode:
+            # Zoom trung bình (hoặc khung hình nháp): bỏ lỗ, nan nhiệt; khung chọn vẽ nét liền
+            if self.isSelected():
+                painter.setPen(SELECTION_PEN.color())
+                painter.setBrush(Qt.NoBrush)
+                painter.drawRect(geometry.outline_rect)
+            return
+
+        if geometry.hole_path is not None:
+            painter.setPen(HOLE_PEN)
+            painter.setBrush(HOLE_BRUSH)
+            painter.drawPath(geometry.hole_path)
+
+            if geometry.spoke_path is not None:
+                painter.setPen(PAD_PEN)
+                painter.setBrush(PAD_BRUSH)
+                painter.drawPath(geometry.spoke_path)
 
         if self.isSelected():
-            painter.setPen(QPen(QColor(255, 0, 0), 2, Qt.DashLine))
+            painter.setPen(SELECTION_PEN)
             painter.setBrush(Qt.NoBrush)
-            painter.drawRect(self.boundingRect())
+            painter.drawRect(geometry.outline_rect)
@@ -0,0 +1,105 @@
+# pad_bulk_edit.py
+
+import numpy as np
+from PyQt5.QtWidgets import QGraphicsScene
+
+from pad import Pad
+from pad_field import PadField
+from pad_geometry import pad_geometry
+from scene_batch import bulk_update
+from undo_stack import Command, ITEM_REF_BYTES, push
+
+
+def selected_pad_items(scene: QGraphicsScene):
+    """
+    Các Pad và PadField đang được chọn trong scene.
+    """
+    return [item for item in scene.selectedItems() if isinstance(item, (Pad, PadField))]
+
+
+class PadBulkEdit(Command):
+    """
+    Một lần sửa hàng loạt các pad, hoàn tác/làm lại được như một bước.
+
+    Pad được gom theo PadSpec dùng chung: mỗi spec chỉ được sửa (và tra hình học) một lần dù
+    có bao nhiêu pad dùng nó. Với PadField chỉ lưu chỉ số các pad và chỉ số spec cũ/mới (mảng NumPy).
+    """
+
+    def __init__(self, scene: QGraphicsScene, changes: dict):
+        self.scene = scene
+        self.changes = dict(changes)
+        self.pad_groups = []  # (spec cũ, spec mới, danh sách Pad)
+        self.field_changes = []  # (PadField, chỉ số pad, chỉ số spec cũ, chỉ số spec mới)
+        self.text = "Edit pads"
+
+    def __len__(self):
+        return (sum(len(pads) for _, _, pads in self.pad_groups) +
+                sum(len(rows) for _, rows, _, _ in self.field_changes))
+
+    def size(self):
+        return (ITEM_REF_BYTES * (len(self.pad_groups) * 2 + sum(len(pads) for _, _, pads in self.pad_groups)) +
+                sum(rows.nbytes + old.nbytes + new.nbytes for _, rows, old, new in self.field_changes))
+
+    def redo(self):
+        self._apply(new=True)
+
+    def undo(self):
+        self._apply(new=False)
+
+    def _apply(self, new: bool):
+        # Một batch: scene và các view chỉ cập nhật một lần
+        with bulk_update(self.scene):
+            for old_spec, new_spec, pads in self.pad_groups:
+                spec = new_spec if new else old_spec
+                geometry = pad_geometry(spec)
+                for pad in pads:
+                    pad.set_spec(spec, geometry)
+            for field, rows, old_indices, new_indices in self.field_changes:
+                field.set_pad_specs(rows, new_indices if new else old_indices)
+
+
+def edit_pads(scene: QGraphicsScene, items, changes: dict):
+    """
+    Áp dụng thay đổi theo trường (ví dụ {"hole_diameter": 0.4}) cho mọi pad trong items.
+    Các spec mới được tạo (và kiểm tra) trước khi sửa bất kỳ pad nào: lỗi thì không pad nào bị đổi.
+    :param items: Các Pad và PadField (với PadField chỉ các pad đang được chọn).
+    :param changes: {tên trường PadSpec: giá trị mới}.
+    :return: PadBulkEdit đã áp dụng (và ghi vào lịch sử hoàn tác của scene), hoặc None nếu không có gì thay đổi.
+    """
+    if not changes:
+        return None
+    edit = PadBulkEdit(scene, changes)
+
+    groups = {}  # id(spec cũ) -> (spec cũ, danh sách Pad); spec được intern nên so theo id là đủ
+    for item in items:
+        if isinstance(item, Pad):
+            group = groups.get(id(item.spec))
+            if group is None:
+                groups[id(item.spec)] = (item.spec, [item])
+            else:
+                group[1].append(item)
+    for old_spec, pads in groups.values():
+        new_spec = old_spec.with_changes(**changes)
+        if new_spec is not old_spec:
+            edit.pad_groups.append((old_spec, new_spec, pads))
+
+    for item in items:
+        if not isinstance(item, PadField):
+            continue
+        rows = np.nonzero(item.selected)[0]
+        if not rows.size:
+            continue
+        old_indices = item.spec_indices[rows]
+        used = np.unique(old_indices)
+        replaced = [item.spec_index(item.specs[index].with_changes(**changes)) for index in used]
+        mapping = np.arange(len(item.specs), dtype=item.spec_indices.dtype)
+        mapping[used] = replaced
+        new_indices = mapping[old_indices]
+        changed = new_indices != old_indices
+        if changed.any():
+            edit.field_changes.append((item, rows[changed], old_indices[changed], new_indices[changed]))
+
+    if not len(edit):
+        return None
+    push(scene, edit)
+    return edit
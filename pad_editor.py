@@ -3,23 +3,33 @@
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QGridLayout,
     QLabel, QLineEdit, QPushButton, QComboBox, QCheckBox,
-    QGroupBox, QGraphicsScene, QGraphicsView,
-    QGraphicsRectItem, QGraphicsEllipseItem, QGraphicsPathItem
+    QGroupBox, QGraphicsScene, QGraphicsView, QGraphicsItem, QMessageBox
 )
-from PyQt5.QtGui import QPen, QBrush, QColor, QPainterPath
-from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPainter
+from PyQt5.QtCore import Qt, QTimer
 
 # Giả sử Pad là một class bạn định nghĩa ở nơi khác
 try:
     from pad import Pad  # nếu bạn có một module riêng cho Pad
 except ImportError:
     class Pad: pass  # placeholder nếu không có class Pad
+from pad_spec import PadSpec, spec_changes
+from pad_bulk_edit import selected_pad_items, edit_pads
+
+PREVIEW_DELAY_MS = 150  # Gom các lần gõ phím liên tiếp thành một lần cập nhật hình xem trước
+PREVIEW_MARGIN = 5  # Khoảng trống quanh pad trong hình xem trước (đơn vị scene)
+DEFAULT_PAD = PadSpec(type="THT (Through Hole)", shape="Circle")  # Giá trị ban đầu của các ô nhập
 
 class PadEditor(QDialog): 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Pad Editor")
         self.current_pad = None
+        self.preview_pad = None  # Pad duy nhất của hình xem trước, được cập nhật tại chỗ
+        self._preview_timer = QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.setInterval(PREVIEW_DELAY_MS)
+        self._preview_timer.timeout.connect(self.update_pad_preview)
         self.init_ui()
     def init_ui(self):
         layout = QVBoxLayout()
@@ -126,9 +136,15 @@ class PadEditor(QDialog):
         # Preview area
         preview_group = QGroupBox("Preview")
         preview_layout = QVBoxLayout()
-        self.pad_preview_scene = QGraphicsScene()
+        self.pad_preview_scene = QGraphicsScene(self)
         self.pad_preview_view = QGraphicsView(self.pad_preview_scene)
         self.pad_preview_view.setMinimumSize(200, 200)
+        self.pad_preview_view.setRenderHint(QPainter.Antialiasing)
+        # Vẽ bằng chính Pad của board: hình học lấy từ cache pad_geometry dùng chung
+        self.preview_pad = Pad(PadSpec.from_data(self.pad_data(strict=False)))
+        self.preview_pad.setFlag(QGraphicsItem.ItemIsSelectable, False)
+        self.preview_pad.setFlag(QGraphicsItem.ItemIsMovable, False)
+        self.pad_preview_scene.addItem(self.preview_pad)
         preview_layout.addWidget(self.pad_preview_view)
         preview_group.setLayout(preview_layout)
         layout.addWidget(preview_group)
@@ -148,106 +164,73 @@ class PadEditor(QDialog):
 
         self.setLayout(layout)
 
-        # Connect signals for updating preview
-        self.width_edit.textChanged.connect(self.update_pad_preview)
-        self.height_edit.textChanged.connect(self.update_pad_preview)
-        self.hole_diameter_edit.textChanged.connect(self.update_pad_preview)
-        self.corner_radius_edit.textChanged.connect(self.update_pad_preview)
+        # Connect signals for updating preview (ô nhập số: chờ ngừng gõ rồi mới cập nhật)
+        for edit in (self.width_edit, self.height_edit, self.hole_diameter_edit, self.corner_radius_edit,
+                     self.thermal_spoke_width, self.thermal_gap_width):
+            edit.textChanged.connect(self.schedule_preview)
+        self.thermal_enabled.toggled.connect(self.update_pad_preview)
+        self.top_copper_check.toggled.connect(self.update_pad_preview)
 
         # Initial preview
-        self.update_pad_preview()
+        self.fit_preview()
 
-    def update_pad_preview(self):
-        # Update the pad preview based on current settings
-        self.pad_preview_scene.clear()
+    def schedule_preview(self):
+        """
+        Hẹn cập nhật hình xem trước sau PREVIEW_DELAY_MS; mỗi lần gõ phím chỉ khởi động lại bộ hẹn giờ.
+        """
+        self._preview_timer.start()
 
+    def update_pad_preview(self):
+        # Cập nhật pad xem trước tại chỗ: chỉ đổi PadSpec, không dựng lại scene
+        self._preview_timer.stop()
+        if self.preview_pad is None:
+            return
         try:
-            width = float(self.width_edit.text()) * 20  # Scale for better visibility
-            height = float(self.height_edit.text()) * 20
-            hole_diameter = float(self.hole_diameter_edit.text()) * 20
-            corner_radius = float(self.corner_radius_edit.text()) * 20
+            spec = PadSpec.from_data(self.pad_data(strict=False))
         except ValueError:
-            # If any conversion fails, use default values
-            width = 30
-            height = 30
-            hole_diameter = 16
-            corner_radius = 0
-
-        pad_type = self.pad_type_combo.currentText()
-        pad_shape = self.pad_shape_combo.currentText()
-
-        # Draw pad outline
-        if pad_shape == "Circle":
-            diameter = max(width, height)
-            pad_item = QGraphicsEllipseItem(-diameter / 2, -diameter / 2, diameter, diameter)
-        elif pad_shape == "Rectangle":
-            if corner_radius > 0:
-                # Create rounded rectangle path
-                path = QPainterPath()
-                path.addRoundedRect(-width / 2, -height / 2, width, height, corner_radius, corner_radius)
-                pad_item = QGraphicsPathItem(path)
-            else:
-                pad_item = QGraphicsRectItem(-width / 2, -height / 2, width, height)
-        elif pad_shape == "Oval":
-            path = QPainterPath()
-            path.addEllipse(-width / 2, -height / 2, width, height)
-            pad_item = QGraphicsPathItem(path)
-        else:  # Custom - just use rectangle for now
-            pad_item = QGraphicsRectItem(-width / 2, -height / 2, width, height)
-
-        # Set pad appearance
-        pad_item.setPen(QPen(QColor(0, 128, 0), 1))
-        pad_item.setBrush(QBrush(QColor(0, 200, 0, 128)))
-        self.pad_preview_scene.addItem(pad_item)
-
-        # Draw hole for THT pads
-        if "THT" in pad_type and hole_diameter > 0:
-            hole_item = QGraphicsEllipseItem(-hole_diameter / 2, -hole_diameter / 2,
-                                             hole_diameter, hole_diameter)
-            hole_item.setPen(QPen(QColor(0, 0, 0), 1))
-            hole_item.setBrush(QBrush(QColor(255, 255, 255)))
-            self.pad_preview_scene.addItem(hole_item)
-
-            # Draw thermal relief if enabled
-            if self.thermal_enabled.isChecked():
-                try:
-                    spoke_width = float(self.thermal_spoke_width.text()) * 20
-                    gap_width = float(self.thermal_gap_width.text()) * 20
-                except ValueError:
-                    spoke_width = 6
-                    gap_width = 4
-
-                # Draw thermal relief spokes
-                for angle in [0, 90, 180, 270]:
-                    # Create a rectangle rotated at the specified angle
-                    spoke = QGraphicsRectItem(-width / 2, -spoke_width / 2, width, spoke_width)
-                    spoke.setRotation(angle)
-                    spoke.setPen(QPen(QColor(0, 128, 0), 1))
-                    spoke.setBrush(QBrush(QColor(0, 200, 0, 128)))
-                    self.pad_preview_scene.addItem(spoke)
-
-                    # Create cutouts on each side of the spoke
-                    gap = QGraphicsRectItem(-hole_diameter / 2 - gap_width, -spoke_width / 2 - gap_width / 2,
-                                            gap_width, spoke_width + gap_width)
-                    gap.setRotation(angle)
-                    gap.setPen(QPen(QColor(0, 0, 0), 1))
-                    gap.setBrush(QBrush(QColor(255, 255, 255)))
-                    self.pad_preview_scene.addItem(gap)
-
-        # Reset view
-        self.pad_preview_view.setScene(self.pad_preview_scene)
-        self.pad_preview_view.fitInView(self.pad_preview_scene.itemsBoundingRect(), Qt.KeepAspectRatio)
-        self.pad_preview_view.centerOn(0, 0)
-
-    def apply_pad(self):
-        # Create a pad with the current settings and return it
-        pad_data = {
+            return  # Giá trị không hợp lệ (ví dụ kích thước bằng 0): giữ hình xem trước cũ
+        if spec is self.preview_pad.spec:
+            return
+        old_rect = self.preview_pad.boundingRect()
+        self.preview_pad.set_spec(spec)
+        if self.preview_pad.boundingRect() != old_rect:
+            self.fit_preview()
+
+    def fit_preview(self):
+        """
+        Phóng hình xem trước vừa khung (chỉ khi kích thước pad thay đổi).
+        """
+        rect = self.preview_pad.boundingRect().adjusted(-PREVIEW_MARGIN, -PREVIEW_MARGIN,
+                                                         PREVIEW_MARGIN, PREVIEW_MARGIN)
+        self.pad_preview_scene.setSceneRect(rect)
+        self.pad_preview_view.fitInView(rect, Qt.KeepAspectRatio)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.fit_preview()  # Kích thước khung xem trước chỉ đúng khi hộp thoại đã hiện
+
+    def pad_data(self, strict=True):
+        """
+        Dữ liệu pad dạng dict từ các ô nhập.
+        :param strict: False để dùng giá trị của pad xem trước cho ô nhập không phải là số (đang gõ dở).
+        """
+        fallback = self.preview_pad.spec if self.preview_pad is not None else PadSpec()
+
+        def number(edit, default):
+            try:
+                return float(edit.text())
+            except ValueError:
+                if strict:
+                    raise
+                return default
+
+        return {
             'type': self.pad_type_combo.currentText(),
             'shape': self.pad_shape_combo.currentText(),
-            'width': float(self.width_edit.text()),
-            'height': float(self.height_edit.text()),
-            'hole_diameter': float(self.hole_diameter_edit.text()),
-            'corner_radius': float(self.corner_radius_edit.text()),
+            'width': number(self.width_edit, fallback.width),
+            'height': number(self.height_edit, fallback.height),
+            'hole_diameter': number(self.hole_diameter_edit, fallback.hole_diameter),
+            'corner_radius': number(self.corner_radius_edit, fallback.corner_radius),
             'layers': {
                 'top_copper': self.top_copper_check.isChecked(),
                 'bottom_copper': self.bottom_copper_check.isChecked(),
@@ -258,55 +241,85 @@ class PadEditor(QDialog):
             },
             'thermal': {
                 'enabled': self.thermal_enabled.isChecked(),
-                'spoke_width': float(self.thermal_spoke_width.text()),
-                'gap_width': float(self.thermal_gap_width.text())
+                'spoke_width': number(self.thermal_spoke_width, fallback.spoke_width),
+                'gap_width': number(self.thermal_gap_width, fallback.gap_width)
             }
         }
 
-        # Here you would normally create the pad and add it to your PCB
+    def apply_pad(self):
+        # Create a pad with the current settings and return it
+        # PadSpec được intern: các lần áp dụng cùng thông số dùng chung một spec
+        try:
+            pad_data = self.pad_data()
+            spec = PadSpec.from_data(pad_data)
+        except ValueError as e:
+            # Ô nhập không phải số hoặc kích thước không hợp lệ: báo lỗi và giữ hộp thoại mở để sửa
+            QMessageBox.warning(self, "Invalid Pad", str(e))
+            return None
+
         # This is a signal that the pad was created successfully
-        self.current_pad = pad_data
-        self.close()
-        return pad_data
-
-    def edit_selected_pad(self):
-        # Edit the currently selected pad
-        selected_items = self.drawing_app.scene.selectedItems()
-        for item in selected_items:
-            if isinstance(item, Pad):
-                # Mở Pad Editor với dữ liệu từ pad đã chọn
-                pad_editor = PadEditor(self)
-
-                # Thiết lập dữ liệu hiện tại
-                pad_editor.pad_type_combo.setCurrentText(item.pad_data['type'])
-                pad_editor.pad_shape_combo.setCurrentText(item.pad_data['shape'])
-                pad_editor.width_edit.setText(str(item.pad_data['width']))
-                pad_editor.height_edit.setText(str(item.pad_data['height']))
-                pad_editor.hole_diameter_edit.setText(str(item.pad_data['hole_diameter']))
-                pad_editor.corner_radius_edit.setText(str(item.pad_data['corner_radius']))
-
-                # Thiết lập các checkboxes cho layers
-                if 'layers' in item.pad_data:
-                    layers = item.pad_data['layers']
-                    pad_editor.top_copper_check.setChecked(layers.get('top_copper', True))
-                    pad_editor.bottom_copper_check.setChecked(layers.get('bottom_copper', False))
-                    pad_editor.top_mask_check.setChecked(layers.get('top_mask', True))
-                    pad_editor.bottom_mask_check.setChecked(layers.get('bottom_mask', False))
-                    pad_editor.top_paste_check.setChecked(layers.get('top_paste', True))
-                    pad_editor.bottom_paste_check.setChecked(layers.get('bottom_paste', False))
-
-                # Thiết lập thermal relief settings
-                if 'thermal' in item.pad_data:
-                    thermal = item.pad_data['thermal']
-                    pad_editor.thermal_enabled.setChecked(thermal.get('enabled', True))
-                    pad_editor.thermal_spoke_width.setText(str(thermal.get('spoke_width', 0.3)))
-                    pad_editor.thermal_gap_width.setText(str(thermal.get('gap_width', 0.2)))
-
-                # Show dialog
-                if pad_editor.exec_() == QDialog.Accepted and pad_editor.current_pad:
-                    # Cập nhật pad với dữ liệu mới
-                    item.pad_data = pad_editor.current_pad
-                    item.update()  # Cập nhật hiển thị
-                    self.display_message("Updated pad properties")
-
-                break 
\ No newline at end of file
+        self.current_pad = spec
+        self.accept()  # exec_() trả về Accepted để nơi gọi dùng current_pad
+        return self.current_pad
+
+    def reset(self, spec=None):
+        """
+        Đưa hộp thoại về trạng thái ban đầu để dùng lại (không dựng lại widget hay scene).
+        :param spec: PadSpec để điền sẵn; None để dùng DEFAULT_PAD.
+        """
+        self.current_pad = None
+        self.load_spec(spec or DEFAULT_PAD)
+
+    def prewarm(self):
+        """
+        Làm trước các việc tốn thời gian của lần mở đầu tiên (polish style, bố cục, vẽ hình xem trước)
+        khi ứng dụng đang rảnh.
+        """
+        self.ensurePolished()
+        self.layout().activate()
+        self.resize(self.sizeHint())
+        self.winId()  # Tạo cửa sổ native (và backing store) trước
+        self.grab()  # Vẽ toàn bộ cây widget một lần vào pixmap, không hiện cửa sổ
+
+    def load_spec(self, spec):
+        """
+        Điền các ô nhập từ một PadSpec.
+        """
+        self.pad_type_combo.setCurrentText(spec.type)
+        self.pad_shape_combo.setCurrentText(spec.shape)
+        self.width_edit.setText(str(spec.width))
+        self.height_edit.setText(str(spec.height))
+        self.hole_diameter_edit.setText(str(spec.hole_diameter))
+        self.corner_radius_edit.setText(str(spec.corner_radius))
+
+        # Thiết lập các checkboxes cho layers
+        self.top_copper_check.setChecked("top_copper" in spec.layers)
+        self.bottom_copper_check.setChecked("bottom_copper" in spec.layers)
+        self.top_mask_check.setChecked("top_mask" in spec.layers)
+        self.bottom_mask_check.setChecked("bottom_mask" in spec.layers)
+        self.top_paste_check.setChecked("top_paste" in spec.layers)
+        self.bottom_paste_check.setChecked("bottom_paste" in spec.layers)
+
+        # Thiết lập thermal relief settings
+        self.thermal_enabled.setChecked(spec.thermal_enabled)
+        self.thermal_spoke_width.setText(str(spec.spoke_width))
+        self.thermal_gap_width.setText(str(spec.gap_width))
+        self.update_pad_preview()
+
+    def edit_selected_pad(self, scene):
+        """
+        Sửa mọi pad đang được chọn: hộp thoại hiện thông số của pad chọn đầu tiên, chỉ các trường
+        người dùng đã đổi được áp dụng cho tất cả (trong một lần, hoàn tác được như một bước).
+        :param scene: Scene chứa các pad được chọn.
+        :return: PadBulkEdit đã áp dụng, hoặc None nếu không có gì thay đổi.
+        """
+        items = selected_pad_items(scene)
+        if not items:
+            return None
+        self.load_spec(items[0].spec)
+        shown = PadSpec.from_data(self.pad_data())  # Spec đúng như hộp thoại hiển thị
+
+        self.current_pad = None
+        if self.exec_() != QDialog.Accepted or not self.current_pad:
+            return None
+        return edit_pads(scene, items, spec_changes(shown, self.current_pad))
@@ -0,0 +1,495 @@
+# pad_field.py
+
+import numpy as np
+from PyQt5.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+from PyQt5.QtGui import QPen, QPolygonF, QPainterPath
+from PyQt5.QtCore import QRectF, QPointF, Qt
+
+from pad import Pad
+from pad_spec import PadSpec
+from snapping import snap_engine
+from undo_stack import record, PadFieldMoveCommand
+from pad_geometry import (
+    pad_geometry, PAD_SCALE, PAD_PEN, PAD_BRUSH, PAD_BRUSH_INACTIVE, HOLE_PEN, HOLE_BRUSH, SELECTION_PEN
+)
+
+# Pad cùng spec nằm gần nhau được gộp thành path vẽ bằng một lệnh. Path phải nhỏ và gọn: bộ tô khử răng cưa
+# của Qt chậm đi rất nhanh khi một path chứa nhiều hình hoặc trải rộng
+BATCH_CELL = 160  # Cạnh ô lưới (đơn vị scene) dùng để gom nhóm
+BATCH_PADS = 64  # Số pad tối đa trong một path gộp
+BATCH_LAYERS = ("pad_path", "hole_path", "spoke_path")
+
+
+def points_to_polygon(points):
+    """
+    Tạo QPolygonF từ mảng NumPy (N, 2) bằng cách ghi thẳng vào bộ nhớ của polygon.
+    :param points: Mảng tọa độ float64 dạng (N, 2).
+    """
+    polygon = QPolygonF(len(points))
+    if len(points):
+        buffer = polygon.data()
+        buffer.setsize(len(points) * 2 * 8)
+        np.frombuffer(buffer, dtype=np.float64).reshape(-1, 2)[:] = points
+    return polygon
+
+
+def is_rect_path(path) -> bool:
+    """
+    True nếu path chỉ là hình chữ nhật bao của nó (như path Qt tạo cho QGraphicsScene.items(QRectF)).
+    """
+    if path.elementCount() != 5:
+        return False
+    points = [(path.elementAt(index).x, path.elementAt(index).y) for index in range(5)]
+    if points[0] != points[4] or any(path.elementAt(index).type != QPainterPath.LineToElement for index in range(1, 5)):
+        return False
+    # Cạnh nối hai đỉnh liên tiếp song song với trục, và các đỉnh phủ đủ hai giá trị x, y của hình bao
+    bounds = path.boundingRect()
+    corners = {(bounds.left(), bounds.top()), (bounds.right(), bounds.top()),
+               (bounds.left(), bounds.bottom()), (bounds.right(), bounds.bottom())}
+    return (set(points[:4]) == corners
+            and all(a[0] == b[0] or a[1] == b[1] for a, b in zip(points[:4], points[1:])))
+
+
+class PadField(QGraphicsItem):
+    """
+    Một item chứa nhiều pad, lưu vị trí, chỉ số spec và trạng thái chọn trong mảng NumPy.
+    Dùng cho board có hàng chục nghìn pad thay cho mỗi pad một QGraphicsItem.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.positions = np.zeros((0, 2), dtype=np.float64)  # Tọa độ tâm pad (tọa độ item)
+        self.spec_indices = np.zeros(0, dtype=np.int32)  # Chỉ số trong self.specs
+        self.selected = np.zeros(0, dtype=bool)  # Trạng thái chọn của từng pad
+
+        self.specs = []  # Bảng PadSpec dùng chung
+        self.geometries = []  # PadGeometry tương ứng với self.specs
+        self._spec_lookup = {}
+        self._half_sizes = np.zeros((0, 2), dtype=np.float64)  # Nửa kích thước bao của từng spec
+        self._bounds = QRectF()
+        self._drag_origin = None
+        self._drag_rows = None  # Chỉ số các pad được chọn lúc bắt đầu kéo
+        self._drag_start = None  # Vị trí các pad đó lúc bắt đầu kéo (bắt lưới, hoàn tác)
+        self._drag_anchor = None  # Vị trí lúc bắt đầu kéo của pad dưới chuột
+        # Path gộp các pad cùng spec trong cùng một ô BATCH_CELL: (khóa ô, lớp) -> danh sách QPainterPath
+        self._batch_paths = {}
+
+        self.setFlag(QGraphicsItem.ItemIsSelectable, True)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)  # Cần exposedRect khi vẽ
+
+    def __len__(self):
+        return len(self.positions)
+
+    def spec_index(self, spec):
+        """
+        Trả về chỉ số của spec trong bảng, thêm mới nếu chưa có.
+        :param spec: PadSpec hoặc dữ liệu pad dạng dict.
+        """
+        spec = PadSpec.from_data(spec)
+        index = self._spec_lookup.get(spec)
+        if index is None:
+            index = len(self.specs)
+            geometry = pad_geometry(spec)
+            rect = geometry.bounding_rect
+            self.specs.append(spec)
+            self.geometries.append(geometry)
+            self._spec_lookup[spec] = index
+            half = max(-rect.left(), rect.right()), max(-rect.top(), rect.bottom())
+            self._half_sizes = np.vstack([self._half_sizes, half])
+        return index
+
+    def add_pads(self, spec, positions):
+        """
+        Thêm nhiều pad cùng một spec.
+        :param spec: PadSpec (hoặc dict) của các pad.
+        :param positions: Danh sách/mảng tọa độ (x, y) theo tọa độ item.
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        index = self.spec_index(spec)
+        first = len(self.positions)
+        self.prepareGeometryChange()
+        self.positions = np.concatenate([self.positions, positions])
+        self.spec_indices = np.concatenate([self.spec_indices, np.full(len(positions), index, dtype=np.int32)])
+        self.selected = np.concatenate([self.selected, np.zeros(len(positions), dtype=bool)])
+        self._drop_batches(np.arange(first, len(self.positions)))
+        self._update_bounds(first)
+
+    def set_pads(self, specs, spec_indices, positions):
+        """
+        Thay toàn bộ pad của field (ví dụ khi mở project), giữ nguyên thứ tự.
+        :param specs: Bảng PadSpec mà spec_indices trỏ vào.
+        :param spec_indices: Chỉ số spec trong `specs` của từng pad.
+        :param positions: Mảng (N, 2) tọa độ item.
+        """
+        spec_indices = self._own_spec_indices(specs, spec_indices)
+        self.prepareGeometryChange()
+        self.positions = np.array(positions, dtype=np.float64).reshape(-1, 2)
+        self.spec_indices = spec_indices
+        self.selected = np.zeros(len(self.positions), dtype=bool)
+        self._batch_paths.clear()
+        self._update_bounds()
+
+    def append_pads(self, specs, spec_indices, positions):
+        """
+        Nối thêm pad vào cuối field (ví dụ khi nạp project theo từng lô).
+        :param specs: Bảng PadSpec mà spec_indices trỏ vào.
+        :param spec_indices: Chỉ số spec trong `specs` của từng pad.
+        :param positions: Mảng (N, 2) tọa độ item.
+        """
+        spec_indices = self._own_spec_indices(specs, spec_indices)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        first = len(self.positions)
+        self.prepareGeometryChange()
+        self.positions = np.concatenate([self.positions, positions])
+        self.spec_indices = np.concatenate([self.spec_indices, spec_indices])
+        self.selected = np.concatenate([self.selected, np.zeros(len(positions), dtype=bool)])
+        self._drop_batches(np.arange(first, len(self.positions)))
+        self._update_bounds(first)
+
+    def _own_spec_indices(self, specs, spec_indices):
+        # Đổi chỉ số trong bảng `specs` bên ngoài sang chỉ số trong self.specs
+        spec_indices = np.asarray(spec_indices)
+        used = np.unique(spec_indices)
+        mapping = np.zeros(len(specs), dtype=np.int32)
+        mapping[used] = [self.spec_index(specs[index]) for index in used]
+        return mapping[spec_indices]
+
+    def remove_pads(self, mask):
+        """
+        Xóa các pad theo mặt nạ hoặc danh sách chỉ số.
+        :param mask: Mảng bool độ dài len(self) hoặc mảng chỉ số.
+        """
+        keep = np.ones(len(self.positions), dtype=bool)
+        keep[mask] = False
+        self._drop_batches(~keep)
+        self.prepareGeometryChange()
+        self.positions = self.positions[keep]
+        self.spec_indices = self.spec_indices[keep]
+        self.selected = self.selected[keep]
+        self._update_bounds()
+
+    def _extents(self):
+        """Nửa kích thước bao của từng pad, dạng (N, 2)"""
+        return self._half_sizes[self.spec_indices]
+
+    def _update_bounds(self, first=0):
+        """
+        Tính lại hình chữ nhật bao.
+        :param first: Chỉ số pad đầu tiên vừa được nối thêm; chỉ các pad từ đó được xét để mở rộng
+            hình bao hiện tại (nối nhiều lô không phải duyệt lại toàn bộ field).
+        """
+        if not len(self.positions):
+            self._bounds = QRectF()
+        elif first < len(self.positions):
+            extents = self._half_sizes[self.spec_indices[first:]]
+            positions = self.positions[first:]
+            low = (positions - extents).min(axis=0)
+            high = (positions + extents).max(axis=0)
+            bounds = QRectF(QPointF(*low), QPointF(*high))
+            self._bounds = self._bounds.united(bounds) if first else bounds
+        self.update()
+
+    def boundingRect(self):
+        return self._bounds
+
+    def _batch_keys(self, rows=slice(None)):
+        """Khóa gom nhóm khi vẽ của các pad: chỉ số spec và ô BATCH_CELL chứa tâm pad"""
+        cells = np.floor(self.positions[rows] / BATCH_CELL).astype(np.int64) & 0xFFFFF
+        return (self.spec_indices[rows].astype(np.int64) << 40) | (cells[:, 0] << 20) | cells[:, 1]
+
+    def _drop_batches(self, rows):
+        """
+        Bỏ các path gộp sẵn chứa những pad này; gọi trước và sau khi đổi vị trí hoặc spec của chúng.
+        :param rows: Mặt nạ bool hoặc mảng chỉ số pad.
+        """
+        if not self._batch_paths:
+            return
+        for key in np.unique(self._batch_keys(rows)).tolist():
+            for layer in range(len(BATCH_LAYERS)):
+                self._batch_paths.pop((key, layer), None)
+
+    def _batch_path(self, key, layer, rows):
+        """
+        Các path gộp của một nhóm (cùng spec, cùng ô), dựng khi cần và giữ đến khi nhóm thay đổi.
+        :param rows: Chỉ số mọi pad của nhóm.
+        """
+        paths = self._batch_paths.get((key, layer))
+        if paths is None:
+            shape = getattr(self.geometries[self.spec_indices[rows[0]]], BATCH_LAYERS[layer])
+            points = self.positions[rows].tolist()
+            paths = []
+            for start in range(0, len(points), BATCH_PADS):
+                path = QPainterPath()
+                path.setFillRule(Qt.WindingFill)  # Pad chồng lên nhau không bị khoét lỗ
+                for px, py in points[start:start + BATCH_PADS]:
+                    path.addPath(shape.translated(px, py))
+                paths.append(path)
+            self._batch_paths[key, layer] = paths
+        return paths
+
+    # --- Truy vấn vector hóa ---
+
+    def pads_in_rect(self, rect, mode=Qt.IntersectsItemShape):
+        """
+        Trả về mặt nạ các pad nằm trong (hoặc giao với) hình chữ nhật.
+        :param rect: QRectF theo tọa độ item.
+        :param mode: Qt.IntersectsItemShape/IntersectsItemBoundingRect hoặc Qt.ContainsItemShape/ContainsItemBoundingRect.
+        """
+        extents = self._extents()
+        low = self.positions - extents
+        high = self.positions + extents
+        if mode in (Qt.ContainsItemShape, Qt.ContainsItemBoundingRect):
+            return ((low[:, 0] >= rect.left()) & (high[:, 0] <= rect.right()) &
+                    (low[:, 1] >= rect.top()) & (high[:, 1] <= rect.bottom()))
+        return ((high[:, 0] >= rect.left()) & (low[:, 0] <= rect.right()) &
+                (high[:, 1] >= rect.top()) & (low[:, 1] <= rect.bottom()))
+
+    def pad_at(self, point):
+        """
+        Trả về chỉ số pad trên cùng tại một điểm (tọa độ item), hoặc -1.
+        """
+        extents = self._extents()
+        delta = np.abs(self.positions - (point.x(), point.y()))
+        hits = np.nonzero((delta[:, 0] <= extents[:, 0]) & (delta[:, 1] <= extents[:, 1]))[0]
+        if not hits.size:
+            return -1
+        # Kiểm tra chính xác theo hình dạng pad, ưu tiên pad thêm sau (nằm trên)
+        for index in hits[::-1]:
+            x, y = self.positions[index]
+            if self.geometries[self.spec_indices[index]].pad_path.contains(QPointF(point.x() - x, point.y() - y)):
+                return int(index)
+        return -1
+
+    def contains(self, point):
+        return self.pad_at(point) >= 0
+
+    def collidesWithPath(self, path, mode=Qt.IntersectsItemShape):
+        # Lọc theo hình bao của path, rồi xét đúng path (lasso, rubber band của view đã xoay).
+        # Mỗi pad được xét theo hình chữ nhật bao của nó, như pads_in_rect
+        hits = np.nonzero(self.pads_in_rect(path.boundingRect(), mode))[0]
+        if not hits.size or is_rect_path(path):
+            return bool(hits.size)
+        contains = mode in (Qt.ContainsItemShape, Qt.ContainsItemBoundingRect)
+        extents = self._extents()
+        for (x, y), (dx, dy) in zip(self.positions[hits].tolist(), extents[hits].tolist()):
+            rect = QRectF(x - dx, y - dy, 2 * dx, 2 * dy)
+            if path.contains(rect) if contains else path.intersects(rect):
+                return True
+        return False
+
+    # --- Chọn pad ---
+
+    def select_in_rect(self, rect, mode=Qt.IntersectsItemShape, toggle=False, base=None):
+        """
+        Chọn các pad trong hình chữ nhật (ví dụ rubber band của view).
+        :param rect: QRectF theo tọa độ item.
+        :param toggle: True để đảo trạng thái chọn của các pad trong hình chữ nhật (giữ Ctrl)
+            thay vì chỉ chọn chúng.
+        :param base: Trạng thái chọn được đảo khi toggle (mặc định là trạng thái hiện tại); rubber band
+            truyền trạng thái lúc bắt đầu kéo để co vùng chọn lại thì pad trở về như cũ.
+        """
+        hits = self.pads_in_rect(rect, mode)
+        if toggle:
+            hits ^= self.selected if base is None else base
+        self.selected = hits
+        self._sync_selected()
+
+    def set_pad_selection(self, mask):
+        """
+        Đặt trạng thái chọn của tất cả các pad.
+        :param mask: Mảng bool độ dài len(self).
+        """
+        self.selected = np.array(mask, dtype=bool)
+        self._sync_selected()
+
+    def select_pads(self, indices, extend=False):
+        """
+        Chọn các pad theo chỉ số.
+        """
+        if not extend:
+            self.selected[:] = False
+        self.selected[indices] = True
+        self._sync_selected()
+
+    def clear_pad_selection(self):
+        self.selected[:] = False
+        self._sync_selected()
+
+    def _sync_selected(self):
+        # Item được chọn khi có ít nhất một pad được chọn
+        any_selected = bool(self.selected.any())
+        if self.isSelected() != any_selected:
+            self.setSelected(any_selected)
+        self.update()
+
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.ItemSelectedHasChanged and not value and self.selected.any():
+            # Scene bỏ chọn item (ví dụ clearSelection) -> bỏ chọn mọi pad
+            self.selected[:] = False
+            self.update()
+        return super().itemChange(change, value)
+
+    # --- Giao diện giống Pad cho edit_selected_pad ---
+
+    @property
+    def spec(self):
+        """PadSpec của pad được chọn đầu tiên (hoặc None)"""
+        selected = np.nonzero(self.selected)[0]
+        if not selected.size:
+            return None
+        return self.specs[self.spec_indices[selected[0]]]
+
+    def set_spec(self, spec):
+        """
+        Đổi spec cho tất cả các pad đang được chọn.
+        :param spec: PadSpec mới hoặc dữ liệu pad dạng dict.
+        """
+        index = self.spec_index(spec)
+        self._drop_batches(self.selected)
+        self.prepareGeometryChange()
+        self.spec_indices[self.selected] = index
+        self._drop_batches(self.selected)
+        self._update_bounds()
+
+    def set_pad_specs(self, rows, indices):
+        """
+        Đặt chỉ số spec cho các pad theo hàng (dùng khi sửa hàng loạt và hoàn tác).
+        :param rows: Chỉ số các pad.
+        :param indices: Chỉ số spec mới trong self.specs, cùng độ dài với rows.
+        """
+        self._drop_batches(rows)
+        self.prepareGeometryChange()
+        self.spec_indices[rows] = indices
+        self._drop_batches(rows)
+        self._update_bounds()
+
+    def move_selected(self, dx, dy):
+        """
+        Di chuyển các pad đang được chọn.
+        """
+        self._drop_batches(self.selected)
+        self.prepareGeometryChange()
+        self.positions[self.selected] += (dx, dy)
+        self._drop_batches(self.selected)
+        self._update_bounds()
+
+    def set_pad_positions(self, rows, positions):
+        """
+        Đặt vị trí cho các pad theo hàng (dùng khi hoàn tác di chuyển).
+        :param rows: Chỉ số các pad.
+        :param positions: Mảng (N, 2) hoặc (1, 2) tọa độ item mới.
+        """
+        self._drop_batches(rows)
+        self.prepareGeometryChange()
+        self.positions[rows] = positions
+        self._drop_batches(rows)
+        self._update_bounds()
+
+    # --- Chuột: chọn và kéo từng pad ---
+
+    def mousePressEvent(self, event):
+        index = self.pad_at(event.pos())
+        if index < 0 or event.button() != Qt.LeftButton:
+            event.ignore()
+            return
+
+        if event.modifiers() & Qt.ControlModifier:
+            self.selected[index] = not self.selected[index]
+        elif not self.selected[index]:
+            if self.scene() is not None:
+                self.scene().clearSelection()
+            self.selected[index] = True
+        self._sync_selected()
+        self._drag_origin = event.pos()
+        self._drag_rows = np.nonzero(self.selected)[0]
+        self._drag_start = self.positions[self._drag_rows]
+        self._drag_anchor = self.positions[index].copy()  # Pad bị kéo: chỉ pad này được bắt lưới
+        event.accept()
+
+    def mouseMoveEvent(self, event):
+        if self._drag_origin is None:
+            return
+        engine = snap_engine(self.scene())
+        if engine is not None and engine.snap_to_grid:
+            # Bắt lưới pad bị kéo (tọa độ scene); cả vùng chọn dời cùng đoạn đó nên giữ khoảng cách giữa các pad
+            delta = event.pos() - event.buttonDownPos(Qt.LeftButton)
+            offset = self.mapToScene(QPointF(0, 0))
+            anchor = self._drag_anchor + (offset.x(), offset.y())
+            shift = engine.snap_positions(anchor + (delta.x(), delta.y())) - anchor
+            target = self._drag_start + shift
+            if np.array_equal(target, self.positions[self.selected]):
+                return
+            self.set_pad_positions(self.selected, target)
+            return
+        delta = event.pos() - self._drag_origin
+        self._drag_origin = event.pos()
+        self.move_selected(delta.x(), delta.y())
+
+    def mouseReleaseEvent(self, event):
+        if self._drag_start is not None and self.scene() is not None:
+            # Cả lần kéo thành một bước hoàn tác
+            moved = self.positions[self._drag_rows]
+            if not np.array_equal(moved, self._drag_start):
+                record(self.scene(), PadFieldMoveCommand(self, self._drag_rows, self._drag_start, moved))
+        self._drag_origin = None
+        self._drag_rows = None
+        self._drag_start = None
+        self._drag_anchor = None
+
+    # --- Vẽ ---
+
+    def paint(self, painter, option, widget):
+        if not len(self.positions):
+            return
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        exposed = option.exposedRect
+        extents = self._extents()
+        x = self.positions[:, 0]
+        y = self.positions[:, 1]
+        visible = ((x + extents[:, 0] >= exposed.left()) & (x - extents[:, 0] <= exposed.right()) &
+                   (y + extents[:, 1] >= exposed.top()) & (y - extents[:, 1] <= exposed.bottom()))
+
+        full_detail = lod >= Pad.lod_full_detail and not Pad.draft_mode
+
+        if lod < Pad.lod_outline:
+            # Zoom rất nhỏ: mỗi pad là một điểm vuông, mỗi spec vẽ trong một lệnh
+            for index, spec in enumerate(self.specs):
+                indices = np.nonzero(visible & (self.spec_indices == index))[0]
+                if not indices.size:
+                    continue
+                brush = PAD_BRUSH if "top_copper" in spec.layers else PAD_BRUSH_INACTIVE
+                size = max(spec.width, spec.height) * PAD_SCALE
+                painter.setPen(QPen(brush, size, Qt.SolidLine, Qt.SquareCap))
+                painter.drawPoints(points_to_polygon(self.positions[indices]))
+        elif visible.any():
+            # Mỗi nhóm pad cùng spec trong một ô BATCH_CELL là vài path gộp sẵn, mỗi path một lệnh vẽ;
+            # nhóm được chọn theo các pad thấy được nhưng path chứa mọi pad của nhóm
+            keys = self._batch_keys()
+            groups = np.unique(keys[visible])
+            rows = np.nonzero(np.isin(keys, groups))[0]
+            rows = rows[np.argsort(keys[rows], kind="stable")]
+            starts = np.searchsorted(keys[rows], groups)
+            for key, group in zip(groups.tolist(), np.split(rows, starts[1:])):
+                spec = self.specs[key >> 40]
+                geometry = self.geometries[key >> 40]
+                brush = PAD_BRUSH if "top_copper" in spec.layers else PAD_BRUSH_INACTIVE
+                layers = [(PAD_PEN, brush)]
+                if full_detail and geometry.hole_path is not None:
+                    layers.append((HOLE_PEN, HOLE_BRUSH))
+                    if geometry.spoke_path is not None:
+                        layers.append((PAD_PEN, PAD_BRUSH))
+                for layer, (pen, layer_brush) in enumerate(layers):
+                    painter.setPen(pen)
+                    painter.setBrush(layer_brush)
+                    for path in self._batch_path(key, layer, group):
+                        painter.drawPath(path)
+
+        selected = np.nonzero(visible & self.selected)[0]
+        if selected.size:
+            painter.setPen(SELECTION_PEN if full_detail else QPen(SELECTION_PEN.color()))
+            painter.setBrush(Qt.NoBrush)
+            halves = np.array([(rect.width() / 2, rect.height() / 2)
+                               for rect in (geometry.outline_rect for geometry in self.geometries)])
+            halves = halves[self.spec_indices[selected]]
+            corners = self.positions[selected] - halves
+            painter.drawRects([QRectF(x, y, w, h) for (x, y), (w, h) in zip(corners.tolist(), (halves * 2).tolist())])
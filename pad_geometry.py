@@ -0,0 +1,100 @@
+# pad_geometry.py
+
+from PyQt5.QtGui import QPen, QBrush, QColor, QPainterPath
+from PyQt5.QtCore import QRectF, Qt
+
+PAD_SCALE = 10  # 1 mm = 10 đơn vị scene
+
+# Bảng bút/cọ cố định, dùng chung cho tất cả các pad
+PAD_PEN = QPen(QColor(0, 128, 0), 1)
+PAD_BRUSH = QBrush(QColor(0, 200, 0, 128))
+PAD_BRUSH_INACTIVE = QBrush(QColor(0, 100, 0, 64))
+HOLE_PEN = QPen(QColor(0, 0, 0), 1)
+HOLE_BRUSH = QBrush(QColor(255, 255, 255))
+SELECTION_PEN = QPen(QColor(255, 0, 0), 2, Qt.DashLine)
+
+
+class PadGeometry:
+    """Hình học đã dựng sẵn của một định nghĩa pad, dùng chung giữa các pad giống nhau"""
+
+    __slots__ = ("outline_rect", "pad_path", "hole_path", "spoke_path", "bounding_rect")
+
+    def __init__(self, key):
+        shape, width, height, corner_radius, hole_diameter, spoke_width = key
+        width *= PAD_SCALE
+        height *= PAD_SCALE
+        corner_radius *= PAD_SCALE
+        hole_diameter *= PAD_SCALE
+
+        self.outline_rect = QRectF(-width / 2, -height / 2, width, height)
+
+        self.pad_path = QPainterPath()
+        if shape == "Circle":
+            diameter = max(width, height)
+            self.pad_path.addEllipse(-diameter / 2, -diameter / 2, diameter, diameter)
+        elif shape == "Oval":
+            self.pad_path.addEllipse(self.outline_rect)
+        elif corner_radius > 0:
+            self.pad_path.addRoundedRect(self.outline_rect, corner_radius, corner_radius)
+        else:  # Rectangle, Custom - dùng hình chữ nhật
+            self.pad_path.addRect(self.outline_rect)
+
+        self.hole_path = None
+        self.spoke_path = None
+        if hole_diameter > 0:
+            self.hole_path = QPainterPath()
+            self.hole_path.addEllipse(-hole_diameter / 2, -hole_diameter / 2, hole_diameter, hole_diameter)
+
+            if spoke_width is not None:
+                # Bốn nan nhiệt (thermal spoke) ở 0, 90, 180, 270 độ
+                spoke_width *= PAD_SCALE
+                length = width / 2 - hole_diameter / 2
+                self.spoke_path = QPainterPath()
+                self.spoke_path.addRect(-width / 2, -spoke_width / 2, length, spoke_width)
+                self.spoke_path.addRect(width / 2 - length, -spoke_width / 2, length, spoke_width)
+                self.spoke_path.addRect(-spoke_width / 2, -width / 2, spoke_width, length)
+                self.spoke_path.addRect(-spoke_width / 2, width / 2 - length, spoke_width, length)
+
+        # Bao gồm cả nét vẽ và khung chọn
+        margin = SELECTION_PEN.widthF() / 2
+        rect = self.outline_rect.united(self.pad_path.boundingRect())
+        if self.spoke_path is not None:
+            rect = rect.united(self.spoke_path.boundingRect())
+        self.bounding_rect = rect.adjusted(-margin, -margin, margin, margin)
+
+
+_geometry_cache = {}
+
+
+def geometry_key(spec):
+    """
+    Trả về khóa cache cho một định nghĩa pad.
+    :param spec: PadSpec của pad.
+    """
+    hole_diameter = 0
+    spoke_width = None
+    if spec.is_tht and spec.hole_diameter > 0:
+        hole_diameter = spec.hole_diameter
+        if spec.thermal_enabled:
+            spoke_width = spec.spoke_width
+    return (spec.shape, spec.width, spec.height, spec.corner_radius, hole_diameter, spoke_width)
+
+
+def pad_geometry(spec):
+    """
+    Lấy hình học đã cache cho một định nghĩa pad, dựng mới nếu chưa có.
+    :param spec: PadSpec của pad.
+    """
+    key = geometry_key(spec)
+    geometry = _geometry_cache.get(key)
+    if geometry is None:
+        geometry = PadGeometry(key)
+        _geometry_cache[key] = geometry
+    return geometry
+
+
+def clear_geometry_cache():
+    """
+    Xóa toàn bộ cache hình học pad.
+    """
+    _geometry_cache.clear()
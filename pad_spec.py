@@ -0,0 +1,120 @@
+# pad_spec.py
+
+from dataclasses import dataclass, fields, replace
+from typing import FrozenSet
+
+PAD_LAYERS = ("top_copper", "bottom_copper", "top_mask", "bottom_mask", "top_paste", "bottom_paste")
+DEFAULT_LAYERS = frozenset({"top_copper", "top_mask", "top_paste"})
+
+
+@dataclass(frozen=True)
+class PadSpec:
+    """Định nghĩa pad bất biến, được intern để các pad giống nhau dùng chung một đối tượng"""
+
+    type: str = ""
+    shape: str = "Rectangle"
+    width: float = 1.5
+    height: float = 1.5
+    hole_diameter: float = 0.8
+    corner_radius: float = 0.0
+    layers: FrozenSet[str] = DEFAULT_LAYERS  # Tên các layer đang bật
+    thermal_enabled: bool = True
+    spoke_width: float = 0.3
+    gap_width: float = 0.2
+
+    @property
+    def is_tht(self) -> bool:
+        return "THT" in self.type
+
+    @staticmethod
+    def from_data(pad_data) -> "PadSpec":
+        """
+        Tạo (hoặc lấy lại) PadSpec từ dữ liệu pad dạng dict, điền giá trị mặc định.
+        :param pad_data: Dữ liệu pad (ví dụ từ PadEditor.apply_pad) hoặc một PadSpec.
+        """
+        if isinstance(pad_data, PadSpec):
+            return intern_spec(pad_data)
+
+        def number(key, default, source=pad_data):
+            value = source.get(key, default)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return default
+            return float(value)
+
+        layers = pad_data.get('layers')
+        if layers is None:
+            layers = DEFAULT_LAYERS
+        else:
+            layers = frozenset(name for name, enabled in layers.items() if enabled)
+
+        thermal = pad_data.get('thermal') or {}
+        return intern_spec(PadSpec(
+            type=pad_data.get('type', ''),
+            shape=pad_data.get('shape', 'Rectangle'),
+            width=number('width', 1.5),
+            height=number('height', 1.5),
+            hole_diameter=number('hole_diameter', 0.8),
+            corner_radius=number('corner_radius', 0.0),
+            layers=layers,
+            thermal_enabled=bool(thermal.get('enabled', True)),
+            spoke_width=number('spoke_width', 0.3, thermal),
+            gap_width=number('gap_width', 0.2, thermal),
+        ))
+
+    def with_changes(self, **changes) -> "PadSpec":
+        """
+        Trả về PadSpec mới (đã intern) với các trường thay đổi; spec hiện tại không bị sửa.
+        """
+        return intern_spec(replace(self, **changes))
+
+    def to_data(self) -> dict:
+        """
+        Chuyển về dạng dict như PadEditor.apply_pad.
+        """
+        layers = {name: name in self.layers for name in PAD_LAYERS}
+        layers.update({name: True for name in self.layers if name not in layers})
+        return {
+            'type': self.type,
+            'shape': self.shape,
+            'width': self.width,
+            'height': self.height,
+            'hole_diameter': self.hole_diameter,
+            'corner_radius': self.corner_radius,
+            'layers': layers,
+            'thermal': {
+                'enabled': self.thermal_enabled,
+                'spoke_width': self.spoke_width,
+                'gap_width': self.gap_width
+            }
+        }
+
+
+def spec_changes(old: PadSpec, new: PadSpec) -> dict:
+    """
+    Các trường khác nhau giữa hai PadSpec, dạng {tên trường: giá trị của new} (dùng cho PadSpec.with_changes).
+    """
+    return {field.name: getattr(new, field.name) for field in fields(PadSpec)
+            if getattr(old, field.name) != getattr(new, field.name)}
+
+
+_spec_table = {}
+
+
+def intern_spec(spec: PadSpec) -> PadSpec:
+    """
+    Kiểm tra và intern một PadSpec: các spec bằng nhau trả về cùng một đối tượng.
+    :param spec: PadSpec cần intern.
+    """
+    shared = _spec_table.get(spec)
+    if shared is not None:
+        return shared
+
+    if spec.width <= 0 or spec.height <= 0:
+        raise ValueError(f"Kích thước pad phải dương (width={spec.width}, height={spec.height}).")
+    if spec.hole_diameter < 0 or spec.corner_radius < 0:
+        raise ValueError("Đường kính lỗ và bán kính góc không được âm.")
+    if spec.thermal_enabled and (spec.spoke_width < 0 or spec.gap_width < 0):
+        raise ValueError("Thông số thermal relief không được âm.")
+
+    _spec_table[spec] = spec
+    return spec
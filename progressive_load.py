@@ -0,0 +1,219 @@
+# progressive_load.py
+
+import queue
+import threading
+import time
+
+import numpy as np
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from project_file import NO_FIELD, ProjectData, project_slice, load_project, add_project_items, apply_project
+from scene_batch import bulk_update
+from undo_stack import undo_stack, set_undo_stack
+
+LOAD_BATCH_COST = 200  # Chi phí lô ban đầu: một Pad item hoặc hình vẽ tính 1 (sau đó chỉnh theo thời gian dựng đo được)
+LOAD_BATCH_COST_RANGE = (20, 5000)  # Giới hạn của chi phí lô khi tự chỉnh
+LOAD_BATCH_FILL = 0.5  # Một lô nên dựng trong khoảng nửa lượt, để lượt không bị kéo dài quá nhiều
+FIELD_ROW_COST = 0.02  # Pad của PadField được dựng theo mảng nên rẻ hơn nhiều
+LOAD_SLICE_MS = 12  # Thời gian tối đa luồng GUI dựng đối tượng mỗi lượt; phần còn lại để vẽ và nhận chuột
+LOAD_QUEUE_BATCHES = 8  # Số lô chờ tối đa: giới hạn bộ nhớ khi luồng GUI chậm hơn luồng đọc
+
+
+def row_anchors(data: ProjectData) -> np.ndarray:
+    """
+    Một điểm đại diện (N, 2) cho mỗi hàng: tâm pad, rồi với hình vẽ là đầu đoạn thẳng,
+    góc hình chữ nhật/ellipse hoặc đỉnh đầu tiên của đường.
+    """
+    shapes = data.shapes
+    anchors = shapes["geometry"][:, :2].copy()
+    with_points = shapes["count"] > 0
+    if with_points.any():
+        anchors[with_points] = data.points[shapes["start"][with_points]]
+    return np.concatenate([data.pads["pos"], anchors]).reshape(-1, 2)
+
+
+def load_order(anchors: np.ndarray, rect):
+    """
+    Thứ tự dựng các hàng: hàng nằm trong rect trước, rồi theo khoảng cách tới tâm rect.
+    :param rect: (x1, y1, x2, y2) vùng scene đang hiển thị, hoặc None để giữ thứ tự của file.
+    :return: (thứ tự, số hàng nằm trong rect).
+    """
+    if rect is None:
+        return np.arange(len(anchors)), 0
+    x1, y1, x2, y2 = rect
+    x, y = anchors[:, 0], anchors[:, 1]
+    inside = (x >= x1) & (x <= x2) & (y >= y1) & (y <= y2)
+    distance = (x - (x1 + x2) / 2) ** 2 + (y - (y1 + y2) / 2) ** 2
+    return np.lexsort((distance, ~inside)), int(inside.sum())
+
+
+def batch_end(total: np.ndarray, start: int, batch_cost: float = LOAD_BATCH_COST) -> int:
+    """
+    Điểm cắt của lô bắt đầu ở hàng `start`, có tổng chi phí khoảng batch_cost (ít nhất một hàng).
+    :param total: Tổng tích lũy chi phí của các hàng (np.cumsum).
+    """
+    base = total[start - 1] if start else 0.0
+    return max(int(np.searchsorted(total, base + batch_cost, side="right")), start + 1)
+
+
+class ProgressiveLoader(QObject):
+    """
+    Mở project theo từng phần: luồng nền đọc file (mmap), sắp các hàng theo vùng đang hiển thị của view
+    và cắt thành lô; luồng GUI dựng từng lô trong tối đa LOAD_SLICE_MS mỗi lượt của vòng lặp sự kiện,
+    nên vùng đang xem có ngay và cửa sổ vẫn dùng được trong khi phần còn lại của board được nạp.
+    Kích thước lô được chỉnh theo thời gian dựng đo được, để một lô không chiếm quá một lượt.
+    Pad của một PadField được nối dần vào cùng một PadField.
+    """
+
+    progress = pyqtSignal(int, int)  # (số đối tượng đã dựng, tổng số)
+    design_cleared = pyqtSignal()  # Thiết kế trước vừa bị xóa để dựng file (đã đọc được header)
+    visible_loaded = pyqtSignal()  # Vùng đang hiển thị đã được dựng xong
+    finished = pyqtSignal(int)  # Đã dựng xong toàn bộ (số đối tượng)
+    failed = pyqtSignal(str)
+
+    def __init__(self, layer_manager, drawing_app=None, view=None, slice_ms=LOAD_SLICE_MS, parent=None):
+        """
+        :param view: View dùng để xác định vùng dựng trước (None: dựng theo thứ tự của file).
+        :param slice_ms: Thời gian tối đa dựng đối tượng mỗi lượt trên luồng GUI.
+        """
+        super().__init__(parent)
+        self.layer_manager = layer_manager
+        self.drawing_app = drawing_app
+        self.view = view
+        self.slice_ms = float(slice_ms)
+        self.batch_cost = float(LOAD_BATCH_COST)  # Luồng GUI chỉnh, luồng đọc dùng khi cắt lô tiếp theo
+        self.path = None
+        self.total = 0
+        self.loaded = 0
+        self.items = []  # Các item đã tạo, theo thứ tự dựng
+        self._fields = {}  # Chỉ số field trong file -> PadField đã tạo
+        self._queue = queue.Queue(LOAD_QUEUE_BATCHES)
+        self._cancelled = threading.Event()
+        self._thread = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._build)
+
+    def is_loading(self) -> bool:
+        return self._timer.isActive()
+
+    def load(self, path):
+        """
+        Bắt đầu nạp file; thiết kế hiện tại được thay khi luồng đọc có header của file.
+        """
+        self.path = path
+        rect = None
+        if self.view is not None:
+            visible = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+            rect = (visible.left(), visible.top(), visible.right(), visible.bottom())
+        self._thread = threading.Thread(target=self._read, args=(path, rect), name="ProjectLoader", daemon=True)
+        self._thread.start()
+        self._timer.start()
+
+    def cancel(self):
+        """
+        Dừng nạp (các đối tượng đã dựng vẫn ở lại scene).
+        """
+        self._cancelled.set()
+        self._timer.stop()
+        while True:  # Giải phóng luồng đọc nếu nó đang chờ chỗ trong hàng đợi
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+    # --- Luồng đọc ---
+
+    def _put(self, message) -> bool:
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read(self, path, rect):
+        try:
+            data = load_project(path)
+            if not self._put(("header", data, len(data))):
+                return
+            pads = len(data.pads)
+            anchors = row_anchors(data)
+            order, visible = load_order(anchors, rect)
+            costs = np.ones(len(order))
+            costs[order < pads] = np.where(data.pads["field"][order[order < pads]] == NO_FIELD, 1.0, FIELD_ROW_COST)
+            # Vùng đang hiển thị được cắt lô riêng để biết khi nào nó đã được dựng xong
+            if not (self._put_batches(data, order[:visible], costs[:visible], pads)
+                    and self._put(("visible", None, None))
+                    and self._put_batches(data, order[visible:], costs[visible:], pads)):
+                return
+            self._put(("done", None, None))
+        except Exception as e:
+            self._put(("error", str(e), None))
+
+    def _put_batches(self, data, order, costs, pads) -> bool:
+        # Hàng < pads là pad, còn lại là hình vẽ (chỉ số hàng + pads)
+        total = np.cumsum(costs)
+        start = 0
+        while start < len(order):
+            end = batch_end(total, start, self.batch_cost)
+            rows = order[start:end]
+            cost = float(total[end - 1] - (total[start - 1] if start else 0.0))
+            if not self._put(("batch", project_slice(data, rows[rows < pads], rows[rows >= pads] - pads), cost)):
+                return False
+            start = end
+        return True
+
+    # --- Luồng GUI ---
+
+    def _build(self):
+        # Dựng các lô đang chờ cho tới khi hết thời gian của lượt này
+        start = time.perf_counter()
+        while (time.perf_counter() - start) * 1000 < self.slice_ms:
+            try:
+                kind, payload, extra = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if kind == "header":
+                self.total = extra
+                self._apply_layers(payload)
+                self.design_cleared.emit()
+                self.progress.emit(0, self.total)
+            elif kind == "batch":
+                # Chỉ vẽ lại vùng của các item mới (phần lớn nằm ngoài vùng đang xem), không cả scene
+                tick = time.perf_counter()
+                with bulk_update(self.layer_manager.scene, update_scene=False):
+                    add_project_items(payload, self.layer_manager, self.drawing_app, self.items, self._fields)
+                self._tune_batch_cost((time.perf_counter() - tick) * 1000, extra)
+                self.loaded += len(payload)
+                self.progress.emit(self.loaded, self.total)
+            elif kind == "visible":
+                self.visible_loaded.emit()
+            elif kind == "done":
+                self._timer.stop()
+                self.finished.emit(self.loaded)
+                return
+            else:
+                self._timer.stop()
+                self.failed.emit(payload)
+                return
+
+    def _tune_batch_cost(self, elapsed_ms, cost):
+        # Chi phí lô để một lô dựng trong khoảng LOAD_BATCH_FILL lượt; trung bình trượt để một lô bất thường
+        # (ví dụ lô đầu phải dựng index) không làm lệch kích thước các lô sau
+        target = cost * self.slice_ms * LOAD_BATCH_FILL / max(elapsed_ms, 0.1)
+        low, high = LOAD_BATCH_COST_RANGE
+        self.batch_cost = min(max(0.7 * self.batch_cost + 0.3 * target, low), high)
+
+    def _apply_layers(self, data):
+        # Xóa thiết kế hiện tại và áp dụng bảng layer của file (không ghi vào lịch sử hoàn tác)
+        layers = ProjectData()
+        layers.layers = data.layers
+        scene = self.layer_manager.scene
+        stack = undo_stack(scene)
+        set_undo_stack(scene, None)
+        try:
+            apply_project(layers, self.layer_manager, self.drawing_app)
+        finally:
+            set_undo_stack(scene, stack)
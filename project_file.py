@@ -0,0 +1,436 @@
+# project_file.py
+
+import json
+import mmap
+
+import numpy as np
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QGraphicsLineItem, QGraphicsRectItem, QGraphicsEllipseItem, QGraphicsPathItem
+from PyQt5.QtGui import QPen, QColor, QPainterPath
+
+from pad import Pad
+from pad_spec import PadSpec
+from pad_field import PadField, points_to_polygon
+from trace_item import TraceItem
+from layer_manager import (LayerItem, LayerStyled, LayerLineItem, LayerRectItem, LayerEllipseItem, LayerPathItem,
+                           LayerRegionItem)
+from scene_batch import bulk_update
+from setting_manager import write_file_atomic
+
+# Bố cục file: PROJECT_MAGIC, độ dài header (uint64), header JSON (bảng layer, PadSpec, bút và vị trí
+# các mảng), rồi dữ liệu thô của từng mảng NumPy, căn theo ALIGNMENT để đọc thẳng qua mmap
+PROJECT_MAGIC = b"PCBPROJ1"
+PROJECT_VERSION = 1
+PROJECT_FILTER = "PCB Project (*.pcbp)"
+ALIGNMENT = 64
+
+NO_LAYER = -1  # Item gốc của DrawingApp, không thuộc layer nào của LayerManager
+NO_FIELD = -1  # Pad là một Pad item riêng, không thuộc PadField
+LAYER_PEN = -1  # Hình vẽ bằng bút của layer cha
+
+SHAPE_LINE = 1  # geometry = (x1, y1, x2, y2)
+SHAPE_RECT = 2  # geometry = (x, y, rộng, cao)
+SHAPE_ELLIPSE = 3  # geometry = (x, y, rộng, cao)
+SHAPE_TRACE = 4  # Đường mạch: các đỉnh points[start:start + count]
+SHAPE_PATH = 5  # Một polyline của QGraphicsPathItem (đường cong được làm phẳng)
+SHAPE_REGION = 6  # Một đường bao của LayerRegionItem (vùng tô kín bằng màu layer)
+
+PAD_DTYPE = np.dtype([("pos", "<f8", (2,)), ("spec", "<u4"), ("layer", "<i2"), ("field", "<i4")])
+SHAPE_DTYPE = np.dtype([
+    ("kind", "u1"), ("layer", "<i2"), ("pen", "<i4"), ("geometry", "<f8", (4,)), ("start", "<u8"), ("count", "<u4")
+])
+ARRAY_DTYPES = {"pads": PAD_DTYPE, "shapes": SHAPE_DTYPE, "points": np.dtype("<f8")}
+
+
+class ProjectData:
+    """
+    Nội dung một project dạng cột: bảng layer, bảng PadSpec và bút dùng chung (không lặp lại
+    cho từng đối tượng), cùng các mảng cấu trúc NumPy cho pad, hình vẽ và đỉnh đường mạch.
+    Khi đọc bằng load_project, các mảng là view trên file đã mmap (không sao chép).
+    """
+
+    def __init__(self):
+        self.layers = []  # [{"name", "color", "z", "opacity"}], chỉ số là layer id
+        self.specs = []  # PadSpec dùng chung, chỉ số là pads["spec"]
+        self.pens = []  # [(màu ARGB, độ rộng)], chỉ số là shapes["pen"]
+        self.fields = 0  # Số PadField; pads["field"] là chỉ số PadField hoặc NO_FIELD
+        self.pads = np.zeros(0, dtype=PAD_DTYPE)
+        self.shapes = np.zeros(0, dtype=SHAPE_DTYPE)
+        self.points = np.zeros((0, 2), dtype=np.float64)
+
+    def __len__(self):
+        return len(self.pads) + len(self.shapes)
+
+
+def collect_items(data: ProjectData, groups, items=None):
+    """
+    Thêm các item vào ProjectData (bảng PadSpec và bút được dùng chung, không lặp lại).
+    :param groups: Danh sách (layer id, các item) với layer id là chỉ số trong data.layers hoặc NO_LAYER.
+    :param items: Nếu có, nhận các item theo đúng thứ tự add_project_items tạo lại chúng:
+        Pad theo hàng, rồi PadField theo chỉ số, rồi hình vẽ theo hàng (một item có thể chiếm nhiều hàng).
+    """
+    spec_ids = {id(spec): index for index, spec in enumerate(data.specs)}  # PadSpec được intern: so theo id
+    pen_ids = {pen: index for index, pen in enumerate(data.pens)}
+
+    def spec_id(spec):
+        index = spec_ids.get(id(spec))
+        if index is None:
+            index = spec_ids[id(spec)] = len(data.specs)
+            data.specs.append(spec)
+        return index
+
+    def pen_id(pen):
+        key = (pen.color().rgba(), pen.widthF())
+        index = pen_ids.get(key)
+        if index is None:
+            index = pen_ids[key] = len(data.pens)
+            data.pens.append(key)
+        return index
+
+    pad_rows = []  # (x, y, spec, layer) của các Pad item
+    field_rows = []  # Mảng PAD_DTYPE của từng PadField
+    shape_rows = []  # (kind, layer, pen, geometry, start, count)
+    pad_items, field_items, shape_items = [], [], []
+    point_chunks = [data.points]
+    point_count = len(data.points)
+    for layer_id, group in groups:
+        for item in group:
+            offset = item.pos()
+            dx, dy = offset.x(), offset.y()
+            if isinstance(item, Pad):
+                pad_rows.append((dx, dy, spec_id(item.spec), layer_id))
+                pad_items.append(item)
+            elif isinstance(item, PadField):
+                if not len(item):
+                    continue
+                table = np.array([spec_id(spec) for spec in item.specs], dtype=np.uint32)
+                rows = np.zeros(len(item), dtype=PAD_DTYPE)
+                rows["pos"] = item.positions + (dx, dy)
+                rows["spec"] = table[item.spec_indices]
+                rows["layer"] = layer_id
+                rows["field"] = data.fields
+                data.fields += 1
+                field_rows.append(rows)
+                field_items.append(item)
+            elif isinstance(item, TraceItem):
+                pen = LAYER_PEN if item.pen is None else pen_id(item.pen)
+                shape_rows.append((SHAPE_TRACE, layer_id, pen, (0, 0, 0, 0), point_count, len(item.points)))
+                shape_items.append(item)
+                point_chunks.append(item.points + (dx, dy))
+                point_count += len(item.points)
+            elif isinstance(item, (QGraphicsLineItem, QGraphicsRectItem, QGraphicsEllipseItem, QGraphicsPathItem)):
+                pen = LAYER_PEN if isinstance(item, LayerStyled) else pen_id(item.pen())
+                if isinstance(item, QGraphicsLineItem):
+                    line = item.line().translated(dx, dy)
+                    shape_rows.append((SHAPE_LINE, layer_id, pen, (line.x1(), line.y1(), line.x2(), line.y2()), 0, 0))
+                    shape_items.append(item)
+                elif isinstance(item, QGraphicsPathItem):
+                    kind = SHAPE_REGION if isinstance(item, LayerRegionItem) else SHAPE_PATH
+                    for polygon in item.path().toSubpathPolygons():
+                        points = np.array([(point.x() + dx, point.y() + dy) for point in polygon]).reshape(-1, 2)
+                        shape_rows.append((kind, layer_id, pen, (0, 0, 0, 0), point_count, len(points)))
+                        shape_items.append(item)
+                        point_chunks.append(points)
+                        point_count += len(points)
+                else:
+                    rect = item.rect().translated(dx, dy)
+                    kind = SHAPE_RECT if isinstance(item, QGraphicsRectItem) else SHAPE_ELLIPSE
+                    shape_rows.append((kind, layer_id, pen, (rect.x(), rect.y(), rect.width(), rect.height()), 0, 0))
+                    shape_items.append(item)
+
+    pads = np.zeros(len(pad_rows), dtype=PAD_DTYPE)
+    if pad_rows:
+        columns = np.array(pad_rows, dtype=np.float64)
+        pads["pos"] = columns[:, :2]
+        pads["spec"] = columns[:, 2]
+        pads["layer"] = columns[:, 3]
+        pads["field"] = NO_FIELD
+    data.pads = np.concatenate([data.pads, pads] + field_rows)
+    data.shapes = np.concatenate([data.shapes, np.array(shape_rows, dtype=SHAPE_DTYPE)])
+    data.points = np.concatenate(point_chunks).reshape(-1, 2)
+    if items is not None:
+        items.extend(pad_items + field_items + shape_items)
+    return data
+
+
+def project_groups(layer_manager, drawing_app=None):
+    """
+    Bảng layer của thiết kế hiện tại và các nhóm item cần gom.
+    :return: (ProjectData chỉ có bảng layer, danh sách (layer id, các item) cho collect_items).
+    """
+    data = ProjectData()
+    groups = []
+    for layer_id, layer in enumerate(layer_manager.layers.values()):
+        data.layers.append({"name": layer.name, "color": layer.color.name(QColor.HexArgb),
+                            "z": layer.zValue(), "opacity": layer.opacity()})
+        groups.append((layer_id, layer.items))
+    if drawing_app is not None:
+        groups.append((NO_LAYER, drawing_app.layers[0]))
+    return data, groups
+
+
+def collect_project(layer_manager, drawing_app=None, items=None) -> ProjectData:
+    """
+    Gom thiết kế hiện tại thành ProjectData: các item trên layer của LayerManager và các hình
+    gốc của DrawingApp. Item không thuộc loại được hỗ trợ bị bỏ qua.
+    :param items: Nếu có, nhận các item theo thứ tự apply_project tạo lại chúng (xem collect_items).
+    """
+    data, groups = project_groups(layer_manager, drawing_app)
+    return collect_items(data, groups, items)
+
+
+def concat_projects(parts) -> ProjectData:
+    """
+    Ghép các ProjectData dùng chung bảng layer, PadSpec và bút (các phần của một lần gom theo lô) thành một.
+    Chỉ số đỉnh của đường mạch được dời theo mảng đỉnh đã ghép.
+    """
+    data = ProjectData()
+    data.layers, data.specs, data.pens = parts[0].layers, parts[0].specs, parts[0].pens
+    data.fields = max(part.fields for part in parts)
+    shapes = []
+    start = 0
+    for part in parts:
+        rows = part.shapes.copy()
+        rows["start"][rows["count"] > 0] += start
+        shapes.append(rows)
+        start += len(part.points)
+    data.pads = np.concatenate([data.pads] + [part.pads for part in parts])
+    data.shapes = np.concatenate([data.shapes] + shapes)
+    data.points = np.concatenate([data.points] + [part.points for part in parts]).reshape(-1, 2)
+    return data
+
+
+def encode_blob(header: dict, arrays: dict, start: int = 0, alignment: int = ALIGNMENT):
+    """
+    Mã hóa header JSON và các mảng NumPy thành danh sách khối bytes:
+    độ dài header (uint64), header (kèm kiểu, kích thước và vị trí từng mảng), rồi dữ liệu thô các mảng.
+    :param start: Vị trí của khối trong file; các mảng được căn theo `alignment` tính từ đầu file.
+    """
+    header = dict(header, arrays={})
+    chunks = []
+    offset = 0  # Tính từ đầu phần dữ liệu (ngay sau header, đã căn lề)
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        header["arrays"][name] = {
+            "dtype": np.lib.format.dtype_to_descr(array.dtype), "shape": list(array.shape), "offset": offset
+        }
+        padding = -array.nbytes % alignment
+        chunks += [array, bytes(padding)]
+        offset += array.nbytes + padding
+    text = json.dumps(header).encode("utf-8")
+    prefix = len(text).to_bytes(8, "little") + text
+    prefix += bytes(-(start + len(prefix)) % alignment)
+    return [prefix] + chunks
+
+
+def decode_blob(buffer, start: int = 0, alignment: int = ALIGNMENT):
+    """
+    Đọc một khối của encode_blob. Các mảng là view trên buffer (không sao chép).
+    :return: (header, {tên: mảng}).
+    """
+    length = int.from_bytes(buffer[start:start + 8], "little")
+    header = json.loads(bytes(buffer[start + 8:start + 8 + length]).decode("utf-8"))
+    base = start + 8 + length
+    base += -base % alignment
+    arrays = {}
+    for name, info in header.pop("arrays").items():
+        shape = tuple(info["shape"])
+        array = np.frombuffer(buffer, dtype=np.lib.format.descr_to_dtype(info["dtype"]),
+                              count=int(np.prod(shape)), offset=base + info["offset"])
+        arrays[name] = array.reshape(shape)
+    return header, arrays
+
+
+def project_slice(data: ProjectData, pad_rows, shape_rows) -> ProjectData:
+    """
+    Một phần của ProjectData: các hàng pad và hình vẽ đã chọn, dùng chung bảng layer, PadSpec, bút
+    và mảng đỉnh (không sao chép) với data.
+    """
+    part = ProjectData()
+    part.layers = data.layers
+    part.specs = data.specs
+    part.pens = data.pens
+    part.fields = data.fields
+    part.pads = data.pads[pad_rows]
+    part.shapes = data.shapes[shape_rows]
+    part.points = data.points
+    return part
+
+
+def project_blob(data: ProjectData):
+    """
+    Header và các mảng của một ProjectData, để ghi bằng encode_blob.
+    """
+    header = {
+        "version": PROJECT_VERSION,
+        "layers": data.layers,
+        "specs": [spec.to_data() for spec in data.specs],
+        "pens": [list(pen) for pen in data.pens],
+        "fields": data.fields,
+    }
+    arrays = {name: np.asarray(getattr(data, name), dtype=dtype) for name, dtype in ARRAY_DTYPES.items()}
+    return header, arrays
+
+
+def project_from_blob(header: dict, arrays: dict) -> ProjectData:
+    """
+    Dựng ProjectData từ header và các mảng đã giải mã (kiểm tra phiên bản và kiểu dữ liệu).
+    """
+    if header.get("version") != PROJECT_VERSION:
+        raise ValueError(f"Phiên bản project {header.get('version')} không được hỗ trợ.")
+    data = ProjectData()
+    data.layers = header["layers"]
+    data.specs = [PadSpec.from_data(spec) for spec in header["specs"]]
+    data.pens = [tuple(pen) for pen in header["pens"]]
+    data.fields = header["fields"]
+    for name, dtype in ARRAY_DTYPES.items():
+        if name not in arrays or arrays[name].dtype != dtype:
+            raise ValueError(f"Mảng '{name}' có kiểu dữ liệu không được hỗ trợ.")
+        setattr(data, name, arrays[name])
+    return data
+
+
+def save_project(path, data: ProjectData):
+    """
+    Ghi project ra file (nguyên tử: file cũ vẫn nguyên nếu ghi lỗi giữa chừng).
+    """
+    header, arrays = project_blob(data)
+    write_file_atomic(path, [PROJECT_MAGIC] + encode_blob(header, arrays, start=len(PROJECT_MAGIC)))
+
+
+def load_project(path) -> ProjectData:
+    """
+    Mở file project bằng mmap. Chỉ header JSON nhỏ được phân tích; các mảng là view trên
+    vùng nhớ ánh xạ nên thời gian đọc gần như không phụ thuộc số đối tượng.
+    File được ánh xạ cho tới khi ProjectData (và các mảng của nó) không còn được dùng.
+    """
+    with open(path, "rb") as file:
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError(f"'{path}' không phải file project.")  # File rỗng
+    if buffer[:len(PROJECT_MAGIC)] != PROJECT_MAGIC:
+        raise ValueError(f"'{path}' không phải file project.")
+    return project_from_blob(*decode_blob(buffer, len(PROJECT_MAGIC)))
+
+
+def shape_item(kind, pen, geometry, points):
+    """
+    Tạo item cho một hàng của bảng hình vẽ.
+    :param pen: QPen, hoặc None để vẽ bằng bút của layer (item LayerStyled).
+    :param points: Các đỉnh (N, 2) với SHAPE_TRACE, SHAPE_PATH và SHAPE_REGION.
+    """
+    if kind == SHAPE_TRACE:
+        return TraceItem(points, pen)
+    if kind == SHAPE_LINE:
+        item = QGraphicsLineItem(*geometry) if pen is not None else LayerLineItem(*geometry)
+    elif kind == SHAPE_RECT:
+        item = QGraphicsRectItem(*geometry) if pen is not None else LayerRectItem(*geometry)
+    elif kind == SHAPE_ELLIPSE:
+        item = QGraphicsEllipseItem(*geometry) if pen is not None else LayerEllipseItem(*geometry)
+    elif kind == SHAPE_PATH:
+        path = QPainterPath()
+        path.addPolygon(points_to_polygon(points))
+        item = QGraphicsPathItem(path) if pen is not None else LayerPathItem(path)
+    elif kind == SHAPE_REGION:
+        path = QPainterPath()
+        path.setFillRule(Qt.WindingFill)
+        path.addPolygon(points_to_polygon(points))
+        path.closeSubpath()
+        return LayerRegionItem(path)  # Vùng luôn vẽ bằng màu của layer
+    else:
+        raise ValueError(f"Loại hình vẽ {kind} không được hỗ trợ.")
+    if pen is not None:
+        item.setPen(pen)
+    return item
+
+
+def add_project_items(data: ProjectData, layer_manager, drawing_app=None, items=None, fields=None) -> int:
+    """
+    Tạo các đối tượng của ProjectData và thêm vào layer theo tên (data.layers), trong một lần cập nhật scene.
+    Pad item riêng được tạo lại thành Pad, pad của PadField thành PadField (sao chép khỏi file).
+    :param items: Nếu có, nhận các item đã tạo theo thứ tự của collect_items.
+    :param fields: Nếu có, {chỉ số field: PadField} của các lô trước (nạp từng phần): pad của field
+        đã có được nối vào field đó, field mới được thêm vào dict.
+    :return: Số đối tượng đã tạo.
+    """
+    pens = [QPen(QColor.fromRgba(color), width) for color, width in data.pens]
+    names = [layer["name"] for layer in data.layers]
+    groups = {}  # layer id -> các item cần thêm
+    created = []
+
+    pads = data.pads
+    standalone = pads[pads["field"] == NO_FIELD]
+    pad_items = []
+    for (x, y), spec, layer_id in zip(standalone["pos"].tolist(), standalone["spec"].tolist(),
+                                      standalone["layer"].tolist()):
+        pad = Pad(data.specs[spec])
+        pad.setPos(x, y)
+        groups.setdefault(layer_id, []).append(pad)
+        pad_items.append(pad)
+    created += pad_items
+    # Gom pad theo field một lần (sắp xếp ổn định giữ thứ tự pad trong field) rồi cắt từng nhóm
+    field_ids = pads["field"]
+    in_field = np.flatnonzero(field_ids != NO_FIELD)
+    in_field = in_field[np.argsort(field_ids[in_field], kind="stable")]
+    indices, starts = np.unique(field_ids[in_field], return_index=True)
+    for index, group in zip(indices.tolist(), np.split(in_field, starts[1:])):
+        rows = pads[group]
+        field = fields.get(index) if fields is not None else None
+        if field is not None:
+            field.append_pads(data.specs, rows["spec"], rows["pos"])
+            layer = field.parentItem()
+            if isinstance(layer, LayerItem):
+                layer.item_moved(field)
+            continue
+        field = PadField()
+        field.set_pads(data.specs, rows["spec"], rows["pos"])
+        groups.setdefault(int(rows["layer"][0]), []).append(field)
+        created.append(field)
+        if fields is not None:
+            fields[index] = field
+
+    shapes = data.shapes
+    for kind, layer_id, pen, geometry, start, count in zip(
+            shapes["kind"].tolist(), shapes["layer"].tolist(), shapes["pen"].tolist(),
+            shapes["geometry"].tolist(), shapes["start"].tolist(), shapes["count"].tolist()):
+        item = shape_item(kind, pens[pen] if pen != LAYER_PEN else None, geometry,
+                          data.points[start:start + count])
+        groups.setdefault(layer_id, []).append(item)
+        created.append(item)
+
+    with bulk_update(layer_manager.scene):
+        for layer_id, group in groups.items():
+            if layer_id != NO_LAYER:
+                layer_manager.add_items_to_layer(names[layer_id], group)
+            elif drawing_app is not None:
+                drawing_app.add_shapes(group)
+    if drawing_app is not None:
+        drawing_app.pads = getattr(drawing_app, "pads", []) + pad_items
+    if items is not None:
+        items.extend(created)
+    return len(data)
+
+
+def apply_project(data: ProjectData, layer_manager, drawing_app=None, items=None) -> int:
+    """
+    Thay thiết kế hiện tại bằng nội dung project, trong một lần cập nhật scene.
+    :param items: Nếu có, nhận các item đã tạo theo thứ tự của collect_items.
+    :return: Số đối tượng đã tạo.
+    """
+    with bulk_update(layer_manager.scene):
+        for name in list(layer_manager.layers):
+            layer_manager.clear_layer(name)
+        if drawing_app is not None:
+            drawing_app.remove_shapes(list(drawing_app.layers[0]))
+            drawing_app.pads = []
+
+        for layer in data.layers:
+            name = layer["name"]
+            if name not in layer_manager.layers:
+                layer_manager.add_layer(name, QColor(layer["color"]), layer["z"])
+            else:
+                layer_manager.set_layer_color(name, QColor(layer["color"]))
+                layer_manager.set_layer_z_index(name, layer["z"])
+            layer_manager.set_layer_opacity(name, layer["opacity"])
+        return add_project_items(data, layer_manager, drawing_app, items)
@@ -0,0 +1,146 @@
+# scene_batch.py
+
+from PyQt5.QtWidgets import QGraphicsScene, QGraphicsItem
+
+
+class SceneBatch:
+    """
+    Gom nhiều thao tác thêm/xóa item vào một lần cập nhật scene.
+
+    Trong batch, tín hiệu của scene bị chặn và các view không vẽ lại. Khi kết thúc,
+    các item được thêm/xóa một lượt; BSP index của Qt chỉ được dựng lại một lần ở lần
+    truy vấn tiếp theo và mỗi view chỉ vẽ lại một lần.
+
+    Dùng:
+        with bulk_update(scene) as batch:
+            for item in items:
+                batch.add_item(item)
+
+    Nếu khối `with` gặp lỗi, các thao tác đã xếp hàng vẫn được áp dụng rồi lỗi mới được ném tiếp: nơi gọi
+    (LayerManager, DrawingApp, lịch sử hoàn tác) cập nhật sổ sách của mình ngay khi xếp hàng chứ không đợi batch
+    kết thúc, nên bỏ hàng đợi sẽ để lại item có trong layer và chỉ mục nhưng không có trong scene. Nơi gọi cần
+    hoàn tác phần đã làm thì tự ghi lại (ví dụ GerberImporter ghi phần đã nhập thành một bước hoàn tác).
+    """
+
+    def __init__(self, scene: QGraphicsScene, update_scene: bool = True):
+        """
+        :param update_scene: False để bỏ lần vẽ lại toàn scene khi kết thúc; Qt vẫn vẽ lại vùng của từng item
+            đã thêm/xóa (dùng khi phần lớn item nằm ngoài vùng đang xem, ví dụ nạp project từng phần).
+        """
+        self.scene = scene
+        self.update_scene = update_scene
+        self._operations = []  # Danh sách (True = thêm / False = xóa, item, item cha) theo thứ tự
+        self._depth = 0
+        self._signals_blocked = False
+        self._viewports = []
+
+    def add_item(self, item: QGraphicsItem, parent: QGraphicsItem = None):
+        """
+        Thêm item vào scene khi batch kết thúc.
+        :param parent: Item cha (ví dụ LayerItem); None để thêm như item gốc.
+        """
+        self._operations.append((True, item, parent))
+
+    def remove_item(self, item: QGraphicsItem):
+        """
+        Xóa item khỏi scene khi batch kết thúc.
+        """
+        self._operations.append((False, item, None))
+
+    def add_items(self, items, parent: QGraphicsItem = None):
+        self._operations.extend((True, item, parent) for item in items)
+
+    def remove_items(self, items):
+        self._operations.extend((False, item, None) for item in items)
+
+    def __enter__(self):
+        self._depth += 1
+        if self._depth == 1:
+            self.scene._active_batch = self
+            self._signals_blocked = self.scene.blockSignals(True)
+            # Bật lại updatesEnabled luôn vẽ lại cả viewport, nên chỉ tắt khi vẫn sẽ vẽ lại toàn scene
+            self._viewports = [view.viewport() for view in self.scene.views()
+                               if self.update_scene and view.viewport().updatesEnabled()]
+            for viewport in self._viewports:
+                viewport.setUpdatesEnabled(False)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        if self._depth > 0:
+            return False
+        try:
+            self._commit()  # Cả khi có lỗi: xem docstring của lớp
+        finally:
+            self.scene._active_batch = None
+            self.scene.blockSignals(self._signals_blocked)
+            for viewport in self._viewports:
+                viewport.setUpdatesEnabled(True)
+            self._viewports = []
+            if self.update_scene:
+                self.scene.update()
+        return False
+
+    def _commit(self):
+        operations, self._operations = self._operations, []
+        start = 0
+        while start < len(operations):
+            adding = operations[start][0]
+            end = start
+            while end < len(operations) and operations[end][0] == adding:
+                end += 1
+            run = operations[start:end]
+            if adding:
+                for _, item, parent in run:
+                    if parent is not None:
+                        item.setParentItem(parent)
+                    if item.scene() is not self.scene:
+                        self.scene.addItem(item)
+            else:
+                # Xóa theo thứ tự ngược: Qt xóa item cuối danh sách anh em trong O(1),
+                # còn xóa từ đầu danh sách là O(n) cho mỗi item
+                for _, item, _ in reversed(run):
+                    if item.scene() is self.scene:
+                        self.scene.removeItem(item)
+            start = end
+
+
+def active_batch(scene: QGraphicsScene):
+    """
+    Trả về batch đang mở trên scene, hoặc None.
+    """
+    return getattr(scene, "_active_batch", None)
+
+
+def bulk_update(scene: QGraphicsScene, update_scene: bool = True) -> SceneBatch:
+    """
+    Mở (hoặc lồng vào) batch cập nhật của scene. Dùng với câu lệnh `with`.
+    :param update_scene: Xem SceneBatch; chỉ có tác dụng khi mở batch mới (không lồng).
+    """
+    return active_batch(scene) or SceneBatch(scene, update_scene)
+
+
+def add_item(scene: QGraphicsScene, item: QGraphicsItem, parent: QGraphicsItem = None):
+    """
+    Thêm item vào scene, qua batch nếu đang có batch mở.
+    :param parent: Item cha (ví dụ LayerItem); None để thêm như item gốc.
+    """
+    batch = active_batch(scene)
+    if batch is not None:
+        batch.add_item(item, parent)
+    else:
+        if parent is not None:
+            item.setParentItem(parent)
+        if item.scene() is not scene:
+            scene.addItem(item)
+
+
+def remove_item(scene: QGraphicsScene, item: QGraphicsItem):
+    """
+    Xóa item khỏi scene, qua batch nếu đang có batch mở.
+    """
+    batch = active_batch(scene)
+    if batch is not None:
+        batch.remove_item(item)
+    else:
+        scene.removeItem(item)
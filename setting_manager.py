@@ -1,15 +1,60 @@
+import atexit
 import json
 import os
+import tempfile
+import threading
+import time
+
+SAVE_DELAY = 0.5  # Gom các thay đổi trong khoảng này (giây) thành một lần ghi file
+
+
+def write_file_atomic(path, text):
+    """
+    Ghi file qua một file tạm trong cùng thư mục rồi đổi tên (os.replace là nguyên tử),
+    nên file cũ vẫn nguyên vẹn nếu chương trình dừng giữa chừng.
+    :param text: Nội dung dạng str, hoặc danh sách các khối bytes/mảng NumPy (ghi file nhị phân).
+    """
+    binary = not isinstance(text, str)
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(handle, "wb" if binary else "w") as file:
+            for chunk in (text if binary else [text]):
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
 
 class SettingsManager:
-    def __init__(self, settings_file="settings.json"):
+    def __init__(self, settings_file="settings.json", save_delay=SAVE_DELAY):
         """
         Quản lý cài đặt của ứng dụng.
+        Cài đặt được giữ trong bộ nhớ; thay đổi được gom lại và ghi xuống file trên luồng nền.
         :param settings_file: Đường dẫn đến file cài đặt.
+        :param save_delay: Thời gian gom thay đổi trước khi ghi (giây).
         """
         self.settings_file = settings_file
+        self.save_delay = float(save_delay)
         self.settings = {}
+        self._listeners = {}  # (danh mục, tên cài đặt hoặc None) -> danh sách callback
+
+        self._condition = threading.Condition()  # Bảo vệ self.settings và trạng thái chờ ghi
+        self._write_lock = threading.Lock()  # Chỉ một lần ghi file tại một thời điểm, đúng thứ tự
+        self._dirty = False
+        self._deadline = 0.0
+        self._closed = False
+        self._writer = None
+        self.write_count = 0  # Số lần đã ghi file (dùng trong benchmark)
+
         self.load_settings()
+        atexit.register(self.flush)  # Không mất thay đổi đang chờ khi thoát
 
     def load_settings(self):
         """
@@ -24,10 +69,72 @@ class SettingsManager:
 
     def save_settings(self):
         """
-        Lưu cài đặt vào file JSON.
+        Lưu ngay cài đặt vào file JSON (đồng bộ, ghi nguyên tử).
+        """
+        with self._write_lock:
+            with self._condition:
+                text = json.dumps(self.settings, indent=4)
+                self._dirty = False
+            write_file_atomic(self.settings_file, text)
+            self.write_count += 1
+
+    def schedule_save(self):
+        """
+        Hẹn ghi cài đặt sau save_delay giây; các thay đổi trong khoảng đó được gom vào một lần ghi.
+        """
+        with self._condition:
+            closed = self._closed
+            if not closed:
+                self._dirty = True
+                self._deadline = time.monotonic() + self.save_delay
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_behind, name="SettingsWriter", daemon=True)
+                    self._writer.start()
+                self._condition.notify()
+        if closed:
+            self.save_settings()  # Luồng ghi nền đã dừng: ghi đồng bộ
+
+    def _write_behind(self):
+        # Luồng nền: chờ hết khoảng gom kể từ thay đổi cuối cùng rồi mới ghi
+        while True:
+            with self._condition:
+                while not self._dirty and not self._closed:
+                    self._condition.wait()
+                if not self._dirty:
+                    return
+                while self._dirty:
+                    remaining = self._deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if not self._dirty:
+                    continue  # flush() đã ghi
+            try:
+                self.save_settings()
+            except Exception as e:
+                print(f"Settings Save Error: {e}")
+
+    def flush(self):
+        """
+        Ghi ngay các thay đổi đang chờ (ví dụ khi đóng ứng dụng).
+        """
+        with self._condition:
+            if not self._dirty:
+                return
+        self.save_settings()
+
+    def close(self):
+        """
+        Ghi các thay đổi đang chờ và dừng luồng ghi nền.
         """
-        with open(self.settings_file, "w") as file:
-            json.dump(self.settings, file, indent=4)
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        atexit.unregister(self.flush)
 
     def default_settings(self):
         """
@@ -44,18 +151,27 @@ class SettingsManager:
             },
             "objects": {
                 "show_grid": True,
-                "snap_to_grid": True
+                "snap_to_grid": True,
+                "object_snap": True,
+                "snap_radius_px": 8,
+                "undo_memory_mb": 64
             },
             "pcb_print": {
                 "resolution": 300,
                 "color_mode": "Color"
+            },
+            "rendering": {
+                "pad_lod_full_detail": 0.5,
+                "pad_lod_outline": 0.2,
+                "adaptive_quality": True,
+                "frame_budget_ms": 16.7
             }
         }
 
     def get_setting(self, category, key, default=None):
         """
         Lấy giá trị của một cài đặt.
-        :param category: Danh mục cài đặt (layers, objects, pcb_print).
+        :param category: Danh mục cài đặt (layers, objects, pcb_print, rendering).
         :param key: Tên cài đặt.
         :param default: Giá trị mặc định nếu cài đặt không tồn tại.
         """
@@ -64,11 +180,32 @@ class SettingsManager:
     def set_setting(self, category, key, value):
         """
         Đặt giá trị cho một cài đặt.
-        :param category: Danh mục cài đặt (layers, objects, pcb_print).
+        :param category: Danh mục cài đặt (layers, objects, pcb_print, rendering).
         :param key: Tên cài đặt.
         :param value: Giá trị cần đặt.
         """
-        if category not in self.settings:
-            self.settings[category] = {}
-        self.settings[category][key] = value
-        self.save_settings()
\ No newline at end of file
+        with self._condition:
+            values = self.settings.setdefault(category, {})
+            if key in values and values[key] == value:
+                return
+            values[key] = value
+        self.schedule_save()
+        self._notify(category, key, value)
+
+    def add_listener(self, category, callback, key=None):
+        """
+        Đăng ký callback(category, key, value) khi một cài đặt thay đổi.
+        :param category: Danh mục cài đặt.
+        :param callback: Hàm được gọi (trên luồng gọi set_setting) với giá trị mới.
+        :param key: Tên cài đặt; None để nhận mọi thay đổi trong danh mục.
+        """
+        self._listeners.setdefault((category, key), []).append(callback)
+
+    def remove_listener(self, category, callback, key=None):
+        listeners = self._listeners.get((category, key), [])
+        if callback in listeners:
+            listeners.remove(callback)
+
+    def _notify(self, category, key, value):
+        for callback in self._listeners.get((category, key), []) + self._listeners.get((category, None), []):
+            callback(category, key, value)
\ No newline at end of file
@@ -0,0 +1,189 @@
+# snapping.py
+
+import math
+
+import numpy as np
+from PyQt5.QtWidgets import QGraphicsScene, QGraphicsItem, QGraphicsLineItem
+from PyQt5.QtCore import QPointF, QRectF, Qt
+
+SNAP_NONE = None
+SNAP_GRID = "grid"
+SNAP_OBJECT = "object"
+
+
+class SnapEngine:
+    """
+    Bắt điểm (snap) cho con trỏ và cho cả vùng chọn.
+
+    - Bắt lưới: làm tròn tọa độ về bội số của grid_spacing (vector hóa với NumPy cho nhiều điểm).
+      Khi kéo cả vùng chọn, chỉ item đang bị kéo được bắt lưới; các item khác dời cùng một đoạn
+      nên giữ nguyên khoảng cách với nhau (kể cả khi nằm lệch lưới).
+    - Bắt đối tượng: tâm pad hoặc đầu mút đường gần nhất trong bán kính tính bằng pixel màn hình.
+      Item trong layer được tìm qua chỉ mục không gian của LayerManager, hình vẽ ngoài layer qua chỉ mục của
+      DrawingApp (không có các chỉ mục này thì qua chỉ mục BSP của scene), nên chỉ xét các item quanh con trỏ.
+    """
+
+    def __init__(self, grid_spacing: float = 10.0, snap_to_grid: bool = True,
+                 object_snap: bool = True, object_radius_px: float = 8.0, layer_manager=None, shape_index=None):
+        """
+        :param grid_spacing: Khoảng cách lưới (đơn vị scene).
+        :param snap_to_grid: Bật bắt lưới.
+        :param object_snap: Bật bắt tâm pad/đầu mút đường.
+        :param object_radius_px: Bán kính bắt đối tượng, tính bằng pixel màn hình.
+        :param layer_manager: LayerManager của scene; None để tìm mọi item qua chỉ mục BSP của scene.
+        :param shape_index: SpatialIndex của các hình ngoài layer (DrawingApp.shape_index), dùng cùng layer_manager.
+        """
+        # Import trễ, một lần cho mỗi engine: pad, pad_field và trace_item đều import module này
+        from pad import Pad
+        from pad_field import PadField
+        from trace_item import TraceItem
+
+        self.grid_spacing = float(grid_spacing)
+        self.snap_to_grid = bool(snap_to_grid)
+        self.object_snap = bool(object_snap)
+        self.object_radius_px = float(object_radius_px)
+        self.layer_manager = layer_manager
+        self.shape_index = shape_index
+        self._pad_type, self._field_type, self._trace_type = Pad, PadField, TraceItem
+        self._drag = None  # (item bị kéo, danh sách item, vị trí scene ban đầu, độ lệch pos -> scenePos)
+
+    # --- Bắt lưới ---
+
+    def snap_to_grid_point(self, point: QPointF) -> QPointF:
+        step = self.grid_spacing
+        return QPointF(round(point.x() / step) * step, round(point.y() / step) * step)
+
+    def snap_positions(self, positions) -> np.ndarray:
+        """
+        Bắt lưới cho nhiều điểm cùng lúc.
+        :param positions: Mảng (N, 2) tọa độ scene.
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        if not self.snap_to_grid:
+            return positions
+        return np.round(positions / self.grid_spacing) * self.grid_spacing
+
+    # --- Bắt đối tượng ---
+
+    def snap_targets(self, item: QGraphicsItem, point: QPointF, radius: float):
+        """
+        Các điểm bắt (tọa độ scene) của một item gần point.
+        """
+        if isinstance(item, self._pad_type):
+            return [item.scenePos()]
+        if isinstance(item, QGraphicsLineItem):
+            line = item.line()
+            return [item.mapToScene(line.p1()), item.mapToScene(line.p2())]
+        if isinstance(item, self._trace_type) and len(item):
+            return [item.mapToScene(QPointF(*item.points[0])), item.mapToScene(QPointF(*item.points[-1]))]
+        if isinstance(item, self._field_type) and len(item):
+            local = item.mapFromScene(point)
+            delta = item.positions - (local.x(), local.y())
+            near = np.nonzero(np.abs(delta).max(axis=1) <= radius)[0]
+            return [item.mapToScene(QPointF(*item.positions[index])) for index in near]
+        return []
+
+    def nearest_object_point(self, scene: QGraphicsScene, point: QPointF, scale: float, exclude=()):
+        """
+        Điểm bắt đối tượng gần point nhất trong bán kính màn hình, hoặc None.
+        :param scale: Tỉ lệ scene -> màn hình của view (zoom).
+        :param exclude: Các item bỏ qua (ví dụ item đang bị kéo).
+        """
+        radius = self.object_radius_px / (scale or 1.0)
+        best, best_distance = None, radius
+        for item in self.candidates(scene, point, radius):
+            if item in exclude:
+                continue
+            for target in self.snap_targets(item, point, radius):
+                distance = math.hypot(target.x() - point.x(), target.y() - point.y())
+                if distance <= best_distance:
+                    best, best_distance = target, distance
+        return best
+
+    def candidates(self, scene: QGraphicsScene, point: QPointF, radius: float):
+        """
+        Các item có thể có điểm bắt trong bán kính quanh point.
+        """
+        manager = self.layer_manager
+        if manager is None or manager.scene is not scene:
+            area = QRectF(point.x() - radius, point.y() - radius, 2 * radius, 2 * radius)
+            return scene.items(area, Qt.IntersectsItemBoundingRect)
+        # Không gọi scene.items: Qt duyệt hết các item con của mọi LayerItem ở mỗi truy vấn.
+        # Item trong layer dùng chỉ mục của LayerManager.items_in_radius (tọa độ layer trùng tọa độ scene)
+        items = []
+        for name, layer in manager.layers.items():
+            if layer.isVisible():
+                items += manager.items_in_radius(name, point, radius)
+        if self.shape_index is not None:
+            items += self.shape_index.query_radius(point, radius)
+        return items
+
+    def snap_point(self, scene: QGraphicsScene, point: QPointF, scale: float, exclude=()):
+        """
+        Bắt một điểm con trỏ: ưu tiên đối tượng, sau đó lưới.
+        :return: (điểm đã bắt, loại bắt: SNAP_OBJECT, SNAP_GRID hoặc SNAP_NONE)
+        """
+        if self.object_snap and scene is not None:
+            target = self.nearest_object_point(scene, point, scale, exclude)
+            if target is not None:
+                return target, SNAP_OBJECT
+        if self.snap_to_grid:
+            return self.snap_to_grid_point(point), SNAP_GRID
+        return QPointF(point), SNAP_NONE
+
+    # --- Kéo cả vùng chọn ---
+
+    def drag_selection(self, grabber: QGraphicsItem, event) -> bool:
+        """
+        Di chuyển mọi item được chọn theo chuột: vị trí của item đang bị kéo được bắt lưới, rồi cùng độ dời đó
+        được áp dụng cho tất cả trong một bước NumPy.
+        Gọi từ mouseMoveEvent của item đang bị kéo; trả về False nếu không xử lý (để dùng mặc định).
+        """
+        if not self.snap_to_grid or grabber.scene() is None:
+            return False
+        if self._drag is None or self._drag[0] is not grabber:
+            items = [item for item in grabber.scene().selectedItems()
+                     if item.flags() & QGraphicsItem.ItemIsMovable and not isinstance(item, self._field_type)
+                     and not self._has_selected_ancestor(item)]
+            if grabber not in items:
+                return False
+            start = np.array([(item.scenePos().x(), item.scenePos().y()) for item in items], dtype=np.float64)
+            offset = start - np.array([(item.pos().x(), item.pos().y()) for item in items], dtype=np.float64)
+            self._drag = (grabber, items, start, offset, start[items.index(grabber)], np.zeros(2))
+
+        _, items, start, offset, anchor, shift = self._drag
+        delta = event.scenePos() - event.buttonDownScenePos(Qt.LeftButton)
+        target_shift = self.snap_positions(anchor + (delta.x(), delta.y())) - anchor
+        # Chỉ gọi setPos khi ô lưới của item bị kéo thay đổi
+        if np.array_equal(target_shift, shift):
+            return True
+        shift[:] = target_shift
+        for item, (x, y) in zip(items, (start - offset + shift).tolist()):
+            item.setPos(x, y)
+        return True
+
+    def end_drag(self):
+        self._drag = None
+
+    @staticmethod
+    def _has_selected_ancestor(item):
+        parent = item.parentItem()
+        while parent is not None:
+            if parent.isSelected():
+                return True
+            parent = parent.parentItem()
+        return False
+
+
+def snap_engine(scene: QGraphicsScene):
+    """
+    Trả về SnapEngine gắn với scene, hoặc None nếu scene không bật bắt điểm.
+    """
+    return getattr(scene, "_snap_engine", None)
+
+
+def set_snap_engine(scene: QGraphicsScene, engine: SnapEngine):
+    """
+    Gắn SnapEngine cho scene (None để tắt); các item và công cụ vẽ đọc nó qua snap_engine().
+    """
+    scene._snap_engine = engine
@@ -0,0 +1,201 @@
+# spatial_index.py
+
+import heapq
+import math
+
+from PyQt5.QtCore import QRectF
+
+
+def rect_bounds(rect: QRectF):
+    """
+    Chuyển QRectF thành bộ (x0, y0, x1, y1).
+    """
+    return rect.left(), rect.top(), rect.right(), rect.bottom()
+
+
+def distance_to_bounds(x, y, bounds):
+    """
+    Khoảng cách từ điểm (x, y) tới hình chữ nhật bounds, bằng 0 nếu điểm nằm trong.
+    """
+    x0, y0, x1, y1 = bounds
+    dx = max(x0 - x, 0.0, x - x1)
+    dy = max(y0 - y, 0.0, y - y1)
+    return math.hypot(dx, dy)
+
+
+class SpatialIndex:
+    """
+    Chỉ mục không gian dạng lưới đều (uniform grid) cho truy vấn theo hình chữ nhật,
+    bán kính và k đối tượng gần nhất. Mỗi đối tượng được lưu cùng hình chữ nhật bao.
+    """
+
+    MAX_CELLS_PER_ITEM = 64  # Đối tượng phủ nhiều ô hơn được lưu riêng
+
+    def __init__(self, cell_size: float = 50.0):
+        """
+        :param cell_size: Kích thước một ô lưới (đơn vị scene).
+        """
+        self.cell_size = float(cell_size)
+        self._cells = {}  # (cx, cy) -> set các đối tượng
+        self._bounds = {}  # đối tượng -> (x0, y0, x1, y1)
+        self._large = set()  # Đối tượng quá lớn, luôn được kiểm tra trực tiếp
+        self._extent = None  # (cx0, cy0, cx1, cy1) của các ô đã dùng (chỉ mở rộng)
+
+    def __len__(self):
+        return len(self._bounds)
+
+    def __contains__(self, item):
+        return item in self._bounds
+
+    def bounds(self, item):
+        return self._bounds.get(item)
+
+    def _cell_range(self, x0, y0, x1, y1):
+        size = self.cell_size
+        return (math.floor(x0 / size), math.floor(y0 / size),
+                math.floor(x1 / size), math.floor(y1 / size))
+
+    def insert(self, item, rect: QRectF):
+        """
+        Thêm (hoặc cập nhật) một đối tượng với hình chữ nhật bao của nó.
+        """
+        if item in self._bounds:
+            self.remove(item)
+        bounds = rect_bounds(rect)
+        self._bounds[item] = bounds
+        cx0, cy0, cx1, cy1 = self._cell_range(*bounds)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > self.MAX_CELLS_PER_ITEM:
+            self._large.add(item)
+            return
+        cells = self._cells
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    cells[(cx, cy)] = {item}
+                else:
+                    cell.add(item)
+        if self._extent is None:
+            self._extent = (cx0, cy0, cx1, cy1)
+        else:
+            ex0, ey0, ex1, ey1 = self._extent
+            self._extent = (min(ex0, cx0), min(ey0, cy0), max(ex1, cx1), max(ey1, cy1))
+
+    update = insert
+
+    def remove(self, item):
+        """
+        Xóa một đối tượng khỏi chỉ mục (không báo lỗi nếu không có).
+        """
+        bounds = self._bounds.pop(item, None)
+        if bounds is None:
+            return
+        if item in self._large:
+            self._large.discard(item)
+            return
+        cx0, cy0, cx1, cy1 = self._cell_range(*bounds)
+        cells = self._cells
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is not None:
+                    cell.discard(item)
+                    if not cell:
+                        del cells[(cx, cy)]
+
+    def clear(self):
+        self._cells.clear()
+        self._bounds.clear()
+        self._large.clear()
+        self._extent = None
+
+    def query_rect(self, rect: QRectF):
+        """
+        Trả về các đối tượng có hình chữ nhật bao giao với rect.
+        """
+        x0, y0, x1, y1 = rect_bounds(rect)
+        cx0, cy0, cx1, cy1 = self._cell_range(x0, y0, x1, y1)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+            # Vùng lớn hơn số ô đang dùng: duyệt thẳng các ô
+            candidates = set().union(*self._cells.values()) if self._cells else set()
+        else:
+            candidates = set()
+            cells = self._cells
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    cell = cells.get((cx, cy))
+                    if cell:
+                        candidates.update(cell)
+        candidates.update(self._large)
+
+        result = []
+        for item in candidates:
+            bx0, by0, bx1, by1 = self._bounds[item]
+            if bx1 >= x0 and bx0 <= x1 and by1 >= y0 and by0 <= y1:
+                result.append(item)
+        return result
+
+    def query_radius(self, point, radius: float):
+        """
+        Trả về các đối tượng cách point không quá radius, sắp xếp từ gần đến xa.
+        """
+        x, y = point.x(), point.y()
+        candidates = self.query_rect(QRectF(x - radius, y - radius, 2 * radius, 2 * radius))
+        hits = [(distance_to_bounds(x, y, self._bounds[item]), index, item)
+                for index, item in enumerate(candidates)]
+        return [item for distance, _, item in sorted(hits) if distance <= radius]
+
+    @staticmethod
+    def _ring_cells(pcx, pcy, ring):
+        """Các ô trên vành cách ô (pcx, pcy) đúng `ring` ô"""
+        if ring == 0:
+            yield pcx, pcy
+            return
+        for cx in range(pcx - ring, pcx + ring + 1):
+            yield cx, pcy - ring
+            yield cx, pcy + ring
+        for cy in range(pcy - ring + 1, pcy + ring):
+            yield pcx - ring, cy
+            yield pcx + ring, cy
+
+    def nearest(self, point, k: int = 1, max_distance: float = None):
+        """
+        Trả về tối đa k đối tượng gần point nhất, sắp xếp từ gần đến xa.
+        :param max_distance: Bỏ qua các đối tượng xa hơn khoảng cách này.
+        """
+        if not self._bounds or k <= 0:
+            return []
+        x, y = point.x(), point.y()
+        size = self.cell_size
+        pcx, pcy = math.floor(x / size), math.floor(y / size)
+        seen = set()
+        found = []  # (khoảng cách, thứ tự, đối tượng)
+
+        def consider(item):
+            if item not in seen:
+                seen.add(item)
+                found.append((distance_to_bounds(x, y, self._bounds[item]), len(found), item))
+
+        for item in self._large:
+            consider(item)
+
+        if self._extent is not None:
+            ex0, ey0, ex1, ey1 = self._extent
+            max_ring = max(pcx - ex0, ex1 - pcx, pcy - ey0, ey1 - pcy, 0)
+            ring = 0
+            while ring <= max_ring:
+                for cell_key in self._ring_cells(pcx, pcy, ring):
+                    cell = self._cells.get(cell_key)
+                    if cell:
+                        for item in cell:
+                            consider(item)
+                # Mọi đối tượng chưa xét đều cách điểm ít nhất ring * size
+                reach = ring * size
+                if len(found) >= k and heapq.nsmallest(k, found)[-1][0] <= reach:
+                    break
+                if max_distance is not None and reach > max_distance:
+                    break
+                ring += 1
+
+        result = heapq.nsmallest(k, found)
+        return [item for distance, _, item in result if max_distance is None or distance <= max_distance]
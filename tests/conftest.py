@@ -0,0 +1,17 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # Chạy được không cần màn hình
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtWidgets import QApplication
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    """QApplication dùng chung cho cả lần chạy test"""
+    return QApplication.instance() or QApplication([])
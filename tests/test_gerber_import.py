@@ -0,0 +1,113 @@
+# tests/test_gerber_import.py
+
+import numpy as np
+import pytest
+from PyQt5.QtWidgets import QGraphicsScene
+
+from gerber_import import GERBER_CHUNK_BYTES, VECTOR_MIN_WORDS, GerberImporter, macro_value
+from layer_manager import LayerManager, LayerRegionItem
+from project_file import SHAPE_TRACE, SHAPE_REGION, collect_project, save_project, load_project, apply_project
+
+HEADER = ("%FSLAX46Y46*%\n%MOMM*%\nG75*\n%AMBOX*0 Hộp*21,1,$1,$2x0.5+$3,0,0,0*%\n"
+          "%ADD10C,0.200000*%\n%ADD11R,1.000000X0.500000*%\n%ADD12BOX,2.0X1.0X0.25*%\n")
+
+
+def board_gerber(path):
+    """
+    File Gerber nhỏ có đủ các loại lệnh: dãy nét đủ dài để đọc bằng NumPy, cung tròn, flash của aperture
+    thường và aperture macro, vùng G36/G37, đối tượng polarity clear và khối step-repeat.
+    """
+    lines = [HEADER, "D10*\n"]
+    for index in range(VECTOR_MIN_WORDS):
+        x = index * 1000000
+        lines.append(f"X{x}Y0D02*\nX{x}Y{500000 + index * 10000}D01*\nX{x + 300000}Y900000D01*\n")
+    lines.append("X0Y0D02*\nG03X2000000Y0I1000000J0D01*\nG01*\n")
+    lines.append("D11*\n" + "".join(f"X{index * 700000}Y-2000000D03*\n" for index in range(40)))
+    lines.append("D12*\nX5000000Y5000000D03*\n")
+    lines.append("G36*\nX0Y0D02*\nX3000000Y0D01*\nY3000000D01*\nX0D01*\nY0D01*\nG37*\n")
+    lines.append(CLEAR_OBJECTS)
+    lines.append("%SRX3Y2I5.0J5.0*%\nD11*\nX1000000Y1000000D03*\n%SR*%\nM02*\n")
+    path.write_text("".join(lines))
+    return str(path)
+
+
+# 2 flash, 2 nét và 1 vùng polarity clear
+CLEAR_OBJECTS = ("%LPC*%\nD11*\nX1000000Y1000000D03*\nX2000000Y1000000D03*\n"
+                 "D10*\nX0Y4000000D02*\nX1000000Y4000000D01*\nX2000000Y4000000D01*\nX0Y5000000D02*\nX1000000Y5000000D01*\n"
+                 "G36*\nX0Y0D02*\nX1000000Y0D01*\nY1000000D01*\nX0D01*\nY0D01*\nG37*\n%LPD*%\n")
+
+
+def import_gerber(path, chunk_size=GERBER_CHUNK_BYTES):
+    manager = LayerManager(QGraphicsScene())
+    importer = GerberImporter(manager, "top_copper", chunk_size=chunk_size)
+    importer.import_file(path)
+    return importer, manager
+
+
+def strokes(data):
+    """Các nét của các đường mạch, sắp xếp (số TraceItem phụ thuộc cách gom nên không so)"""
+    result = []
+    for start, count in data.shapes[data.shapes["kind"] == SHAPE_TRACE][["start", "count"]].tolist():
+        points = data.points[start:start + count]
+        for piece in np.split(points, np.flatnonzero(np.isnan(points[:, 0]))):
+            piece = piece[~np.isnan(piece[:, 0])]
+            if len(piece):
+                result.append(tuple(np.round(piece, 6).ravel().tolist()))
+    return sorted(result)
+
+
+def test_chunk_size_does_not_change_result(qapp, tmp_path):
+    path = board_gerber(tmp_path / "board.gtl")
+    small, small_manager = import_gerber(path, chunk_size=7)
+    large, large_manager = import_gerber(path)
+
+    counts = (large.flashes, large.strokes, large.regions, large.skipped)
+    assert counts == (40 + 1 + 6, VECTOR_MIN_WORDS + 1, 1, 5)
+    assert (small.flashes, small.strokes, small.regions, small.skipped) == counts
+    small_data, large_data = collect_project(small_manager), collect_project(large_manager)
+    assert strokes(small_data) == strokes(large_data)
+    np.testing.assert_array_equal(np.sort(small_data.pads["pos"], axis=0), np.sort(large_data.pads["pos"], axis=0))
+
+
+@pytest.mark.parametrize("chunk_size", [7, GERBER_CHUNK_BYTES])
+def test_clear_polarity_is_skipped(qapp, tmp_path, chunk_size):
+    path = tmp_path / "clear.gtl"
+    path.write_text(HEADER + "D11*\nX0Y0D03*\nX3000000Y0D03*\n" + CLEAR_OBJECTS
+                    + "D10*\nX0Y6000000D02*\nX1000000Y6000000D01*\nM02*\n")
+    importer, _ = import_gerber(str(path), chunk_size)
+    assert (importer.flashes, importer.strokes, importer.regions) == (2, 1, 0)
+    assert importer.skipped == 2 + 2 + 1
+
+
+def test_macro_value():
+    assert macro_value("$1x2+$2", {1: 1.5, 2: 0.25}) == 3.25
+    assert macro_value("-$1/4", {1: 2.0}) == -0.5
+    assert macro_value("$3", {}) == 0.0  # Tham số không có được tính là 0
+
+
+@pytest.mark.parametrize("text", ["9xx9xx9xx9", "2**3", "__import__('os')", "$1.real", "1/0", "(1", "[1]"])
+def test_macro_value_rejects(text):
+    with pytest.raises(ValueError, match="không hợp lệ"):
+        macro_value(text, {1: 1.0})
+
+
+def test_bad_macro_aborts_import(qapp, tmp_path):
+    path = tmp_path / "bad.gtl"
+    path.write_text("%FSLAX46Y46*%\n%MOMM*%\n%AMBAD*21,1,$1xx2,1,0,0,0*%\n%ADD20BAD,1.0*%\nD20*\nX0Y0D03*\nM02*\n")
+    with pytest.raises(ValueError, match="không hợp lệ"):
+        import_gerber(str(path))
+
+
+def test_regions_keep_fill_after_save(qapp, tmp_path):
+    importer, manager = import_gerber(board_gerber(tmp_path / "board.gtl"))
+    region = next(item for item in importer.items if isinstance(item, LayerRegionItem))
+    project = tmp_path / "board.pcbp"
+    save_project(str(project), collect_project(manager))
+
+    data = load_project(str(project))
+    assert np.count_nonzero(data.shapes["kind"] == SHAPE_REGION) == 1
+    opened = LayerManager(QGraphicsScene())
+    apply_project(data, opened)
+    regions = [item for item in opened.layers["top_copper"].items if isinstance(item, LayerRegionItem)]
+    assert len(regions) == 1
+    assert regions[0].path().toFillPolygon() == region.path().toFillPolygon()
@@ -0,0 +1,90 @@
+# tests/test_journal.py
+
+import numpy as np
+from PyQt5.QtWidgets import QGraphicsScene
+
+import journal
+from journal import ProjectJournal, recover_journal, journal_path
+from layer_manager import LayerManager
+from project_file import collect_project, save_project
+
+from test_project_file import build_board, assert_same_project
+
+
+def start_journal(manager, directory):
+    """Nhật ký bắt đầu từ snapshot là board hiện tại, như sau khi mở một file project"""
+    items = []
+    path = str(directory / "board.pcbp")
+    save_project(path, collect_project(manager, None, items))
+    log = ProjectJournal(manager, directory=str(directory), compact_interval_ms=0)
+    log.start(path, items)
+    return log
+
+
+def move(log, item, x, y):
+    item.setPos(x, y)
+    log.record_moves([item])
+
+
+def test_recover_replays_records(qapp, tmp_path):
+    manager = build_board(qapp)
+    log = start_journal(manager, tmp_path)
+    pad, _, _, field = manager.layers["top_copper"].items
+    move(log, pad, 7, 8)
+    move(log, field, 150, 120)
+    manager.set_layer_opacity("top_mark", 0.25)
+    log._append(journal.layer_state(manager.layers["top_mark"]))
+    log.flush()
+    log.close(discard=False)
+
+    recovered = LayerManager(QGraphicsScene())
+    project, count = recover_journal(recovered, directory=str(tmp_path))
+    assert project == str(tmp_path / "board.pcbp") and count == 3
+    assert_same_project(collect_project(recovered), collect_project(manager))
+    assert recovered.layers["top_mark"].opacity() == 0.25
+
+
+def test_recover_stops_at_torn_record(qapp, tmp_path):
+    manager = build_board(qapp)
+    log = start_journal(manager, tmp_path)
+    pad = manager.layers["top_copper"].items[0]
+    move(log, pad, 7, 8)
+    log.flush()
+    expected = collect_project(manager)
+    move(log, pad, 90, 90)
+    log.flush()
+    log.close(discard=False)
+
+    # Mất điện giữa lúc ghi bản ghi cuối: chỉ một phần của nó có trên đĩa
+    path = journal_path(str(tmp_path))
+    with open(path, "r+b") as file:
+        file.truncate(file.seek(0, 2) - 5)
+
+    recovered = LayerManager(QGraphicsScene())
+    _, count = recover_journal(recovered, directory=str(tmp_path))
+    assert count == 1
+    assert_same_project(collect_project(recovered), expected)
+
+
+def test_compact_is_not_starved_by_records(qapp, tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "COMPACT_SLICE_MS", 0)  # Mỗi lượt chỉ gom một phần
+    manager = build_board(qapp)
+    log = start_journal(manager, tmp_path)
+    pad = manager.layers["top_copper"].items[0]
+    log.compact()
+    for step in range(journal.COMPACT_RESTARTS + 2):
+        log._compact_step()
+        if not log.compacting:
+            break
+        move(log, pad, step, step)  # Mỗi lượt gom đều bị một thay đổi mới chen vào
+    assert not log.compacting
+    assert log.generation == 1 and log.record_count == 0
+
+    move(log, pad, 42, 43)
+    log.flush()
+    log.close(discard=False)
+    recovered = LayerManager(QGraphicsScene())
+    _, count = recover_journal(recovered, directory=str(tmp_path))
+    assert count == 1
+    assert_same_project(collect_project(recovered), collect_project(manager))
+    np.testing.assert_array_equal(collect_project(recovered).pads["pos"][0], (42, 43))
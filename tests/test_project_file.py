@@ -0,0 +1,116 @@
+# tests/test_project_file.py
+
+import numpy as np
+import pytest
+from PyQt5.QtWidgets import QGraphicsScene, QGraphicsRectItem
+from PyQt5.QtGui import QPen, QColor
+
+from pad import Pad
+from pad_spec import PadSpec
+from pad_field import PadField
+from trace_item import TraceItem
+from layer_manager import LayerManager, LayerStyled, LayerLineItem
+from setting_manager import write_file_atomic
+from project_file import (
+    PROJECT_MAGIC, PROJECT_VERSION, collect_project, save_project, load_project, apply_project, project_blob,
+    encode_blob
+)
+
+THT = PadSpec(type="THT (Through Hole)", shape="Circle", width=1.5, height=1.5, hole_diameter=0.8)
+SMD = PadSpec(type="SMD", shape="Rectangle", width=1.0, height=0.6, layers=frozenset({"top_copper"}))
+
+
+def build_board(qapp):
+    """Board nhỏ có đủ các loại đối tượng mà file project lưu được"""
+    manager = LayerManager(QGraphicsScene())
+    manager.set_layer_color("top_mark", QColor(10, 20, 30))
+    manager.set_layer_opacity("bottom_copper", 0.5)
+
+    pads = [Pad(THT), Pad(THT), Pad(SMD)]
+    for index, pad in enumerate(pads):
+        pad.setPos(10 * index, 5)
+    field = PadField()
+    field.add_pads(SMD, [(0, 0), (20, 0), (40, 0)])
+    field.add_pads(THT, [(0, 30)])
+    field.setPos(100, 100)
+    manager.add_items_to_layer("top_copper", pads + [field])
+
+    trace = TraceItem([(0, 0), (50, 0), (50, 50), (np.nan, np.nan), (60, 0), (70, 10)], QPen(QColor(200, 0, 0), 3))
+    layer_pen = LayerLineItem(0, 0, 30, 40)  # Vẽ bằng bút của layer
+    own_pen = QGraphicsRectItem(5, 5, 20, 10)  # Có bút riêng
+    own_pen.setPen(QPen(QColor(0, 0, 255), 4))
+    manager.add_items_to_layer("bottom_copper", [trace])
+    manager.add_items_to_layer("top_mark", [layer_pen, own_pen])
+    return manager
+
+
+def assert_same_project(actual, expected):
+    assert actual.layers == expected.layers
+    assert actual.specs == expected.specs
+    assert actual.pens == expected.pens
+    assert actual.fields == expected.fields
+    np.testing.assert_array_equal(actual.pads, expected.pads)
+    np.testing.assert_array_equal(actual.shapes, expected.shapes)
+    np.testing.assert_array_equal(actual.points, expected.points)
+
+
+def test_round_trip(qapp, tmp_path):
+    expected = collect_project(build_board(qapp))
+    path = tmp_path / "board.pcbp"
+    save_project(str(path), expected)
+
+    manager = LayerManager(QGraphicsScene())
+    created = apply_project(load_project(str(path)), manager)
+
+    assert created == len(expected) == 3 + 4 + 3
+    assert_same_project(collect_project(manager), expected)
+
+    top_mark = manager.layers["top_mark"].items
+    assert isinstance(top_mark[0], LayerStyled)
+    assert not isinstance(top_mark[1], LayerStyled)
+    assert top_mark[1].pen().color() == QColor(0, 0, 255) and top_mark[1].pen().widthF() == 4
+    assert manager.layers["top_mark"].color == QColor(10, 20, 30)
+    assert manager.layers["bottom_copper"].opacity() == 0.5
+    trace = manager.layers["bottom_copper"].items[0]
+    assert isinstance(trace, TraceItem) and len(trace.strokes()) == 2
+
+
+def test_apply_replaces_current_design(qapp, tmp_path):
+    path = tmp_path / "board.pcbp"
+    save_project(str(path), collect_project(build_board(qapp)))
+
+    manager = build_board(qapp)
+    apply_project(load_project(str(path)), manager)
+    assert len(manager.layers["top_copper"].items) == 4
+    assert len(manager.layers["top_copper"].index) == 4
+
+
+def test_bad_magic(tmp_path):
+    path = tmp_path / "other.pcbp"
+    path.write_bytes(b"NOTAPROJ" + bytes(64))
+    with pytest.raises(ValueError):
+        load_project(str(path))
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.pcbp"
+    path.write_bytes(b"")
+    with pytest.raises(ValueError):
+        load_project(str(path))
+
+
+def test_unsupported_version(qapp, tmp_path):
+    header, arrays = project_blob(collect_project(build_board(qapp)))
+    header["version"] = PROJECT_VERSION + 1
+    path = tmp_path / "future.pcbp"
+    write_file_atomic(str(path), [PROJECT_MAGIC] + encode_blob(header, arrays, start=len(PROJECT_MAGIC)))
+    with pytest.raises(ValueError, match="không được hỗ trợ"):
+        load_project(str(path))
+
+
+def test_truncated_file(qapp, tmp_path):
+    path = tmp_path / "board.pcbp"
+    save_project(str(path), collect_project(build_board(qapp)))
+    path.write_bytes(path.read_bytes()[:-64])
+    with pytest.raises(ValueError):
+        load_project(str(path))
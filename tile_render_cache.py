@@ -0,0 +1,256 @@
+# tile_render_cache.py
+
+import math
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, QRectF, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter, QPicture, QTransform
+from PyQt5.QtWidgets import QGraphicsItem, QStyle, QStyleOptionGraphicsItem
+
+from create_layer import TileCache, TILE_SIZE
+
+DEFAULT_TILE_CACHE_BUDGET = 64 * 1024 * 1024  # Bộ nhớ tối đa cho tile của một view (byte)
+
+
+def zoom_key(scale: float):
+    """
+    Khóa mức zoom của tile (làm tròn để tránh sai số dấu chấm động).
+    """
+    return round(scale, 6)
+
+
+def tile_scene_rect(level, tx: int, ty: int) -> QRectF:
+    """
+    Hình chữ nhật (tọa độ scene) mà tile (tx, ty) ở mức zoom `level` bao phủ.
+    """
+    size = TILE_SIZE / level
+    return QRectF(tx * size, ty * size, size, size)
+
+
+def tile_range(level, scene_rect: QRectF):
+    """
+    Các cột và hàng tile ở mức zoom `level` giao với một vùng scene.
+    """
+    size = TILE_SIZE / level
+    return (range(math.floor(scene_rect.left() / size), math.floor(scene_rect.right() / size) + 1),
+            range(math.floor(scene_rect.top() / size), math.floor(scene_rect.bottom() / size) + 1))
+
+
+class TileSignals(QObject):
+    # (khóa tile, thế hệ, ảnh) - phát từ luồng worker, nhận trên luồng GUI
+    finished = pyqtSignal(object, int, QImage)
+
+
+class TileRenderJob(QRunnable):
+    """
+    Raster hóa ảnh chụp (QPicture) của một tile thành QImage trên luồng nền.
+    QPicture chỉ chứa lệnh vẽ đã ghi, không chạm tới các item của scene.
+    """
+
+    def __init__(self, key, generation: int, picture: QPicture, render_hints, signals: TileSignals):
+        super().__init__()
+        self.key = key
+        self.generation = generation
+        self.picture = picture
+        self.render_hints = render_hints
+        self.signals = signals
+
+    def run(self):
+        image = QImage(TILE_SIZE, TILE_SIZE, QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        painter.setRenderHints(self.render_hints)
+        painter.drawPicture(0, 0, self.picture)
+        painter.end()
+        self.signals.finished.emit(self.key, self.generation, image)
+
+
+class TileRenderCache(QObject):
+    """
+    Cache tile đã vẽ sẵn của một scene, theo mức zoom và tọa độ tile.
+
+    Trên luồng GUI chỉ ghi lại lệnh vẽ của từng tile (QPicture, gọi paint của các item);
+    việc raster hóa chạy trên QThreadPool. Tile của mức zoom khác vẫn được dùng (co giãn) cho tới khi
+    có tile mới; tile đã bị đánh dấu cũ thì view vẽ trực tiếp vùng của nó (paint_items).
+    """
+
+    tile_ready = pyqtSignal(object)  # Khóa (level, tx, ty) của tile vừa có ảnh mới
+
+    def __init__(self, scene, budget_bytes: int = DEFAULT_TILE_CACHE_BUDGET, parent=None):
+        super().__init__(parent)
+        self.scene = scene
+        self.tiles = TileCache(budget_bytes)  # (level, tx, ty) -> QImage
+        self.render_hints = QPainter.Antialiasing
+        self.record_budget_ms = 8.0  # Thời gian ghi tile tối đa mỗi lượt của vòng lặp sự kiện
+        self.pool = QThreadPool.globalInstance()
+
+        self._stale = set()  # Tile có ảnh nhưng nội dung đã cũ
+        self._generation = {}  # Khóa -> thế hệ, để bỏ kết quả của job đã lỗi thời
+        self._queue = {}  # Tile chờ ghi (dict giữ thứ tự)
+        self._in_flight = set()
+        self._signals = TileSignals()  # Không có cha: job đang chạy giữ nó sống sau khi cache bị hủy
+        self._signals.finished.connect(self._on_tile_finished)
+
+        self._record_timer = QTimer(self)
+        self._record_timer.setSingleShot(True)
+        self._record_timer.timeout.connect(self._record_pending)
+        self._paused = False
+
+        scene.changed.connect(self.invalidate_scene_rects)
+
+    # --- Truy cập tile ---
+
+    def tile(self, key):
+        """
+        Ảnh của tile (có thể đã cũ), hoặc None.
+        """
+        return self.tiles.get(key)
+
+    def is_fresh(self, key) -> bool:
+        return key not in self._stale and self.tiles.get(key) is not None
+
+    def levels(self):
+        """
+        Các mức zoom đang có tile trong cache.
+        """
+        return {key[0] for key in self.tiles.keys()}
+
+    def request(self, key):
+        """
+        Yêu cầu vẽ (lại) một tile nếu nó chưa có hoặc đã cũ.
+        """
+        if key in self._queue or key in self._in_flight or self.is_fresh(key):
+            return
+        self._queue[key] = None
+        if not self._paused and not self._record_timer.isActive():
+            self._record_timer.start(0)
+
+    def pause(self):
+        """
+        Tạm dừng ghi tile mới (ví dụ trong lúc đang zoom liên tục).
+        """
+        self._paused = True
+        self._record_timer.stop()
+
+    def resume(self):
+        self._paused = False
+        if self._queue:
+            self._record_timer.start(0)
+
+    def drop_requests(self, keep_level=None):
+        """
+        Bỏ các yêu cầu đang chờ, trừ các tile ở mức zoom `keep_level`.
+        """
+        self._queue = {key: None for key in self._queue if key[0] == keep_level}
+
+    # --- Vô hiệu hóa ---
+
+    def invalidate_scene_rects(self, rects):
+        """
+        Đánh dấu cũ các tile giao với các vùng scene đã thay đổi (tín hiệu QGraphicsScene.changed).
+        View vẽ trực tiếp vùng của tile cũ cho tới khi ảnh mới về.
+        """
+        if not rects or not len(self.tiles):
+            return
+        for key in self._tiles_in_rects(rects):
+            if key not in self._stale:
+                self._stale.add(key)
+                self._generation[key] = self._generation.get(key, 0) + 1
+        for key in list(self._in_flight):
+            area = tile_scene_rect(*key)
+            if any(area.intersects(rect) for rect in rects):
+                # Kết quả đang vẽ đã cũ: bỏ qua nó và ghi lại tile
+                self._generation[key] = self._generation.get(key, 0) + 1
+                self._in_flight.discard(key)
+                self.request(key)
+
+    def _tiles_in_rects(self, rects):
+        # Chỉ xét các ô tile mà mỗi vùng phủ; vùng phủ nhiều ô hơn số tile đang có thì duyệt các tile
+        keys = set()
+        cached = None
+        for level in self.levels():
+            for rect in rects:
+                columns, rows = tile_range(level, rect)
+                if len(columns) * len(rows) <= len(self.tiles):
+                    keys.update(key for key in ((level, tx, ty) for ty in rows for tx in columns) if key in self.tiles)
+                    continue
+                if cached is None:
+                    cached = self.tiles.keys()
+                keys.update(key for key in cached
+                            if key[0] == level and tile_scene_rect(*key).intersects(rect))
+        return keys
+
+    def clear(self):
+        self.tiles.clear()
+        self._stale.clear()
+        self._queue.clear()
+        for key in self._in_flight:
+            self._generation[key] = self._generation.get(key, 0) + 1
+        self._in_flight.clear()
+
+    # --- Ghi và raster hóa ---
+
+    def record(self, key) -> QPicture:
+        """
+        Ghi lại lệnh vẽ của scene trong vùng của tile, ở đúng mức zoom (LOD của item đúng).
+        """
+        level = key[0]
+        area = tile_scene_rect(*key)
+        base = QTransform.fromScale(level, level)
+        base.translate(-area.left(), -area.top())
+
+        picture = QPicture()
+        painter = QPainter(picture)
+        painter.setRenderHints(self.render_hints)
+        self.paint_items(painter, area, base)
+        painter.end()
+        return picture
+
+    def paint_items(self, painter, area: QRectF, base: QTransform):
+        """
+        Vẽ các item của scene giao với vùng `area` (tọa độ scene).
+        :param base: Phép biến đổi tọa độ scene -> tọa độ của painter.
+        """
+        # Tự duyệt item thay cho QGraphicsScene.render: render() đặt exposedRect bằng cả
+        # boundingRect, nên item lớn như PadField sẽ vẽ toàn bộ nội dung vào mỗi vùng
+        for item in self.scene.items(area, Qt.IntersectsItemBoundingRect, Qt.AscendingOrder):
+            if not item.isVisible() or item.flags() & QGraphicsItem.ItemHasNoContents:
+                continue
+            option = QStyleOptionGraphicsItem()
+            option.state = QStyle.State_Enabled
+            if item.isSelected():
+                option.state |= QStyle.State_Selected
+            option.exposedRect = item.mapRectFromScene(area).intersected(item.boundingRect())
+            painter.save()
+            painter.setTransform(item.sceneTransform() * base)
+            painter.setOpacity(item.effectiveOpacity())
+            item.paint(painter, option, None)
+            painter.restore()
+
+    def _record_pending(self):
+        start = time.perf_counter()
+        while self._queue:
+            key = next(iter(self._queue))
+            del self._queue[key]
+            generation = self._generation.get(key, 0)
+            job = TileRenderJob(key, generation, self.record(key), self.render_hints, self._signals)
+            self._in_flight.add(key)
+            self.pool.start(job)
+            if (time.perf_counter() - start) * 1000 >= self.record_budget_ms:
+                break
+        if self._queue and not self._paused:
+            self._record_timer.start(0)  # Nhường vòng lặp sự kiện rồi ghi tiếp
+
+    def _on_tile_finished(self, key, generation, image):
+        if generation != self._generation.get(key, 0):
+            return  # Scene đã đổi sau khi ghi tile này
+        self._in_flight.discard(key)
+        self._stale.discard(key)
+        self.tiles.put(key, image)
+        self.tile_ready.emit(key)
+
+    def wait(self, timeout_ms: int = -1) -> bool:
+        """
+        Chờ các job đang chạy xong (dùng khi đóng ứng dụng và trong benchmark).
+        """
+        return self.pool.waitForDone(timeout_ms)
@@ -0,0 +1,225 @@
+# trace_item.py
+
+import math
+
+import numpy as np
+from PyQt5.QtWidgets import QGraphicsItem, QStyle
+from PyQt5.QtGui import QPen, QPainterPath, QPainterPathStroker, QPolygonF
+from PyQt5.QtCore import QPointF, QRectF, Qt
+
+from layer_manager import LayerItem
+from pad_field import points_to_polygon
+
+CHUNK_SIZE = 128  # Số đỉnh mỗi đoạn polyline của nét đang vẽ (chỉ vẽ lại đoạn giao vùng cần vẽ)
+MAX_PENDING = 64  # Số điểm chờ tối đa trước khi buộc chốt một đỉnh (giữ chi phí mỗi điểm là O(1))
+
+
+class StrokeSimplifier:
+    """
+    Đơn giản hóa nét vẽ tự do ngay khi nhận điểm.
+
+    Giữ một đỉnh neo và các điểm đã nhận sau nó; khi có điểm mới mà một điểm chờ lệch khỏi
+    dây cung neo -> điểm mới quá `tolerance`, điểm chờ cuối cùng được chốt làm đỉnh (giống
+    Douglas-Peucker trên cửa sổ trượt). Điểm gần điểm trước hơn `tolerance` bị bỏ qua (radial distance).
+    """
+
+    def __init__(self, start, tolerance: float):
+        """
+        :param start: Điểm đầu (QPointF, tọa độ scene).
+        :param tolerance: Sai lệch tối đa cho phép (đơn vị scene), thường là vài pixel chia cho zoom.
+        """
+        self.tolerance = float(tolerance)
+        self.vertices = [(start.x(), start.y())]  # Các đỉnh đã chốt
+        self._pending = []  # Điểm nhận sau đỉnh neo cuối cùng
+        self.received = 1  # Tổng số điểm đã nhận
+
+        # Các đoạn polyline đã chốt để vẽ xem trước: (QPolygonF, hình chữ nhật bao)
+        self.chunks = []
+        self._chunk_start = 0
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def add_point(self, point) -> bool:
+        """
+        Thêm một điểm của nét; trả về True nếu điểm được nhận (không bị lọc bỏ).
+        """
+        x, y = point.x(), point.y()
+        last = self._pending[-1] if self._pending else self.vertices[-1]
+        if (x - last[0]) ** 2 + (y - last[1]) ** 2 < self.tolerance ** 2:
+            return False
+        self.received += 1
+
+        if self._pending and (len(self._pending) >= MAX_PENDING or not self._chord_fits(x, y)):
+            self._commit(self._pending[-1])
+            self._pending = []
+        self._pending.append((x, y))
+        return True
+
+    def _chord_fits(self, x, y) -> bool:
+        # Mọi điểm chờ đều cách dây cung (neo -> điểm mới) không quá tolerance?
+        # Cửa sổ nhỏ (tối đa MAX_PENDING điểm): vòng lặp thường dừng sớm, nhanh hơn NumPy
+        ax, ay = self.vertices[-1]
+        dx, dy = x - ax, y - ay
+        length = math.hypot(dx, dy)
+        limit = self.tolerance * length
+        if length == 0:
+            return all(math.hypot(px - ax, py - ay) <= self.tolerance for px, py in self._pending)
+        for px, py in reversed(self._pending):
+            if abs(dx * (py - ay) - dy * (px - ax)) > limit:
+                return False
+        return True
+
+    def _commit(self, vertex):
+        self.vertices.append(vertex)
+        if len(self.vertices) - self._chunk_start > CHUNK_SIZE:
+            # Chốt một đoạn cho phần xem trước; đoạn sau bắt đầu từ đỉnh cuối của đoạn này
+            points = self.vertices[self._chunk_start:]
+            polygon = QPolygonF([QPointF(px, py) for px, py in points])
+            self.chunks.append((polygon, polygon.boundingRect()))
+            self._chunk_start = len(self.vertices) - 1
+
+    def tail(self):
+        """
+        Các đỉnh chưa thuộc đoạn đã chốt nào, cộng với điểm mới nhất.
+        """
+        points = self.vertices[self._chunk_start:]
+        if self._pending:
+            points = points + [self._pending[-1]]
+        return points
+
+    def last_point(self):
+        return self._pending[-1] if self._pending else self.vertices[-1]
+
+    def finish(self) -> np.ndarray:
+        """
+        Kết thúc nét: trả về mảng đỉnh (N, 2) float64.
+        """
+        if self._pending:
+            self._commit(self._pending[-1])
+            self._pending = []
+        return np.array(self.vertices, dtype=np.float64)
+
+
+class TraceItem(QGraphicsItem):
+    """
+    Một đường mạch (polyline) lưu các đỉnh trong một mảng NumPy, thay cho nhiều QGraphicsLineItem.
+    Không có bút riêng thì vẽ bằng bút của LayerItem cha.
+    Một item có thể chứa nhiều nét (ví dụ các nét cùng độ rộng nhập từ Gerber), ngăn cách bởi một hàng NaN.
+    """
+
+    def __init__(self, points, pen: QPen = None, parent=None):
+        """
+        :param points: Các đỉnh (N, 2) theo tọa độ item; hàng NaN ngăn cách các nét.
+        :param pen: Bút vẽ; None để dùng bút của layer cha.
+        """
+        super().__init__(parent)
+        self.points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 2)
+        self.pen = QPen(pen) if pen is not None else None
+        if self.pen is not None:
+            self.pen.setCapStyle(Qt.RoundCap)
+            self.pen.setJoinStyle(Qt.RoundJoin)
+        self._bounds = QRectF()
+        self._shape = None
+        self._polygon = None
+        self._segments = None
+        self._multi = False
+        self._update_bounds()
+        self.setFlag(QGraphicsItem.ItemIsSelectable, True)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _current_pen(self):
+        if self.pen is not None:
+            return self.pen
+        layer = self.parentItem()
+        return layer.pen if isinstance(layer, LayerItem) else QPen(Qt.black, 0)
+
+    def _update_bounds(self):
+        breaks = np.isnan(self.points[:, 0])
+        self._multi = bool(breaks.any())
+        points = self.points[~breaks] if self._multi else self.points
+        if not len(points):
+            self._bounds = QRectF()
+            return
+        low = points.min(axis=0)
+        high = points.max(axis=0)
+        margin = self._current_pen().widthF() / 2 + 1
+        self._bounds = QRectF(QPointF(*low), QPointF(*high)).adjusted(-margin, -margin, margin, margin)
+
+    def set_points(self, points):
+        """
+        Thay toàn bộ các đỉnh của đường.
+        """
+        self.prepareGeometryChange()
+        self.points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 2)
+        self._shape = None
+        self._polygon = None
+        self._segments = None
+        self._update_bounds()
+        layer = self.parentItem()
+        if isinstance(layer, LayerItem):
+            layer.item_moved(self)
+
+    def polygon(self) -> QPolygonF:
+        # Dựng một lần rồi giữ lại đến khi set_points đổi các đỉnh, không dựng lại mỗi lần vẽ
+        if self._polygon is None:
+            self._polygon = points_to_polygon(self.points)
+        return self._polygon
+
+    def strokes(self):
+        """
+        Các nét của item, mỗi nét một mảng đỉnh (N, 2).
+        """
+        if not self._multi:
+            return [self.points]
+        breaks = np.flatnonzero(np.isnan(self.points[:, 0]))
+        starts = np.concatenate([[-1], breaks]) + 1
+        ends = np.concatenate([breaks, [len(self.points)]])
+        return [self.points[start:end] for start, end in zip(starts.tolist(), ends.tolist()) if end > start]
+
+    def segments(self) -> QPolygonF:
+        """
+        Các đoạn thẳng của mọi nét dạng cặp điểm cho QPainter.drawLines (một lần gọi cho cả item).
+        """
+        if self._segments is None:
+            start, end = self.points[:-1], self.points[1:]
+            keep = ~(np.isnan(start[:, 0]) | np.isnan(end[:, 0]))
+            self._segments = points_to_polygon(np.stack([start[keep], end[keep]], axis=1).reshape(-1, 2))
+        return self._segments
+
+    def boundingRect(self):
+        return self._bounds
+
+    def shape(self):
+        # Chỉ dựng khi cần kiểm tra va chạm/chọn, rồi giữ lại
+        if self._shape is None:
+            path = QPainterPath()
+            for stroke in self.strokes():
+                path.addPolygon(points_to_polygon(stroke))
+            stroker = QPainterPathStroker()
+            stroker.setWidth(max(self._current_pen().widthF(), 1.0))
+            stroker.setCapStyle(Qt.RoundCap)
+            stroker.setJoinStyle(Qt.RoundJoin)
+            self._shape = stroker.createStroke(path)
+        return self._shape
+
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.ItemPositionHasChanged:
+            layer = self.parentItem()
+            if isinstance(layer, LayerItem):
+                layer.item_moved(self)
+        return super().itemChange(change, value)
+
+    def paint(self, painter, option, widget):
+        painter.setPen(self._current_pen())
+        painter.setBrush(Qt.NoBrush)
+        if self._multi:
+            # Bút đầu tròn nên các đoạn rời nối với nhau giống polyline
+            painter.drawLines(self.segments())
+        else:
+            painter.drawPolyline(self.polygon())
+        if option.state & QStyle.State_Selected:
+            painter.setPen(QPen(Qt.black, 0, Qt.DashLine))
+            painter.drawRect(self._bounds)
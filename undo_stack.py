@@ -0,0 +1,402 @@
+# undo_stack.py
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+from PyQt5.QtWidgets import QGraphicsScene, QGraphicsItem
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from scene_batch import bulk_update
+
+DEFAULT_UNDO_MEMORY = 64 * 1024 * 1024  # Bộ nhớ tối đa cho lịch sử hoàn tác (byte)
+ITEM_REF_BYTES = 64  # Ước lượng chi phí giữ một tham chiếu item trong lệnh
+
+
+class Command(ABC):
+    """
+    Một bước hoàn tác. Lệnh chỉ lưu phần thay đổi (delta), không chụp lại toàn bộ item.
+    Lớp con phải cài đặt redo và undo.
+    """
+
+    text = ""
+
+    @abstractmethod
+    def redo(self):
+        pass
+
+    @abstractmethod
+    def undo(self):
+        pass
+
+    def size(self) -> int:
+        """Ước lượng bộ nhớ lệnh đang giữ (byte), dùng cho giới hạn bộ nhớ của UndoStack"""
+        return ITEM_REF_BYTES
+
+
+class UndoStack(QObject):
+    """
+    Ngăn xếp hoàn tác/làm lại theo lệnh, giới hạn theo bộ nhớ ước lượng của các lệnh.
+    Khi vượt giới hạn, các lệnh cũ nhất bị bỏ (luôn giữ lại lệnh mới nhất).
+    """
+
+    changed = pyqtSignal()  # Ngăn xếp thay đổi: cập nhật trạng thái các action Undo/Redo
+    command_applied = pyqtSignal(object)  # Một lệnh vừa được thực hiện, hoàn tác hoặc làm lại (ví dụ cho autosave)
+
+    def __init__(self, memory_limit: int = DEFAULT_UNDO_MEMORY, parent=None):
+        """
+        :param memory_limit: Bộ nhớ tối đa (byte) cho các lệnh trong lịch sử.
+        """
+        super().__init__(parent)
+        self.memory_limit = int(memory_limit)
+        self.memory_used = 0
+        self._commands = []  # Lệnh đã thực hiện, cũ nhất trước
+        self._redo = []  # Lệnh đã hoàn tác, mới hoàn tác nhất ở cuối
+        self.executing = False  # Đang chạy undo/redo: các thao tác bên trong không được ghi lại
+
+    def __len__(self):
+        return len(self._commands) + len(self._redo)
+
+    def can_undo(self) -> bool:
+        return bool(self._commands)
+
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def undo_text(self) -> str:
+        return self._commands[-1].text if self._commands else ""
+
+    def redo_text(self) -> str:
+        return self._redo[-1].text if self._redo else ""
+
+    def push(self, command: Command, applied: bool = False):
+        """
+        Thêm một lệnh vào lịch sử; xóa nhánh làm lại.
+        :param applied: True nếu thay đổi đã được thực hiện (ví dụ kéo chuột), không gọi redo().
+        """
+        if self.executing:
+            return  # Thay đổi phát sinh khi đang undo/redo thuộc về lệnh đang chạy
+        if not applied:
+            self._run(command.redo)
+        for dropped in self._redo:
+            self.memory_used -= dropped.size()
+        self._redo = []
+        self._commands.append(command)
+        self.memory_used += command.size()
+        self._trim()
+        self.command_applied.emit(command)
+        self.changed.emit()
+
+    def undo(self):
+        if not self._commands:
+            return
+        command = self._commands.pop()
+        self._run(command.undo)
+        self._redo.append(command)
+        self.command_applied.emit(command)
+        self.changed.emit()
+
+    def redo(self):
+        if not self._redo:
+            return
+        command = self._redo.pop()
+        self._run(command.redo)
+        self._commands.append(command)
+        self.command_applied.emit(command)
+        self.changed.emit()
+
+    def clear(self):
+        self._commands = []
+        self._redo = []
+        self.memory_used = 0
+        self.changed.emit()
+
+    def set_memory_limit(self, memory_limit: int):
+        self.memory_limit = int(memory_limit)
+        self._trim()
+        self.changed.emit()
+
+    def _run(self, action):
+        self.executing = True
+        try:
+            action()
+        finally:
+            self.executing = False
+
+    def _trim(self):
+        # Bỏ các lệnh hoàn tác cũ nhất cho tới khi vừa giới hạn (giữ ít nhất lệnh mới nhất)
+        dropped = 0
+        while self.memory_used > self.memory_limit and len(self._commands) - dropped > 1:
+            self.memory_used -= self._commands[dropped].size()
+            dropped += 1
+        if dropped:
+            del self._commands[:dropped]
+
+
+def undo_stack(scene: QGraphicsScene):
+    """
+    Trả về UndoStack gắn với scene, hoặc None nếu scene không ghi lịch sử.
+    """
+    return getattr(scene, "_undo_stack", None)
+
+
+def set_undo_stack(scene: QGraphicsScene, stack: UndoStack):
+    """
+    Gắn UndoStack cho scene (None để tắt); item và công cụ vẽ ghi lệnh qua push()/record().
+    """
+    scene._undo_stack = stack
+
+
+def push(scene: QGraphicsScene, command: Command):
+    """
+    Thực hiện lệnh và ghi vào lịch sử của scene (nếu có).
+    """
+    stack = undo_stack(scene)
+    if stack is None:
+        command.redo()
+    elif not stack.executing:
+        stack.push(command)
+    else:
+        command.redo()
+
+
+def record(scene: QGraphicsScene, command: Command):
+    """
+    Ghi vào lịch sử một thay đổi đã được thực hiện (không gọi redo()).
+    """
+    stack = undo_stack(scene)
+    if stack is not None:
+        stack.push(command, applied=True)
+
+
+def recording(scene: QGraphicsScene) -> bool:
+    """
+    True nếu thay đổi trên scene lúc này cần được ghi lại (có UndoStack và không đang undo/redo).
+    """
+    stack = undo_stack(scene)
+    return stack is not None and not stack.executing
+
+
+def selected_movable_items(scene: QGraphicsScene):
+    """
+    Các item được chọn mà Qt sẽ di chuyển khi kéo: có cờ ItemIsMovable và không có tổ tiên đang được chọn.
+    """
+    items = []
+    for item in scene.selectedItems():
+        if not item.flags() & QGraphicsItem.ItemIsMovable:
+            continue
+        parent = item.parentItem()
+        while parent is not None and not parent.isSelected():
+            parent = parent.parentItem()
+        if parent is None:
+            items.append(item)
+    return items
+
+
+def item_positions(items) -> np.ndarray:
+    """
+    Vị trí (pos, tọa độ cha) của các item, dạng mảng (N, 2).
+    """
+    return np.array([(item.pos().x(), item.pos().y()) for item in items], dtype=np.float64).reshape(-1, 2)
+
+
+def compact_delta(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """
+    Độ dời new - old; nếu mọi hàng bằng nhau (kéo không bắt lưới) chỉ giữ một hàng.
+    """
+    delta = new - old
+    if len(delta) and (delta == delta[0]).all():
+        return delta[:1].copy()
+    return delta
+
+
+def begin_move(scene: QGraphicsScene):
+    """
+    Ghi lại vùng chọn và vị trí của nó khi bắt đầu kéo item (sau khi scene nhận sự kiện nhấn chuột).
+    :return: (items, vị trí (N, 2)) để truyền cho end_move, hoặc None nếu không có gì được kéo.
+    """
+    if not recording(scene):
+        return None
+    grabber = scene.mouseGrabberItem()
+    if grabber is None or not grabber.flags() & QGraphicsItem.ItemIsMovable:
+        return None
+    items = selected_movable_items(scene)
+    if not items:
+        return None
+    return items, item_positions(items)
+
+
+def end_move(scene: QGraphicsScene, move):
+    """
+    Ghi cả lần kéo (mọi bước di chuột) thành một MoveItemsCommand, nếu vùng chọn đã dời đi.
+    :param move: Giá trị trả về của begin_move.
+    """
+    if move is None:
+        return
+    items, old = move
+    new = item_positions(items)
+    if not np.array_equal(old, new):
+        record(scene, MoveItemsCommand(scene, items, old, new))
+
+
+# --- Các lệnh ---
+
+
+class AddItemsCommand(Command):
+    """
+    Thêm nhiều item (ví dụ đặt pad, vẽ hình, dán). Thêm và xóa chạy trong một bulk_update.
+    """
+
+    def __init__(self, scene: QGraphicsScene, items, attach, detach, text="Add items"):
+        """
+        :param items: Các item.
+        :param attach: Hàm attach(items) đưa item vào scene/layer.
+        :param detach: Hàm detach(items) gỡ item khỏi scene/layer.
+        """
+        self.scene = scene
+        self.items = list(items)
+        self.attach = attach
+        self.detach = detach
+        self.text = text
+
+    def redo(self):
+        with bulk_update(self.scene):
+            self.attach(self.items)
+
+    def undo(self):
+        with bulk_update(self.scene):
+            self.detach(self.items)
+
+    def size(self):
+        return ITEM_REF_BYTES * (len(self.items) + 1)
+
+
+class RemoveItemsCommand(AddItemsCommand):
+    """
+    Xóa nhiều item; hoàn tác đưa chúng trở lại.
+    """
+
+    def __init__(self, scene: QGraphicsScene, items, attach, detach, text="Remove items"):
+        super().__init__(scene, items, attach, detach, text)
+
+    def redo(self):
+        super().undo()
+
+    def undo(self):
+        super().redo()
+
+
+class MoveItemsCommand(Command):
+    """
+    Di chuyển nhiều item: lưu vị trí cũ (N, 2) và độ dời (một hàng nếu mọi item dời như nhau).
+    """
+
+    def __init__(self, scene: QGraphicsScene, items, old_positions, new_positions, text="Move"):
+        self.scene = scene
+        self.items = list(items)
+        self.old = np.asarray(old_positions, dtype=np.float64)
+        self.delta = compact_delta(self.old, np.asarray(new_positions, dtype=np.float64))
+        self.text = text
+
+    def _set_positions(self, positions):
+        with bulk_update(self.scene):
+            for item, (x, y) in zip(self.items, positions.tolist()):
+                item.setPos(x, y)
+
+    def redo(self):
+        self._set_positions(self.old + self.delta)
+
+    def undo(self):
+        self._set_positions(self.old)
+
+    def size(self):
+        return ITEM_REF_BYTES * (len(self.items) + 1) + self.old.nbytes + self.delta.nbytes
+
+
+class PadFieldMoveCommand(Command):
+    """
+    Di chuyển các pad của một PadField theo chỉ số.
+    """
+
+    def __init__(self, field, rows, old_positions, new_positions, text="Move pads"):
+        self.field = field
+        self.rows = np.asarray(rows)
+        self.old = np.asarray(old_positions, dtype=np.float64)
+        self.delta = compact_delta(self.old, np.asarray(new_positions, dtype=np.float64))
+        self.text = text
+
+    def redo(self):
+        self.field.set_pad_positions(self.rows, self.old + self.delta)
+
+    def undo(self):
+        self.field.set_pad_positions(self.rows, self.old)
+
+    def size(self):
+        return ITEM_REF_BYTES + self.rows.nbytes + self.old.nbytes + self.delta.nbytes
+
+
+class SettingCommand(Command):
+    """
+    Đổi một cài đặt (ví dụ ẩn/hiện layer); các listener của SettingsManager cập nhật giao diện.
+    """
+
+    def __init__(self, settings_manager, category, key, old, new, text=None):
+        self.settings_manager = settings_manager
+        self.category = category
+        self.key = key
+        self.old = old
+        self.new = new
+        self.text = text or f"Change {key}"
+
+    def redo(self):
+        self.settings_manager.set_setting(self.category, self.key, self.new)
+
+    def undo(self):
+        self.settings_manager.set_setting(self.category, self.key, self.old)
+
+
+class LayerPropertyCommand(Command):
+    """
+    Đổi một thuộc tính của layer qua setter của LayerManager (set_layer_color, set_layer_opacity, ...).
+    """
+
+    def __init__(self, layer_manager, layer_name, setter, old, new, text=None):
+        self.layer_manager = layer_manager
+        self.layer_name = layer_name
+        self.setter = setter
+        self.old = old
+        self.new = new
+        self.text = text or f"Layer {layer_name}"
+
+    def redo(self):
+        getattr(self.layer_manager, self.setter)(self.layer_name, self.new)
+
+    def undo(self):
+        getattr(self.layer_manager, self.setter)(self.layer_name, self.old)
+
+
+class LayerCommand(Command):
+    """
+    Thêm hoặc xóa cả một layer cùng các item của nó (LayerItem và item được giữ lại để hoàn tác).
+    """
+
+    def __init__(self, layer_manager, layer, items, removed: bool, text=None):
+        self.layer_manager = layer_manager
+        self.layer = layer
+        self.items = list(items)
+        self.removed = removed
+        self.text = text or (f"Remove layer {layer.name}" if removed else f"Add layer {layer.name}")
+
+    def redo(self):
+        if self.removed:
+            self.layer_manager.detach_layer(self.layer)
+        else:
+            self.layer_manager.attach_layer(self.layer, self.items)
+
+    def undo(self):
+        if self.removed:
+            self.layer_manager.attach_layer(self.layer, self.items)
+        else:
+            self.layer_manager.detach_layer(self.layer)
+
+    def size(self):
+        return ITEM_REF_BYTES * (len(self.items) + 2)
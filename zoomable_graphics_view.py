@@ -1,18 +1,352 @@
 # zoomable_graphics_view.py
-from PyQt5.QtWidgets import QGraphicsView
-from PyQt5.QtCore import QPointF
-from PyQt5.QtGui import QPainter
+import math
+import time
+from collections import deque
+
+from PyQt5.QtWidgets import QGraphicsView, QApplication, QStyle, QStyleOptionRubberBand, QRubberBand
+from PyQt5.QtCore import QPointF, QLineF, QTimer, Qt, pyqtSignal
+from PyQt5.QtGui import QPainter, QPen, QColor, QRegion
+
+from pad import Pad
+from pad_field import PadField
+from undo_stack import begin_move, end_move
+from tile_render_cache import TileRenderCache, tile_range, tile_scene_rect, zoom_key
+
+FULL_QUALITY_HINTS = QPainter.Antialiasing | QPainter.TextAntialiasing | QPainter.SmoothPixmapTransform
+DRAFT_QUALITY_HINTS = QPainter.TextAntialiasing
+
 
 class ZoomableGraphicsView(QGraphicsView):
+    # Thời gian vẽ (ms) và khung hình có phải bản nháp không, phát sau mỗi lần vẽ viewport
+    frame_rendered = pyqtSignal(float, bool)
+
     def __init__(self, scene):
         super().__init__(scene)
-        self.setRenderHint(QPainter.Antialiasing)
+        self.setRenderHints(FULL_QUALITY_HINTS)
         self.setDragMode(QGraphicsView.RubberBandDrag)
 
+        # Chất lượng thích ứng: khi đang zoom/pan/kéo mà khung hình vượt ngân sách thì vẽ nháp
+        # (không khử răng cưa, không làm mịn ảnh, bỏ chi tiết mịn của pad); khi rảnh vẽ lại đầy đủ
+        self.adaptive_quality = True
+        self.frame_budget_ms = 1000 / 60
+        self.quality_idle_ms = 150  # Thời gian rảnh trước khi vẽ lại khung hình chất lượng đầy đủ
+        self.low_quality = False
+        self.interacting = False
+        self.last_frame_ms = 0.0
+        self.frame_times = deque(maxlen=120)  # Thời gian vẽ các khung hình gần nhất (ms)
+        self._quality_timer = QTimer(self)
+        self._quality_timer.setSingleShot(True)
+        self._quality_timer.timeout.connect(self.end_interaction)
+
         self.setMouseTracking(True)
         self.zoom_factor = 1.0
         self.is_panning = False
         self.last_pan_point = QPointF()
+        self.space_pressed = False  # Giữ phím Space rồi kéo chuột trái để pan
+        self._pan_button = Qt.NoButton
+        self._pan_saved_state = None  # (drag mode, viewport update mode, optimization flags) trước khi pan
+        self._item_move = None  # Vùng chọn và vị trí lúc bắt đầu kéo item (một bước hoàn tác mỗi lần kéo)
+
+        # Lưới được vẽ trong drawBackground, không nằm trong scene
+        self.show_grid = True
+        self.grid_spacing = 10  # Khoảng cách lưới (đơn vị scene)
+        self.grid_min_pixel_spacing = 8  # Khoảng cách tối thiểu trên màn hình trước khi làm thưa lưới
+        self.grid_pen = QPen(QColor(240, 240, 240), 0)  # Bút cosmetic, luôn rộng 1 pixel
+
+        # Các hàm vẽ lớp phủ draw(painter, rect) gọi trong drawForeground, ví dụ hình đang vẽ dở;
+        # lớp phủ không nằm trong scene nên không làm cũ tile hay chỉ mục của scene
+        self.overlays = []
+
+        # PadField chọn từng pad theo rubber band
+        self._band_selection = {}  # PadField -> trạng thái chọn các pad lúc rubber band bắt đầu đi qua
+        self.rubberBandChanged.connect(self.select_pad_field_pads)
+
+        # Cache tile (tùy chọn, xem set_tile_cache_enabled): item được vẽ sẵn thành tile trên luồng nền,
+        # view chỉ dán ảnh
+        self.tile_cache = None
+        self.zoom_settle_ms = 120  # Chờ sau lần cuộn chuột cuối cùng rồi mới vẽ tile ở mức zoom mới
+        self._zoom_settle_timer = QTimer(self)
+        self._zoom_settle_timer.setSingleShot(True)
+        self._zoom_settle_timer.timeout.connect(self._zoom_settled)
+
+    def set_tile_cache_enabled(self, enabled, budget_bytes=None):
+        """
+        Bật/tắt cache tile cho việc vẽ các item (mặc định tắt). Hợp với board dày đặc được zoom/pan nhiều;
+        vùng có item vừa đổi được vẽ trực tiếp cho tới khi tile mới về.
+        :param enabled: True để vẽ item từ tile dựng trên luồng nền.
+        :param budget_bytes: Bộ nhớ tối đa của cache (mặc định 64 MB).
+        """
+        if self.tile_cache is not None:
+            self.tile_cache.scene.changed.disconnect(self.tile_cache.invalidate_scene_rects)
+            self.tile_cache.tile_ready.disconnect(self._tile_ready)
+            self.tile_cache.clear()
+            self.tile_cache = None
+        if enabled and self.scene() is not None:
+            if budget_bytes is None:
+                self.tile_cache = TileRenderCache(self.scene(), parent=self)
+            else:
+                self.tile_cache = TileRenderCache(self.scene(), budget_bytes, parent=self)
+            self.tile_cache.render_hints = FULL_QUALITY_HINTS  # Tile luôn được vẽ ở chất lượng đầy đủ
+            self.tile_cache.tile_ready.connect(self._tile_ready)
+        self.viewport().update()
+
+    def setScene(self, scene):
+        # Cache tile gắn với một scene: dựng lại cho scene mới
+        budget_bytes = self.tile_cache.tiles.budget_bytes if self.tile_cache is not None else None
+        super().setScene(scene)
+        if budget_bytes is not None:
+            self.set_tile_cache_enabled(True, budget_bytes)
+
+    def tile_level(self):
+        """
+        Mức zoom dùng làm khóa tile, hoặc None nếu không dùng được tile (xoay, co giãn không đều).
+        """
+        transform = self.transform()
+        if transform.m12() or transform.m21() or transform.m11() <= 0 or transform.m11() != transform.m22():
+            return None
+        return zoom_key(transform.m11())
+
+    def _tile_ready(self, key):
+        if key[0] == self.tile_level():
+            rect = self.mapFromScene(tile_scene_rect(*key)).boundingRect()
+            self.viewport().update(rect.adjusted(-1, -1, 1, 1))
+
+    def _zoom_settled(self):
+        self.tile_cache.resume()
+        self.viewport().update()
+
+    def set_grid_visible(self, visible):
+        """
+        Bật/tắt hiển thị lưới.
+        :param visible: True để hiển thị lưới.
+        """
+        self.show_grid = bool(visible)
+        self.viewport().update()
+
+    def select_pad_field_pads(self, rubber_band_rect, from_scene_point, to_scene_point):
+        """
+        Chọn từng pad trong các PadField nằm dưới rubber band.
+        Giữ Ctrl thì đảo trạng thái chọn của các pad dưới rubber band, như Ctrl+click một pad
+        (PadField.mousePressEvent); nếu chỉ thêm vào vùng chọn thì không có cách bỏ chọn một nhóm pad.
+        """
+        if rubber_band_rect.isNull() or self.scene() is None:
+            self._band_selection.clear()  # Rubber band đã kết thúc
+            return
+        # Dùng rubber_band_rect (tọa độ viewport) vì hai điểm scene của tín hiệu trễ một sự kiện
+        area = self.mapToScene(rubber_band_rect).boundingRect()
+        toggle = bool(QApplication.keyboardModifiers() & Qt.ControlModifier)
+        touched = set()
+        for item in self.scene().items(area, self.rubberBandSelectionMode()):
+            if isinstance(item, PadField):
+                # Giữ Ctrl: đảo trạng thái chọn so với lúc bắt đầu kéo rubber band
+                base = self._band_selection.setdefault(item, item.selected.copy())
+                item.select_in_rect(item.mapRectFromScene(area), self.rubberBandSelectionMode(), toggle, base)
+                touched.add(item)
+        if toggle:
+            # PadField đã ra khỏi rubber band trở về trạng thái chọn ban đầu
+            for item, base in self._band_selection.items():
+                if item not in touched and len(base) == len(item):
+                    item.set_pad_selection(base)
+
+    def drawForeground(self, painter, rect):
+        super().drawForeground(painter, rect)
+        for draw in self.overlays:
+            draw(painter, rect)
+
+    def update_scene_rect(self, rect, margin=0.0):
+        """
+        Vẽ lại phần viewport phủ một vùng scene (ví dụ lớp phủ vừa thay đổi).
+        :param margin: Lề thêm quanh vùng, tính bằng pixel màn hình.
+        """
+        area = self.mapFromScene(rect).boundingRect()
+        margin = math.ceil(margin) + 1
+        self.viewport().update(area.adjusted(-margin, -margin, margin, margin))
+
+    def grid_step(self):
+        """
+        Trả về khoảng cách lưới thực tế ở mức zoom hiện tại.
+        Khi zoom nhỏ, chỉ vẽ mỗi đường thứ 10 (rồi 100, ...) để các đường không dính vào nhau.
+        """
+        step = self.grid_spacing
+        scale = abs(self.transform().m11()) or 1.0
+        while step * scale < self.grid_min_pixel_spacing:
+            step *= 10
+        return step
+
+    def drawBackground(self, painter, rect):
+        super().drawBackground(painter, rect)
+        if not self.show_grid:
+            return
+
+        # Chỉ vẽ các đường lưới nằm trong vùng nhìn thấy và trong sceneRect
+        bounds = rect.intersected(self.sceneRect())
+        if bounds.isEmpty():
+            return
+
+        step = self.grid_step()
+        left = math.ceil(bounds.left() / step) * step
+        top = math.ceil(bounds.top() / step) * step
+
+        lines = []
+        x = left
+        while x <= bounds.right():
+            lines.append(QLineF(x, bounds.top(), x, bounds.bottom()))
+            x += step
+        y = top
+        while y <= bounds.bottom():
+            lines.append(QLineF(bounds.left(), y, bounds.right(), y))
+            y += step
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.setPen(self.grid_pen)
+        painter.drawLines(lines)
+        painter.restore()
+
+    # --- Chất lượng thích ứng ---
+
+    def mark_interaction(self):
+        """
+        Báo view đang được zoom/pan/kéo. Nếu khung hình trước vượt ngân sách thì chuyển sang vẽ nháp;
+        sau quality_idle_ms không tương tác sẽ vẽ lại một khung hình đầy đủ.
+        """
+        if not self.adaptive_quality:
+            return
+        self.interacting = True
+        self._quality_timer.start(self.quality_idle_ms)
+        if not self.low_quality and self.last_frame_ms > self.frame_budget_ms:
+            self.set_low_quality(True)
+
+    def end_interaction(self):
+        self.interacting = False
+        self._quality_timer.stop()
+        if self.low_quality:
+            self.set_low_quality(False)  # Một khung hình chất lượng đầy đủ
+
+    def set_low_quality(self, low_quality):
+        """
+        Chuyển giữa vẽ nháp và vẽ đầy đủ, rồi vẽ lại viewport.
+        """
+        self.low_quality = bool(low_quality)
+        self.setRenderHints(DRAFT_QUALITY_HINTS if self.low_quality else FULL_QUALITY_HINTS)
+        self.viewport().update()
+
+    def set_adaptive_quality(self, enabled, frame_budget_ms=None):
+        """
+        Bật/tắt chất lượng thích ứng.
+        :param frame_budget_ms: Ngân sách mỗi khung hình (ms); mặc định giữ nguyên (60 fps).
+        """
+        self.adaptive_quality = bool(enabled)
+        if frame_budget_ms is not None:
+            self.frame_budget_ms = float(frame_budget_ms)
+        if not self.adaptive_quality:
+            self.end_interaction()
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        Pad.draft_mode = self.low_quality
+        try:
+            level = self.tile_level() if self.tile_cache is not None else None
+            if level is None:
+                super().paintEvent(event)
+            else:
+                self._paint_tiles(event, level)
+        finally:
+            Pad.draft_mode = False
+        self.last_frame_ms = (time.perf_counter() - start) * 1000
+        self.frame_times.append(self.last_frame_ms)
+        self.frame_rendered.emit(self.last_frame_ms, self.low_quality)
+
+    def _paint_tiles(self, event, level):
+        """
+        Vẽ viewport từ cache tile: nền, tile của item, tiền cảnh và rubber band.
+        """
+        painter = QPainter(self.viewport())
+        painter.setRenderHints(self.renderHints())
+        exposed = self.mapToScene(event.rect()).boundingRect()
+
+        painter.setTransform(self.viewportTransform())
+        self.drawBackground(painter, exposed)
+
+        # Item: dán tile ở mức zoom hiện tại; tile còn thiếu được yêu cầu vẽ trên luồng nền
+        # và tạm thay bằng tile của mức zoom khác (co giãn)
+        painter.resetTransform()
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+        mapping = self.viewportTransform()
+        other_levels = None
+        keys = {}  # Chỉ các tile giao với vùng cần vẽ (ví dụ dải mới lộ ra khi pan)
+        for rect in event.region().rects():
+            area = self.mapToScene(rect).boundingRect().intersected(self.sceneRect())
+            if area.isEmpty():
+                continue
+            columns, rows = tile_range(level, area)
+            keys.update(((level, tx, ty), None) for ty in rows for tx in columns)
+        dirty = QRegion()
+        for key in keys:
+            target = mapping.mapRect(tile_scene_rect(*key))
+            image = self.tile_cache.tile(key)
+            fresh = self.tile_cache.is_fresh(key)
+            if not fresh:
+                self.tile_cache.request(key)
+            if image is not None:
+                if fresh:
+                    painter.drawImage(target, image)
+                else:
+                    # Item trong tile vừa đổi (kéo, chọn): không dán ảnh cũ, vẽ trực tiếp tới khi tile mới về
+                    dirty += target.toAlignedRect()
+                continue
+            if other_levels is None:
+                # Mức gần mức hiện tại nhất được vẽ sau cùng (nằm trên)
+                other_levels = sorted(self.tile_cache.levels() - {level},
+                                      key=lambda other: -abs(math.log(other / level)))
+            if other_levels:
+                self._draw_stale_tiles(painter, mapping, tile_scene_rect(*key), target, other_levels)
+        if not dirty.isEmpty():
+            self._draw_items_direct(painter, dirty & event.region())
+
+        painter.setTransform(self.viewportTransform())
+        self.drawForeground(painter, exposed)
+
+        painter.resetTransform()
+        self._draw_rubber_band(painter)
+        painter.end()
+
+    def _draw_items_direct(self, painter, region):
+        """
+        Vẽ trực tiếp các item trong một vùng viewport (như QGraphicsView.paintEvent).
+        """
+        painter.save()
+        painter.setClipRegion(region)
+        painter.setRenderHints(self.renderHints())
+        area = self.mapToScene(region.boundingRect()).boundingRect()
+        self.tile_cache.paint_items(painter, area, self.viewportTransform())
+        painter.restore()
+
+    def _draw_stale_tiles(self, painter, mapping, area, target, levels):
+        """
+        Vẽ tạm vùng `area` (tọa độ scene) bằng tile của các mức zoom khác.
+        """
+        painter.save()
+        painter.setClipRect(target)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, not self.low_quality)
+        for other in levels:
+            columns, rows = tile_range(other, area)
+            for ty in rows:
+                for tx in columns:
+                    image = self.tile_cache.tile((other, tx, ty))
+                    if image is not None:
+                        painter.drawImage(mapping.mapRect(tile_scene_rect(other, tx, ty)), image)
+        painter.restore()
+
+    def _draw_rubber_band(self, painter):
+        rect = self.rubberBandRect()
+        if rect.isNull():
+            return
+        option = QStyleOptionRubberBand()
+        option.initFrom(self.viewport())
+        option.rect = rect
+        option.shape = QRubberBand.Rectangle
+        self.style().drawControl(QStyle.CE_RubberBand, option, painter, self.viewport())
 
     def wheelEvent(self, event):
         zoom_in_factor = 1.25
@@ -34,3 +368,108 @@ class ZoomableGraphicsView(QGraphicsView):
         new_pos = self.mapToScene(event.pos())
         delta = new_pos - old_pos
         self.translate(delta.x(), delta.y())
+
+        if self.tile_cache is not None:
+            # Trong lúc cuộn liên tục chỉ dán tile cũ đã co giãn; vẽ tile mới khi dừng cuộn
+            self.tile_cache.pause()
+            self.tile_cache.drop_requests(self.tile_level())
+            self._zoom_settle_timer.start(self.zoom_settle_ms)
+        self.mark_interaction()
+
+    # --- Pan bằng chuột giữa hoặc Space + kéo chuột trái ---
+
+    def handles_pan(self, event):
+        """
+        True nếu sự kiện chuột thuộc về thao tác pan (để bộ lọc sự kiện khác bỏ qua nó).
+        """
+        if self.is_panning:
+            return True
+        if event.type() != event.MouseButtonPress:
+            return False
+        return event.button() == Qt.MiddleButton or (event.button() == Qt.LeftButton and self.space_pressed)
+
+    def start_pan(self, pos, button):
+        """
+        Bắt đầu pan: nội dung viewport được cuộn (blit) và chỉ dải mới lộ ra được vẽ lại.
+        """
+        self.is_panning = True
+        self._pan_button = button
+        self.last_pan_point = QPointF(pos)
+        self._pan_saved_state = (self.dragMode(), self.viewportUpdateMode(), self.optimizationFlags())
+        self.setDragMode(QGraphicsView.NoDrag)  # Không mở rubber band trong lúc pan
+        # Cập nhật tối thiểu để scrollContentsBy cuộn pixel có sẵn thay vì vẽ lại toàn bộ
+        self.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate)
+        self.setOptimizationFlags(self.optimizationFlags() | QGraphicsView.DontAdjustForAntialiasing
+                                  | QGraphicsView.DontSavePainterState)
+        self.viewport().setCursor(Qt.ClosedHandCursor)
+
+    def pan_to(self, pos):
+        """
+        Cuộn view theo độ dời của chuột kể từ lần gọi trước.
+        """
+        delta = QPointF(pos) - self.last_pan_point
+        self.last_pan_point = QPointF(pos)
+        self.mark_interaction()
+        self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() - round(delta.x()))
+        self.verticalScrollBar().setValue(self.verticalScrollBar().value() - round(delta.y()))
+
+    def end_pan(self):
+        self.is_panning = False
+        self._pan_button = Qt.NoButton
+        if self._pan_saved_state is not None:
+            drag_mode, update_mode, flags = self._pan_saved_state
+            self.setDragMode(drag_mode)
+            self.setViewportUpdateMode(update_mode)
+            self.setOptimizationFlags(flags)
+            self._pan_saved_state = None
+        if self.space_pressed:
+            self.viewport().setCursor(Qt.OpenHandCursor)
+        else:
+            self.viewport().unsetCursor()
+
+    def mousePressEvent(self, event):
+        if not self.is_panning and self.handles_pan(event):
+            self.start_pan(event.pos(), event.button())
+            event.accept()
+            return
+        super().mousePressEvent(event)
+        if event.button() == Qt.LeftButton and self.scene() is not None:
+            self._item_move = begin_move(self.scene())
+
+    def mouseMoveEvent(self, event):
+        if self.is_panning:
+            self.pan_to(event.pos())
+            event.accept()
+            return
+        if event.buttons() & Qt.LeftButton:
+            self.mark_interaction()  # Kéo item hoặc rubber band
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        if self.is_panning:
+            if event.button() == self._pan_button:
+                self.end_pan()
+            event.accept()
+            return
+        super().mouseReleaseEvent(event)
+        if event.button() == Qt.LeftButton and self._item_move is not None:
+            move, self._item_move = self._item_move, None
+            end_move(self.scene(), move)
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Space and not event.isAutoRepeat():
+            self.space_pressed = True
+            if not self.is_panning:
+                self.viewport().setCursor(Qt.OpenHandCursor)
+            event.accept()
+            return
+        super().keyPressEvent(event)
+
+    def keyReleaseEvent(self, event):
+        if event.key() == Qt.Key_Space and not event.isAutoRepeat():
+            self.space_pressed = False
+            if not self.is_panning:
+                self.viewport().unsetCursor()
+            event.accept()
+            return
+        super().keyReleaseEvent(event)